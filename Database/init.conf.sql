@@ -1,60 +1,8 @@
--- 1. Пользователи
-CREATE TABLE userhub (
-    id            INT PRIMARY KEY,
-    name          TEXT,
-    tstart        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    balance       INT DEFAULT 0,
-    is_reg        BOOLEAN  DEFAULT FALSE,
-    refferer_id   INT,
-    CONSTRAINT fk_userhub_refferer
-        FOREIGN KEY (refferer_id) REFERENCES userhub(id)
-);
-
--- 2. Транзакции
-CREATE TABLE transactions (
-    id      SERIAL PRIMARY KEY,
-    price   INT  NOT NULL,
-    action  TEXT,
-    ts      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
--- 3. Функциональные сообщения / ответы
-CREATE TABLE pfunc (
-    id        SERIAL PRIMARY KEY,
-    message   TEXT NOT NULL,
-    cls       TEXT,
-    answer    TEXT NOT NULL,
-    user_id   INT  NOT NULL,
-    ts        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    position  TEXT,
-    pay_id    INT  NOT NULL,
-    CONSTRAINT fk_pfunc_user
-        FOREIGN KEY (user_id) REFERENCES userhub(id),
-    CONSTRAINT fk_pfunc_payment
-        FOREIGN KEY (pay_id)  REFERENCES transactions(id)
-);
-
--- 4. Задания
-CREATE TABLE tasks (
-    id        SERIAL PRIMARY KEY,
-    user_id   INT  NOT NULL,
-    ts        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    test      TEXT NOT NULL,
-    date      TIMESTAMP NOT NULL,
-    is_active BOOLEAN NOT NULL,
-    CONSTRAINT fk_tasks_user
-        FOREIGN KEY (user_id) REFERENCES userhub(id)
-);
-
--- 5. Логи сессий
-CREATE TABLE spylog (
-    id       SERIAL PRIMARY KEY,
-    user_id  INT  NOT NULL,
-    action  TEXT NOT NULL,
-    ts   TIMESTAMP NOT NULL,
-    CONSTRAINT fk_spylog_user
-        FOREIGN KEY (user_id) REFERENCES userhub(id)
-);
+-- Таблицы создаются миграциями Alembic (TelegramService/migrations):
+--     cd TelegramService && alembic upgrade head
+-- Базы, созданные прежней версией этого скрипта (с таблицами), помечаются
+--     alembic stamp 0001
+-- и дальше обновляются обычным `alembic upgrade head`.
 
 CREATE ROLE app WITH LOGIN PASSWORD 'YOUR PASSWORD';
 
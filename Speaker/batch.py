@@ -0,0 +1,199 @@
+"""Офлайн-классификация в формате OpenAI Batch API.
+
+Вход — JSONL с ValidationRequest ({"query", "chosen_topic", "base64_image"?, "custom_id"?}).
+
+    python batch.py build requests.jsonl batch_input.jsonl      # файл для Batch API
+    python batch.py submit batch_input.jsonl                     # загрузить и запустить batch
+    python batch.py fetch <batch_id> batch_output.jsonl          # скачать результат, когда готов
+    python batch.py run-local batch_input.jsonl batch_output.jsonl   # то же локально, без Batch API
+    python batch.py collect batch_input.jsonl batch_output.jsonl results.jsonl
+
+run-local — локальная замена Batch API: выполняет строки входного файла через
+UpstreamClient (с его лимитами) и пишет выход в том же формате, что и OpenAI.
+collect раскладывает выход по порядку входа: {"custom_id", "ok", "result" | "error"}.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from prompt_builder import classifier_messages, parse_classifier_output
+
+BATCH_URL = "/v1/responses"
+
+
+def build_input_lines(items: Iterable[Dict[str, Any]], model: str) -> Iterator[str]:
+    for i, item in enumerate(items):
+        image_url = None
+        if item.get("base64_image"):
+            from images import process_image
+
+            raw = base64.b64decode(item["base64_image"])
+            image_url = process_image(raw, hashlib.sha256(raw).hexdigest()).data_url
+        yield json.dumps({
+            "custom_id": item.get("custom_id") or f"item-{i}",
+            "method": "POST",
+            "url": BATCH_URL,
+            "body": {
+                "model": model,
+                "input": classifier_messages(item["query"], item["chosen_topic"], image_url),
+            },
+        }, ensure_ascii=False)
+
+
+def output_text(body: Dict[str, Any]) -> str:
+    """Аналог Response.output_text для тела ответа из выходного файла."""
+    parts = []
+    for item in body.get("output") or []:
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content") or []:
+            if content.get("type") == "output_text":
+                parts.append(content.get("text") or "")
+    return "".join(parts)
+
+
+def _response_body(response: Any) -> Dict[str, Any]:
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json")
+    # заглушки в бенчмарках отдают только output_text
+    return {"output": [{"type": "message", "content": [{"type": "output_text", "text": response.output_text}]}]}
+
+
+async def run_local(lines: List[str], client: Any, concurrency: int = 16) -> List[str]:
+    """Выполняет входной файл Batch API через UpstreamClient; выход — в порядке входа."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(line: str) -> str:
+        request = json.loads(line)
+        out: Dict[str, Any] = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"],
+                               "response": None, "error": None}
+        async with sem:
+            try:
+                response = await client.create("batch", **request["body"])
+            except Exception as exc:  # noqa: BLE001
+                status = getattr(exc, "status_code", None)
+                if status is not None:
+                    out["response"] = {"status_code": status, "request_id": "", "body": {"error": {"message": str(exc)}}}
+                else:
+                    out["error"] = {"code": type(exc).__name__, "message": str(exc)}
+            else:
+                out["response"] = {"status_code": 200, "request_id": "", "body": _response_body(response)}
+        return json.dumps(out, ensure_ascii=False)
+
+    return list(await asyncio.gather(*(one(line) for line in lines)))
+
+
+def collect(input_lines: Iterable[str], output_lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Результаты классификации в порядке входного файла, с ошибками по элементам."""
+    by_id = {}
+    for line in output_lines:
+        if line.strip():
+            record = json.loads(line)
+            by_id[record["custom_id"]] = record
+
+    results = []
+    for line in input_lines:
+        if not line.strip():
+            continue
+        custom_id = json.loads(line)["custom_id"]
+        record = by_id.get(custom_id)
+        results.append({"custom_id": custom_id, **_item_result(record)})
+    return results
+
+
+def _item_result(record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if record is None:
+        return {"ok": False, "error": "missing in batch output"}
+    if record.get("error"):
+        return {"ok": False, "error": record["error"].get("message") or record["error"].get("code")}
+    response = record["response"]
+    if response["status_code"] != 200:
+        message = (response.get("body") or {}).get("error", {}).get("message", "")
+        return {"ok": False, "error": f"HTTP {response['status_code']}: {message}"}
+    try:
+        res_dict = parse_classifier_output(output_text(response["body"]))
+    except ValueError as exc:
+        return {"ok": False, "error": str(exc)}
+    return {"ok": True, "result": {
+        "is_valid": res_dict["valid"],
+        "true_topic": res_dict["true_topic"],
+        "cost": res_dict["cost"],
+    }}
+
+
+# =========================== CLI ============================================
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line for line in f if line.strip()]
+
+
+def _write_lines(path: str, lines: Iterable[str]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line.rstrip("\n") + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build")
+    p.add_argument("requests")
+    p.add_argument("output")
+    p.add_argument("--model", default="gpt-4.1")
+    p = sub.add_parser("submit")
+    p.add_argument("input")
+    p = sub.add_parser("fetch")
+    p.add_argument("batch_id")
+    p.add_argument("output")
+    p = sub.add_parser("run-local")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--concurrency", type=int, default=16)
+    p = sub.add_parser("collect")
+    p.add_argument("input")
+    p.add_argument("batch_output")
+    p.add_argument("results")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        _write_lines(args.output, build_input_lines((json.loads(l) for l in _read_lines(args.requests)), args.model))
+    elif args.cmd == "submit":
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv("API_KEY"))
+        with open(args.input, "rb") as f:
+            file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(input_file_id=file.id, endpoint=BATCH_URL, completion_window="24h")
+        print(batch.id)
+    elif args.cmd == "fetch":
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv("API_KEY"))
+        batch = client.batches.retrieve(args.batch_id)
+        print(f"status={batch.status} counts={batch.request_counts}")
+        if batch.status != "completed":
+            raise SystemExit(1)
+        lines = client.files.content(batch.output_file_id).text.splitlines()
+        if batch.error_file_id:
+            lines += client.files.content(batch.error_file_id).text.splitlines()
+        _write_lines(args.output, lines)
+    elif args.cmd == "run-local":
+        from dotenv import load_dotenv
+        from upstream import UpstreamClient, build_openai_client
+
+        load_dotenv()
+        client = UpstreamClient(build_openai_client(os.getenv("API_KEY")))
+        _write_lines(args.output, asyncio.run(run_local(_read_lines(args.input), client, args.concurrency)))
+    elif args.cmd == "collect":
+        results = collect(_read_lines(args.input), _read_lines(args.batch_output))
+        _write_lines(args.results, (json.dumps(r, ensure_ascii=False) for r in results))
+
+
+if __name__ == "__main__":
+    main()
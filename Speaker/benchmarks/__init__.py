@@ -0,0 +1,4 @@
+import os
+
+# router создаёт AsyncOpenAI при импорте; бенчмарки подменяют клиент заглушкой
+os.environ.setdefault("API_KEY", "benchmark")
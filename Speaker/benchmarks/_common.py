@@ -0,0 +1,76 @@
+"""Общие утилиты для бенчмарков Speaker.
+
+Скрипты запускаются из каталога Speaker:
+    python -m benchmarks.<name> [--опции]
+"""
+import asyncio
+import json
+import statistics
+from types import SimpleNamespace
+from typing import Any, Iterable, Optional
+
+VALIDATION_OUTPUT = json.dumps({"valid": 1, "true_topic_idx": 3, "cost": 2})
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """q-й перцентиль (0..100) по методу nearest-rank."""
+    data = sorted(samples)
+    if not data:
+        return 0.0
+    k = max(0, min(len(data) - 1, int(round(q / 100 * len(data))) - 1))
+    return data[k]
+
+
+def report(title: str, latencies_s: list[float], total_s: Optional[float] = None) -> None:
+    """Печатает p50/p99/mean в миллисекундах (и rps, если известна общая длительность)."""
+    ms = [x * 1000 for x in latencies_s]
+    line = (
+        f"{title:<28} n={len(ms):<6} "
+        f"p50={percentile(ms, 50):8.2f}ms  p99={percentile(ms, 99):8.2f}ms  "
+        f"mean={statistics.fmean(ms) if ms else 0:8.2f}ms"
+    )
+    if total_s:
+        line += f"  rps={len(ms) / total_s:10.1f}"
+    print(line)
+
+
+class StubResponses:
+    """Подмена `client.responses`: ждёт `latency` секунд и отдаёт фиксированный текст.
+
+    При stream=True первый фрагмент приходит через `ttft` секунд,
+    остальные равномерно до `latency`.
+    """
+
+    def __init__(self, latency: float, ttft: Optional[float] = None):
+        self.latency = latency
+        self.ttft = latency * 0.2 if ttft is None else ttft
+        self.calls = 0
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls += 1
+        is_classifier = "tools" not in kwargs
+        text = VALIDATION_OUTPUT if is_classifier else "Ответ Pinky " + "бла " * 200
+        if kwargs.get("stream"):
+            return self._stream(text)
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(
+            output_text=text,
+            usage=SimpleNamespace(input_tokens=1500, output_tokens=len(text) // 4,
+                                  input_tokens_details=SimpleNamespace(cached_tokens=0)),
+        )
+
+
+    async def _stream(self, text: str, chunk: int = 16):
+        parts = [text[i:i + chunk] for i in range(0, len(text), chunk)]
+        await asyncio.sleep(self.ttft)
+        step = max(0.0, self.latency - self.ttft) / max(1, len(parts) - 1)
+        for i, part in enumerate(parts):
+            if i:
+                await asyncio.sleep(step)
+            yield SimpleNamespace(type="response.output_text.delta", delta=part)
+        yield SimpleNamespace(type="response.completed")
+
+
+class StubOpenAI:
+    def __init__(self, latency: float = 0.8, ttft: Optional[float] = None):
+        self.responses = StubResponses(latency, ttft)
@@ -0,0 +1,47 @@
+"""Быстрый классификатор: точность, покрытие при пороге и латентность на отложенной выборке.
+
+    python -m benchmarks.bench_fast_classifier --data classifier_log.jsonl --threshold 0.9
+"""
+import argparse
+import random
+import time
+
+from benchmarks._common import report
+from fast_classifier import FastClassifier, _columns, evaluate, read_log
+
+
+def run(args) -> None:
+    rows = read_log(args.data)
+    random.seed(args.seed)
+    random.shuffle(rows)
+    split = int(len(rows) * (1 - args.holdout))
+    train, holdout = rows[:split], rows[split:]
+
+    t0 = time.perf_counter()
+    model = FastClassifier().fit(*_columns(train))
+    print(f"trained on {len(train)} rows in {time.perf_counter() - t0:.2f}s")
+
+    for threshold in sorted({0.5, 0.7, 0.8, 0.9, 0.95, args.threshold}):
+        print(f"threshold={threshold:.2f} {evaluate(model, holdout, threshold)}")
+
+    queries = [r["query"] for r in holdout]
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        model.predict(q)
+        latencies.append(time.perf_counter() - t0)
+    report("single predict", latencies)
+
+    t0 = time.perf_counter()
+    model.predict_batch(queries)
+    dt = time.perf_counter() - t0
+    print(f"batch predict: {len(queries)} queries in {dt * 1000:.1f}ms ({len(queries) / dt:.0f} q/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", required=True, help="JSONL из CLASSIFIER_LOG_PATH")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,76 @@
+"""Байты, уходящие в OpenAI, и CPU на картинку: base64 «как есть» против images.py.
+
+Без --dir генерируются синтетические «фото» (шум + градиент, JPEG q92) в размерах
+Telegram (1280×960) и камеры телефона (4032×3024). Второй прогон через ImagePipeline
+показывает повторное фото (дедупликация по sha256).
+
+    python -m benchmarks.bench_images --dir ./photos
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks._common import report
+from images import ImagePipeline, process_image
+
+
+def synthetic(width: int, height: int) -> bytes:
+    noise = Image.effect_noise((width, height), 48).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = BytesIO()
+    Image.blend(noise, gradient, 0.6).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def load(args) -> list[tuple[str, bytes]]:
+    if args.dir:
+        out = []
+        for name in sorted(os.listdir(args.dir)):
+            with open(os.path.join(args.dir, name), "rb") as f:
+                out.append((name, f.read()))
+        return out
+    return [(f"{w}x{h}#{i}", synthetic(w, h)) for w, h in ((1280, 960), (4032, 3024)) for i in range(args.n)]
+
+
+async def run(args) -> None:
+    images = load(args)
+    before = after = 0
+    cpu: list[float] = []
+    for name, raw in images:
+        t0 = time.process_time()
+        prepared = process_image(raw, hashlib.sha256(raw).hexdigest())
+        cpu.append(time.process_time() - t0)
+        before += len(f"data:image/jpeg;base64,{base64.b64encode(raw).decode()}")
+        after += len(prepared.data_url)
+        if args.verbose:
+            print(f"{name:<24} {len(raw):>9}B -> {prepared.prepared_bytes:>8}B "
+                  f"{prepared.width}x{prepared.height}")
+
+    report("prepare CPU per image", cpu)
+    print(f"{'':<28} upstream bytes: raw base64={before / len(images) / 1024:.0f}KiB/img "
+          f"prepared={after / len(images) / 1024:.0f}KiB/img ({after / before:.1%})")
+
+    pipeline = ImagePipeline(redis_url=None)
+    for title in ("pipeline first pass", "pipeline repeat (dedupe)"):
+        latencies = []
+        t0 = time.perf_counter()
+        for _, raw in images:
+            t1 = time.perf_counter()
+            await pipeline.prepare(raw)
+            latencies.append(time.perf_counter() - t1)
+        report(title, latencies, time.perf_counter() - t0)
+    print(f"{'':<28} stats={pipeline.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("-n", type=int, default=10, help="синтетических фото каждого размера")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,122 @@
+"""Стоимость входных токенов и задержка: старая сборка промптов против prompt_builder.
+
+«До» — form_messages с датой/временем внутри системного промпта (как задумывал
+плейсхолдер {time} в BEAUTY_SYSTEM_PROMPT), «после» — готовые скелеты с датой в хвосте.
+
+По умолчанию OpenAI заменён заглушкой, которая моделирует кэш промптов: префикс
+кэшируется блоками по 128 токенов начиная с --min-prefix, закэшированные токены
+дешевле и не добавляют задержки. С --real запросы идут в настоящий API (нужен API_KEY),
+и доля кэша берётся из usage.
+
+    python -m benchmarks.bench_prompt_cache -n 200
+    python -m benchmarks.bench_prompt_cache -n 20 --real
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any
+
+from benchmarks._common import report
+from prompt_builder import TOPIC_SKELETONS
+from prompts import DATE_CONTEXT_TEMPLATE, DATED_TOPICS, topic_system_prompts
+from utils import form_messages
+
+# gpt-4.1, $ за 1M токенов
+PRICE_INPUT = 2.00
+PRICE_CACHED = 0.50
+CHARS_PER_TOKEN = 3
+
+
+class PrefixCachingStub:
+    def __init__(self, base_latency: float, per_token_ms: float, min_prefix: int, tool_tokens: int):
+        self.base_latency = base_latency
+        self.per_token_ms = per_token_ms
+        self.min_prefix = min_prefix
+        self.tool_tokens = tool_tokens
+        self._seen: set[str] = set()
+        self.responses = self
+
+    async def create(self, **kwargs: Any) -> SimpleNamespace:
+        text = json.dumps(kwargs.get("input"), ensure_ascii=False)
+        tools = self.tool_tokens if kwargs.get("tools") else 0
+        total = tools + len(text) // CHARS_PER_TOKEN
+        cached = 0
+        boundary = self.min_prefix
+        while boundary <= total:
+            prefix = text[:max(0, boundary - tools) * CHARS_PER_TOKEN]
+            digest = hashlib.sha256(prefix.encode()).hexdigest()
+            if digest in self._seen and boundary == cached + (self.min_prefix if not cached else 128):
+                cached = boundary
+            self._seen.add(digest)
+            boundary += 128
+        await asyncio.sleep(self.base_latency + (total - cached) * self.per_token_ms / 1000)
+        return SimpleNamespace(
+            output_text="ok",
+            usage=SimpleNamespace(input_tokens=total, output_tokens=300,
+                                  input_tokens_details=SimpleNamespace(cached_tokens=cached)),
+        )
+
+
+def legacy_messages(topic: str, query: str) -> list[dict]:
+    system_prompt = topic_system_prompts[topic]
+    if topic in DATED_TOPICS:
+        now = datetime.now().strftime("%d.%m.%Y %H:%M:%S.%f")
+        system_prompt = f"{DATE_CONTEXT_TEMPLATE.format(date=now)}\n\n{system_prompt}"
+    return form_messages(prompt=query, system_prompt=system_prompt)
+
+
+def skeleton_messages(topic: str, query: str) -> list[dict]:
+    return TOPIC_SKELETONS[topic].build(query)
+
+
+async def run(args) -> None:
+    if args.real:
+        import router
+
+        raw = router.client.raw
+    topics = [args.topic] if args.topic else list(topic_system_prompts)
+
+    for title, build in (("legacy form_messages", legacy_messages), ("prompt_builder", skeleton_messages)):
+        if not args.real:
+            raw = PrefixCachingStub(args.base_latency, args.per_token_ms, args.min_prefix, args.tool_tokens)
+        random.seed(args.seed)
+        latencies: list[float] = []
+        build_s: list[float] = []
+        input_tokens = cached_tokens = 0
+        for i in range(args.n):
+            topic = random.choice(topics)
+            t0 = time.perf_counter()
+            messages = build(topic, f"Вопрос номер {i}: что посоветуешь?")
+            build_s.append(time.perf_counter() - t0)
+            response = await raw.responses.create(
+                model="gpt-4.1", tools=[{"type": "web_search_preview"}], input=messages,
+                **({"max_output_tokens": 16} if args.real else {}),
+            )
+            latencies.append(time.perf_counter() - t0)
+            input_tokens += response.usage.input_tokens
+            cached_tokens += response.usage.input_tokens_details.cached_tokens or 0
+
+        cost = ((input_tokens - cached_tokens) * PRICE_INPUT + cached_tokens * PRICE_CACHED) / 1e6
+        report(f"{title} build", build_s)
+        report(f"{title} request", latencies)
+        print(f"{'':<28} input={input_tokens} cached={cached_tokens} "
+              f"({cached_tokens / input_tokens:.1%}) input cost=${cost:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--topic", default=None, help="одна тема вместо случайных")
+    parser.add_argument("--real", action="store_true")
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--per-token-ms", type=float, default=0.05)
+    parser.add_argument("--min-prefix", type=int, default=1024)
+    parser.add_argument("--tool-tokens", type=int, default=600,
+                        help="скрытые инструкции web_search_preview в начале запроса (оценка)")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
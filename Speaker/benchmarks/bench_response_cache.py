@@ -0,0 +1,80 @@
+"""Реплей журнала запросов через эндпоинты Speaker с кэшем и без, OpenAI — заглушка.
+
+Журнал — JSONL вида {"endpoint": "validation" | "general_inference", "payload": {...}}.
+Без --log генерируется синтетический журнал с повторами (Zipf).
+
+    python -m benchmarks.bench_response_cache --log queries.jsonl --latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import router
+from benchmarks._common import StubOpenAI, report
+from cache import ResponseCache
+from configs import CONFIG_CACHE
+from upstream import UpstreamClient
+
+TOPICS = ["Разбор переписки", "Астрология", "Косметика и уход", "Здоровье и спорт", "Стиль", "Учёба"]
+
+
+def synthetic_log(n: int, distinct: int) -> list[dict]:
+    weights = [1 / (i + 1) for i in range(distinct)]
+    out = []
+    for i in random.choices(range(distinct), weights=weights, k=n):
+        topic = TOPICS[i % len(TOPICS)]
+        query = f"  Вопрос номер {i}:  что  посоветуешь? "
+        if random.random() < 0.7:
+            out.append({"endpoint": "validation", "payload": {"query": query, "chosen_topic": topic}})
+        else:
+            out.append({"endpoint": "general_inference", "payload": {"query": query, "topic": topic}})
+    return out
+
+
+async def replay(entries: list[dict], concurrency: int) -> tuple[list[float], float]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(entry: dict) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            if entry["endpoint"] == "validation":
+                await router.check_validity_and_cost(router.ValidationRequest(**entry["payload"]))
+            else:
+                await router.general_inference(router.InferenceRequest(**entry["payload"]))
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(e) for e in entries))
+    return latencies, time.perf_counter() - t0
+
+
+async def run(args) -> None:
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    else:
+        entries = synthetic_log(args.n, args.distinct)
+
+    for title, ttl in (("no cache", 0), ("cache", None)):
+        router.client = UpstreamClient(StubOpenAI(args.latency), limits={"default": 1000}, rpm=0, tpm=0)
+        router.response_cache = ResponseCache(redis_url=args.redis_url)
+        CONFIG_CACHE.validation_ttl = 0 if ttl == 0 else 86400
+        CONFIG_CACHE.inference_ttl = 0 if ttl == 0 else 600
+        latencies, total = await replay(entries, args.concurrency)
+        report(title, latencies, total)
+        print(f"{'':<28} upstream calls={router.client.raw.responses.calls} "
+              f"stats={router.response_cache.stats()['endpoints']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--log", default=None)
+    parser.add_argument("-n", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-url", default=None)
+    asyncio.run(run(parser.parse_args()))
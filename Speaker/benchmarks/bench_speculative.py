@@ -0,0 +1,69 @@
+"""Воспринимаемая задержка от «✅ Да» до ответа: обычный путь против спекулятивного.
+
+Сценарий пользователя: валидация → пауза на раздумье (экспоненциальная, среднее --think)
+→ «Да» или, с вероятностью --no-rate, «Нет». OpenAI — заглушка с задержкой --latency.
+Кэш отключён. Кроме задержки печатается число вызовов upstream — цена отменённых
+спекуляций.
+
+    python -m benchmarks.bench_speculative -n 300 --think 3 --latency 6 --no-rate 0.2
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import router
+from benchmarks._common import StubOpenAI, report
+from cache import ResponseCache
+from configs import CONFIG_CACHE
+from speculative import SpeculativeRunner
+from upstream import UpstreamClient
+
+
+async def user(i: int, args, speculative: bool, latencies: list[float]) -> None:
+    payload = router.SpeculativeValidationRequest(query=f"Вопрос {i}", chosen_topic="Здоровье и спорт")
+    if speculative:
+        v = await router.validate_and_speculate(payload)
+    else:
+        v = await router.check_validity_and_cost(payload)
+
+    await asyncio.sleep(random.expovariate(1 / args.think) if args.think else 0)
+
+    if random.random() < args.no_rate:
+        if speculative:
+            await router.speculative_cancel(v["request_id"])
+        return
+
+    t0 = time.perf_counter()
+    if speculative and v["speculative"]:
+        await router.speculative_confirm(v["request_id"])
+    else:
+        await router.general_inference(router.InferenceRequest(query=payload.query, topic=v["true_topic"]))
+    latencies.append(time.perf_counter() - t0)
+
+
+async def run(args) -> None:
+    CONFIG_CACHE.validation_ttl = 0
+    CONFIG_CACHE.inference_ttl = 0
+    for title, speculative in (("confirm->answer baseline", False), ("confirm->answer speculative", True)):
+        random.seed(args.seed)
+        router.client = UpstreamClient(StubOpenAI(args.latency), limits={"default": 1000}, rpm=0, tpm=0)
+        router.response_cache = ResponseCache(redis_url=None)
+        router.speculative_runner = SpeculativeRunner(max_inflight=args.max_inflight, ttl=args.ttl)
+        latencies: list[float] = []
+        await asyncio.gather(*(user(i, args, speculative, latencies) for i in range(args.n)))
+        report(title, latencies)
+        print(f"{'':<28} upstream calls={router.client.raw.responses.calls} "
+              f"speculative={router.speculative_runner.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=300)
+    parser.add_argument("--think", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=6.0)
+    parser.add_argument("--no-rate", type=float, default=0.2)
+    parser.add_argument("--max-inflight", type=int, default=32)
+    parser.add_argument("--ttl", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""Время до первого токена: /general_inference против /general_inference/stream.
+
+OpenAI — заглушка: первый фрагмент через --ttft секунд, весь ответ через --latency.
+Кэш отключён, чтобы каждый запрос шёл в upstream.
+
+    python -m benchmarks.bench_streaming -n 200 --latency 6 --ttft 0.6
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import router
+from benchmarks._common import StubOpenAI, report
+from cache import ResponseCache
+from configs import CONFIG_CACHE
+from upstream import UpstreamClient
+
+
+async def blocking(payload: router.InferenceRequest) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    await router.general_inference(payload)
+    total = time.perf_counter() - t0
+    return total, total
+
+
+async def streaming(payload: router.InferenceRequest) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    first = None
+    async for line in router._stream_inference(payload):
+        if first is None and json.loads(line)["type"] == "delta":
+            first = time.perf_counter() - t0
+    return first, time.perf_counter() - t0
+
+
+async def run(args) -> None:
+    CONFIG_CACHE.inference_ttl = 0
+    router.response_cache = ResponseCache(redis_url=None)
+    for title, fn in (("blocking", blocking), ("stream", streaming)):
+        router.client = UpstreamClient(StubOpenAI(args.latency, args.ttft), limits={"default": 1000}, rpm=0, tpm=0)
+        sem = asyncio.Semaphore(args.concurrency)
+        ttfts: list[float] = []
+        totals: list[float] = []
+
+        async def one(i: int) -> None:
+            async with sem:
+                payload = router.InferenceRequest(query=f"Вопрос {i}", topic="Стиль")
+                ttft, total = await fn(payload)
+                ttfts.append(ttft)
+                totals.append(total)
+
+        await asyncio.gather(*(one(i) for i in range(args.n)))
+        report(f"{title} ttft", ttfts)
+        report(f"{title} total", totals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=6.0)
+    parser.add_argument("--ttft", type=float, default=0.6)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
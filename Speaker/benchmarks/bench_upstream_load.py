@@ -0,0 +1,86 @@
+"""Нагрузочный тест клиента OpenAI против локального фейка (benchmarks/fake_openai.py).
+
+Сравнивает «голый» AsyncOpenAI (ретраи SDK по умолчанию) и UpstreamClient
+(пул, семафоры, RPM/TPM, Retry-After, circuit breaker) при всплеске запросов,
+превышающем лимит фейка. Фейк поднимается в том же процессе.
+
+    python -m benchmarks.bench_upstream_load -n 600 --rpm 300 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import uvicorn
+from openai import AsyncOpenAI
+
+from benchmarks._common import report
+from benchmarks.fake_openai import create_app
+from upstream import UpstreamClient, build_openai_client
+
+MESSAGES = [
+    {"role": "system", "content": [{"type": "input_text", "text": "system " * 200}]},
+    {"role": "user", "content": [{"type": "input_text", "text": "Что посоветуешь?"}]},
+]
+
+
+async def burst(call, n: int) -> tuple[list[float], Counter, float]:
+    latencies: list[float] = []
+    outcomes: Counter = Counter()
+
+    async def one() -> None:
+        t0 = time.perf_counter()
+        try:
+            await call()
+        except Exception as exc:  # noqa: BLE001
+            outcomes[type(exc).__name__] += 1
+            return
+        outcomes["ok"] += 1
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    return latencies, outcomes, time.perf_counter() - t0
+
+
+async def run(args) -> None:
+    app = create_app(args.latency, args.rpm, args.error_rate)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    try:
+        raw = AsyncOpenAI(api_key="benchmark", base_url=base_url)
+        managed = UpstreamClient(build_openai_client("benchmark", base_url=base_url),
+                                 rpm=args.client_rpm, tpm=args.client_tpm)
+        scenarios = (
+            ("raw AsyncOpenAI", lambda: raw.responses.create(model="gpt-4.1", input=MESSAGES)),
+            ("UpstreamClient", lambda: managed.create("validation", model="gpt-4.1", input=MESSAGES)),
+        )
+        for title, call in scenarios:
+            app.state.counters.clear()
+            latencies, outcomes, total = await burst(call, args.n)
+            report(title, latencies, total)
+            print(f"{'':<28} outcomes={dict(outcomes)} server={dict(app.state.counters)}")
+            # окно лимита фейка — минута; ждём, чтобы сценарии не мешали друг другу
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+        print(f"{'':<28} upstream stats={managed.stats()}")
+    finally:
+        server.should_exit = True
+        await serve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=600)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--rpm", type=int, default=300, help="лимит фейка")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--client-rpm", type=float, default=280, help="лимит UpstreamClient")
+    parser.add_argument("--client-tpm", type=float, default=0)
+    parser.add_argument("--cooldown", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
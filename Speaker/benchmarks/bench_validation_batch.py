@@ -0,0 +1,67 @@
+"""Пропускная способность классификации: по одному запросу против /validation/batch и batch.py run-local.
+
+OpenAI — заглушка с задержкой --latency, кэш выключен (все запросы уникальны).
+
+    python -m benchmarks.bench_validation_batch -n 500 --latency 0.8 --concurrency 8 32 64
+"""
+import argparse
+import asyncio
+import time
+
+import batch
+import router
+from benchmarks._common import StubOpenAI
+from configs import CONFIG_BATCH, CONFIG_CACHE
+from upstream import UpstreamClient
+
+TOPICS = ["Разбор переписки", "Астрология", "Косметика и уход", "Здоровье и спорт", "Стиль", "Учёба"]
+
+
+def items(n: int) -> list[router.ValidationRequest]:
+    return [router.ValidationRequest(query=f"Вопрос {i}: что посоветуешь?", chosen_topic=TOPICS[i % len(TOPICS)])
+            for i in range(n)]
+
+
+def line(title: str, n: int, elapsed: float, errors: int = 0) -> None:
+    print(f"{title:<32} n={n:<6} {elapsed:8.2f}s  {n / elapsed:8.1f} items/s  errors={errors}")
+
+
+def fresh_client(latency: float) -> UpstreamClient:
+    return UpstreamClient(StubOpenAI(latency), limits={"default": 1000}, rpm=0, tpm=0)
+
+
+async def run(args) -> None:
+    CONFIG_CACHE.validation_ttl = 0
+    router.fast_classifier = None
+    data = items(args.n)
+
+    router.client = fresh_client(args.latency)
+    t0 = time.perf_counter()
+    for item in data[:args.sequential]:
+        await router.check_validity_and_cost(item)
+    line("sequential", args.sequential, time.perf_counter() - t0)
+
+    for concurrency in args.concurrency:
+        CONFIG_BATCH.concurrency = concurrency
+        router.client = fresh_client(args.latency)
+        t0 = time.perf_counter()
+        out = await router.check_validity_batch(router.ValidationBatchRequest(items=data))
+        errors = sum(not r["ok"] for r in out["results"])
+        line(f"/validation/batch c={concurrency}", args.n, time.perf_counter() - t0, errors)
+
+    lines = list(batch.build_input_lines((item.model_dump() for item in data), "gpt-4.1"))
+    for concurrency in args.concurrency:
+        t0 = time.perf_counter()
+        output = await batch.run_local(lines, fresh_client(args.latency), concurrency)
+        results = batch.collect(lines, output)
+        line(f"batch.py run-local c={concurrency}", args.n, time.perf_counter() - t0,
+             sum(not r["ok"] for r in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=500)
+    parser.add_argument("--sequential", type=int, default=20, help="сколько запросов прогнать по одному")
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64])
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""Проверка circuit breaker: отменённый пробный запрос не запирает upstream.
+
+Breaker переводится в half_open, пробный вызов к заглушке OpenAI отменяется
+(asyncio.wait_for с таймаутом меньше задержки заглушки — так же, как отмена
+спекуляции или обрыв стрима). Следующий вызов должен пройти и закрыть breaker.
+Затем то же для отказа: пробный вызов падает с ошибкой сети, breaker снова open.
+Код выхода 1 при любом расхождении.
+
+    python -m benchmarks.check_breaker
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import openai
+
+from benchmarks._common import StubOpenAI, StubResponses
+from upstream import CircuitOpen, UpstreamClient
+
+
+class FailingResponses(StubResponses):
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        raise openai.APIConnectionError(request=httpx.Request("POST", "http://upstream/v1/responses"))
+
+
+def _half_open(client: UpstreamClient) -> None:
+    breaker = client.breaker
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+
+
+def _call(client: UpstreamClient):
+    return client.create("validation", input=[{"role": "user", "content": "ping"}])
+
+
+async def check_cancelled_probe() -> list[str]:
+    client = UpstreamClient(StubOpenAI(latency=0.2), rpm=0, tpm=0)
+    _half_open(client)
+    errors = []
+    try:
+        await asyncio.wait_for(_call(client), timeout=0.05)
+        errors.append("probe was expected to time out")
+    except asyncio.TimeoutError:
+        pass
+    if client.breaker.state != "half_open":
+        errors.append(f"cancelled probe changed state to {client.breaker.state}")
+    try:
+        await _call(client)
+    except CircuitOpen:
+        errors.append("next call after a cancelled probe got CircuitOpen")
+    if client.breaker.state != "closed":
+        errors.append(f"successful probe left breaker {client.breaker.state}")
+    return errors
+
+
+async def check_failed_probe() -> list[str]:
+    raw = StubOpenAI(latency=0.01)
+    raw.responses = FailingResponses(latency=0.01)
+    client = UpstreamClient(raw, rpm=0, tpm=0)
+    _half_open(client)
+    errors = []
+    task = asyncio.create_task(_call(client))
+    await asyncio.sleep(0.005)
+    if not client.breaker._probe:
+        errors.append("half-open call is not marked as the probe")
+    try:
+        await _call(client)
+        errors.append("second call during the probe was let through")
+    except CircuitOpen:
+        pass
+    try:
+        await task
+    except (openai.APIConnectionError, CircuitOpen):
+        pass
+    if client.breaker.state != "open":
+        errors.append(f"failed probe left breaker {client.breaker.state}")
+    return errors
+
+
+async def run() -> int:
+    errors = await check_cancelled_probe() + await check_failed_probe()
+    for error in errors:
+        print(f"FAILED   {error}")
+    print("FAILED" if errors else "OK")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
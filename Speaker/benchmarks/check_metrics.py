@@ -0,0 +1,137 @@
+"""Проверка /metrics: синтетическая нагрузка на приложение, затем разбор выдачи.
+
+Запросы идут в main.app через ASGI-транспорт httpx, OpenAI — заглушка; запросы
+с «FAIL» в тексте падают в upstream с 400 (в стриме — speaker_failures_total). Повторяющиеся вопросы и повторная
+загрузка фото дают попадания в кэши. Код выхода 1, если какой-то ожидаемый ряд
+отсутствует или равен нулю.
+
+    python -m benchmarks.check_metrics -n 40
+"""
+import argparse
+import asyncio
+import sys
+from io import BytesIO
+
+import httpx
+from PIL import Image
+from prometheus_client.parser import text_string_to_metric_families
+
+import router
+from benchmarks._common import StubOpenAI, StubResponses
+from cache import ResponseCache
+from images import ImagePipeline
+from main import app
+from upstream import UpstreamClient
+
+TOPICS = ["Стиль", "Астрология", "Учёба"]
+
+
+class UpstreamError(Exception):
+    status_code = 400
+
+
+class FailingResponses(StubResponses):
+    async def create(self, **kwargs):
+        if "FAIL" in str(kwargs.get("input")):
+            await asyncio.sleep(self.latency)
+            raise UpstreamError("bad request")
+        return await super().create(**kwargs)
+
+
+# (имя сэмпла, обязательные метки) — значение должно быть > 0
+EXPECTED = [
+    ("speaker_http_request_duration_seconds_count", {"route": "/chat_ai/validation", "status": "200"}),
+    ("speaker_http_request_duration_seconds_count", {"route": "/chat_ai/general_inference", "status": "500"}),
+    ("speaker_openai_request_duration_seconds_count", {"endpoint": "validation", "outcome": "ok"}),
+    ("speaker_openai_request_duration_seconds_count", {"endpoint": "general_inference", "topic": "Стиль"}),
+    ("speaker_openai_request_duration_seconds_count", {"endpoint": "general_inference", "outcome": "error"}),
+    ("speaker_openai_tokens_total", {"endpoint": "validation", "kind": "input"}),
+    ("speaker_openai_tokens_total", {"endpoint": "general_inference", "kind": "output"}),
+    ("speaker_openai_errors_total", {"endpoint": "general_inference", "error": "400"}),
+    ("speaker_cache_requests_total", {"cache": "response", "endpoint": "validation", "result": "miss"}),
+    ("speaker_cache_requests_total", {"cache": "response", "endpoint": "validation", "result": "local_hit"}),
+    ("speaker_cache_requests_total", {"cache": "image", "result": "hit"}),
+    ("speaker_failures_total", {"component": "general_inference_stream", "operation": "upstream"}),
+]
+
+
+def jpeg(size: int = 1200) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (size, size * 3 // 4), "pink").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+async def workload(client: httpx.AsyncClient, n: int) -> None:
+    async def one(i: int) -> None:
+        topic = TOPICS[i % len(TOPICS)]
+        # 5 разных вопросов на тему — остальные попадают в кэш
+        query = f"Вопрос {i % 5}"
+        await client.post("/chat_ai/validation", json={"query": query, "chosen_topic": topic})
+        await client.post("/chat_ai/general_inference", json={"query": query, "topic": topic})
+        if i % 4 == 0:
+            async with client.stream("POST", "/chat_ai/general_inference/stream",
+                                     json={"query": f"Поток {i}", "topic": topic}) as r:
+                async for _ in r.aiter_lines():
+                    pass
+        if i % 10 == 0:
+            await client.post("/chat_ai/general_inference", json={"query": f"FAIL {i}", "topic": topic})
+            async with client.stream("POST", "/chat_ai/general_inference/stream",
+                                     json={"query": f"FAIL {i}", "topic": topic}) as r:
+                async for _ in r.aiter_lines():
+                    pass
+
+    # одновременные одинаковые запросы склеиваются (coalesced); повтор после — local_hit
+    await asyncio.gather(*(one(i) for i in range(n)))
+    for i in range(len(TOPICS) * 5):
+        await client.post("/chat_ai/validation", json={"query": f"Вопрос {i % 5}", "chosen_topic": TOPICS[i % 3]})
+    photo = jpeg()
+    for _ in range(2):
+        await client.post("/chat_ai/images", files={"image": ("p.jpg", photo, "image/jpeg")})
+
+
+def check(text: str) -> list[str]:
+    samples = [s for family in text_string_to_metric_families(text) for s in family.samples]
+    missing = []
+    for name, labels in EXPECTED:
+        total = sum(s.value for s in samples
+                    if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()))
+        status = "ok " if total > 0 else "MISSING"
+        print(f"{status:<8} {name}{labels} = {total:g}")
+        if total <= 0:
+            missing.append(name)
+
+    hits, total = {}, {}
+    for s in samples:
+        if s.name == "speaker_cache_requests_total":
+            key = (s.labels["cache"], s.labels["endpoint"])
+            total[key] = total.get(key, 0) + s.value
+            if s.labels["result"] != "miss":
+                hits[key] = hits.get(key, 0) + s.value
+    for key in sorted(total):
+        print(f"hit ratio {key[0]}/{key[1]}: {hits.get(key, 0) / total[key]:.2f}")
+    return missing
+
+
+async def run(args) -> int:
+    stub = StubOpenAI(args.latency)
+    stub.responses = FailingResponses(args.latency)
+    router.client = UpstreamClient(stub, limits={"default": 1000}, rpm=0, tpm=0)
+    router.response_cache = ResponseCache(redis_url=None)
+    router.image_pipeline = ImagePipeline(redis_url=None)
+    router.fast_classifier = None
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://speaker", timeout=60) as client:
+        await workload(client, args.n)
+        r = await client.get("/metrics")
+        r.raise_for_status()
+    missing = check(r.text)
+    print("FAILED" if missing else "OK")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.01)
+    sys.exit(asyncio.run(run(parser.parse_args())))
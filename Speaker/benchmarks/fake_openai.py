@@ -0,0 +1,90 @@
+"""Локальный фейк OpenAI Responses API для нагрузочных тестов.
+
+Отвечает на POST /v1/responses через `latency` секунд. Сверх `rpm` запросов за
+скользящую минуту — 429 с Retry-After, с вероятностью `error_rate` — 500.
+GET /stats — счётчики ответов.
+
+    python -m benchmarks.fake_openai --port 8900 --rpm 600 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter, deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency: float = 0.5, rpm: int = 0, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    window: deque[float] = deque()
+    counters: Counter = Counter()
+
+    @app.post("/v1/responses")
+    async def responses(request: Request) -> JSONResponse:
+        body = await request.json()
+        now = time.monotonic()
+        while window and window[0] <= now - 60:
+            window.popleft()
+        if rpm and len(window) >= rpm:
+            counters["429"] += 1
+            retry_after = max(0.1, window[0] + 60 - now)
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after-ms": str(int(retry_after * 1000))},
+            )
+        window.append(now)
+
+        await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            counters["500"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "boom", "type": "server_error"}})
+
+        counters["200"] += 1
+        text = '{"valid": 1, "true_topic_idx": 3, "cost": 2}' if "tools" not in body else "Ответ " + "бла " * 100
+        return JSONResponse({
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": body.get("model"),
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": 1500,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": len(text) // 4,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": 1500 + len(text) // 4,
+            },
+        })
+
+    @app.get("/stats")
+    async def stats() -> dict:
+        return dict(counters)
+
+    app.state.counters = counters
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.rpm, args.error_rate), host="127.0.0.1", port=args.port)
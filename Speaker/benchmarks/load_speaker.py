@@ -0,0 +1,156 @@
+"""Нагрузка на запущенный Speaker в стиле wrk: C соединений, D секунд, закрытый цикл.
+
+Поднимает фейковый OpenAI (benchmarks/fake_openai.py) и Speaker (`python main.py`)
+отдельными процессами с SPEAKER_WORKERS=--workers, кэш и лимиты upstream выключены.
+С --drain через половину времени Speaker получает SIGTERM: запросы, начатые до
+сигнала, должны завершиться успешно.
+
+    python -m benchmarks.load_speaker --workers 1 4 -c 64 -d 20
+    python -m benchmarks.load_speaker --workers 4 -c 64 -d 20 --drain
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks._common import report
+
+TOPICS = ["Разбор переписки", "Астрология", "Косметика и уход", "Здоровье и спорт", "Стиль", "Учёба"]
+
+
+def start(cmd: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen(cmd, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout}s")
+
+
+def make_request(i: int, image_b64: str | None) -> tuple[str, dict]:
+    topic = TOPICS[i % len(TOPICS)]
+    if random.random() < 0.7:
+        payload = {"query": f"Вопрос {i}: что посоветуешь?", "chosen_topic": topic}
+        path = "/chat_ai/validation"
+    else:
+        payload = {"query": f"Вопрос {i}: что посоветуешь?", "topic": topic}
+        path = "/chat_ai/general_inference"
+    if image_b64:
+        payload["base64_image"] = image_b64
+    return path, payload
+
+
+async def load(base: str, connections: int, duration: float, image_b64: str | None,
+               speaker: subprocess.Popen, drain: bool) -> None:
+    latencies: list[float] = []
+    outcomes: Counter = Counter()
+    sigterm_at = None
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        async def worker(w: int) -> None:
+            i = w
+            while time.monotonic() < stop_at:
+                path, payload = make_request(i, image_b64)
+                i += connections
+                t0 = time.monotonic()
+                before_signal = sigterm_at is None or t0 < sigterm_at
+                try:
+                    r = await client.post(path, json=payload)
+                    key = "ok" if r.status_code == 200 else f"http_{r.status_code}"
+                except httpx.HTTPError as exc:
+                    key = type(exc).__name__
+                if key == "ok":
+                    latencies.append(time.monotonic() - t0)
+                if sigterm_at is not None:
+                    key += " (started before SIGTERM)" if before_signal else " (after SIGTERM)"
+                outcomes[key] += 1
+                if sigterm_at is not None and not before_signal:
+                    return
+
+        async def terminate() -> None:
+            nonlocal sigterm_at
+            await asyncio.sleep(duration / 2)
+            sigterm_at = time.monotonic()
+            speaker.send_signal(signal.SIGTERM)
+
+        t0 = time.perf_counter()
+        tasks = [worker(w) for w in range(connections)]
+        if drain:
+            tasks.append(terminate())
+        await asyncio.gather(*tasks)
+        total = time.perf_counter() - t0
+
+    report(f"c={connections}", latencies, total)
+    print(f"{'':<28} outcomes={dict(outcomes)}")
+
+
+async def run(args) -> None:
+    image_b64 = None
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_b64 = base64.b64encode(f.read()).decode()
+
+    fake = start([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                  "--latency", str(args.latency)], {})
+    try:
+        await asyncio.sleep(1)
+        for workers in args.workers:
+            speaker = start([sys.executable, "main.py"], {
+                "API_KEY": "benchmark",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+                "SPEAKER_HOST": "127.0.0.1",
+                "SPEAKER_PORT": str(args.port),
+                "SPEAKER_WORKERS": str(workers),
+                "SPEAKER_DRAIN_DELAY": str(args.drain_delay),
+                "CACHE_VALIDATION_TTL": "0",
+                "CACHE_INFERENCE_TTL": "0",
+                "CACHE_REDIS_URL": "",
+                "UPSTREAM_RPM": "0",
+                "UPSTREAM_TPM": "0",
+                "UPSTREAM_CONCURRENCY": "default=1000",
+                "CLASSIFIER_MODEL_PATH": "",
+            })
+            try:
+                base = f"http://127.0.0.1:{args.port}"
+                await wait_ready(f"{base}/ready")
+                print(f"workers={workers}")
+                await load(base, args.connections, args.duration, image_b64, speaker, args.drain)
+            finally:
+                if speaker.poll() is None:
+                    speaker.send_signal(signal.SIGTERM)
+                speaker.wait(timeout=args.drain_delay + 120)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("-c", "--connections", type=int, default=64)
+    parser.add_argument("-d", "--duration", type=float, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка фейкового OpenAI")
+    parser.add_argument("--image", default=None, help="фото, которое отправлять base64 в каждом запросе")
+    parser.add_argument("--drain", action="store_true")
+    parser.add_argument("--drain-delay", type=float, default=2)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--fake-port", type=int, default=8900)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,200 @@
+"""Кэш ответов OpenAI для эндпоинтов Speaker.
+
+Ключ — sha256 от нормализованных (model, system prompt, query, topic, image_id):
+пробелы в запросе схлопываются, регистр не учитывается. Уровни:
+  1. in-memory LRU с TTL в процессе;
+  2. опционально Redis (CACHE_REDIS_URL) — общий для всех воркеров.
+
+Одинаковые запросы, пришедшие одновременно, выполняются один раз (single-flight):
+остальные ждут результат первого. Если первого отменили, считать продолжает
+один из ждущих — отмена не передаётся чужим запросам.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from configs import CONFIG_CACHE
+from metrics import CACHE_REQUESTS, FAILURES
+
+logger = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WS_RE.sub(" ", query).strip().casefold()
+
+
+def make_key(endpoint: str, model: str, system_prompt: str, query: str,
+             topic: str, image_id: Optional[str] = None) -> str:
+    """image_id — sha256 исходных байт картинки (images.PreparedImage.digest)."""
+    h = hashlib.sha256()
+    for part in (
+        endpoint,
+        model,
+        hashlib.sha256(system_prompt.encode()).hexdigest(),
+        normalize_query(query),
+        topic,
+        image_id or "",
+    ):
+        h.update(part.encode())
+        h.update(b"\x00")
+    return f"speaker:cache:{endpoint}:{h.hexdigest()}"
+
+
+class _LeaderCancelled(Exception):
+    """Запрос, считавший значение для single-flight, отменён; ждущие повторяют попытку."""
+
+
+# счётчик ResponseCache -> значение метки result в speaker_cache_requests_total
+_RESULT_LABELS = {"local_hits": "local_hit", "redis_hits": "redis_hit", "misses": "miss", "coalesced": "coalesced"}
+
+
+class ResponseCache:
+    def __init__(self, size: int = CONFIG_CACHE.local_size, redis_url: Optional[str] = CONFIG_CACHE.redis_url):
+        self.size = size
+        self._local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(redis_url)
+        # метрики по эндпоинтам
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"local_hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0, "redis_errors": 0}
+        )
+
+    def _count(self, endpoint: str, name: str) -> None:
+        self.counters[endpoint][name] += 1
+        result = _RESULT_LABELS.get(name)
+        if result is not None:
+            CACHE_REQUESTS.labels("response", endpoint, result).inc()
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for endpoint, c in self.counters.items():
+            total = c["local_hits"] + c["redis_hits"] + c["misses"] + c["coalesced"]
+            hits = total - c["misses"]
+            out[endpoint] = {**c, "hit_ratio": hits / total if total else 0.0}
+        return {"endpoints": out, "local_size": len(self._local), "inflight": len(self._inflight)}
+
+    # -------- уровни ------------------------------------------------
+
+    def _local_get(self, key: str) -> Any:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: Any, ttl: int) -> None:
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.size:
+            self._local.popitem(last=False)
+
+    async def _redis_get(self, endpoint: str, key: str) -> Any:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(key)
+        except Exception as exc:  # noqa: BLE001
+            self._count(endpoint, "redis_errors")
+            FAILURES.labels("response_cache", "redis_get").inc()
+            logger.warning("cache redis get failed: %s", exc)
+            return None
+        return None if raw is None else json.loads(raw)
+
+    async def _redis_put(self, endpoint: str, key: str, value: Any, ttl: int) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        except Exception as exc:  # noqa: BLE001
+            self._count(endpoint, "redis_errors")
+            FAILURES.labels("response_cache", "redis_set").inc()
+            logger.warning("cache redis set failed: %s", exc)
+
+    # -------- публичный API -----------------------------------------
+
+    async def get(self, endpoint: str, key: str) -> Any:
+        """Значение из кэша (локальный уровень, затем Redis) или None."""
+        value = self._local_get(key)
+        if value is not None:
+            self._count(endpoint, "local_hits")
+            return value
+        value = await self._redis_get(endpoint, key)
+        if value is not None:
+            self._count(endpoint, "redis_hits")
+            return value
+        self._count(endpoint, "misses")
+        return None
+
+    async def set(self, endpoint: str, key: str, value: Any, ttl: int) -> None:
+        if ttl <= 0:
+            return
+        self._local_put(key, value, ttl)
+        await self._redis_put(endpoint, key, value, ttl)
+
+    async def get_or_compute(self, endpoint: str, key: str, ttl: int,
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат из кэша или `compute()`; значение должно быть JSON-сериализуемым."""
+        if ttl <= 0:
+            self._count(endpoint, "misses")
+            return await compute()
+
+        while True:
+            value = self._local_get(key)
+            if value is not None:
+                self._count(endpoint, "local_hits")
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self._count(endpoint, "coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # первого отменили (спекуляция, обрыв клиента) — ждущие считают заново,
+                # один из них станет новым первым
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._redis_get(endpoint, key)
+            if value is not None:
+                self._count(endpoint, "redis_hits")
+            else:
+                self._count(endpoint, "misses")
+                value = await compute()
+                await self._redis_put(endpoint, key, value, ttl)
+            self._local_put(key, value, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # отмена первого — не ошибка запроса: ждущие чужие запросы не должны получить CancelledError
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # ошибку получат только ожидающие; помечаем как прочитанную
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+response_cache = ResponseCache()
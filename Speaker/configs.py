@@ -0,0 +1,135 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ConfigCache:
+    # Redis для общего уровня кэша; без него — только in-memory LRU
+    redis_url: str = os.getenv("CACHE_REDIS_URL", None)
+    local_size: int = int(os.getenv("CACHE_LOCAL_SIZE", "10000"))
+    # TTL в секундах по эндпоинтам; 0 — не кэшировать
+    validation_ttl: int = int(os.getenv("CACHE_VALIDATION_TTL", "86400"))
+    inference_ttl: int = int(os.getenv("CACHE_INFERENCE_TTL", "600"))
+
+
+CONFIG_CACHE = ConfigCache()
+
+
+class ConfigClassifier:
+    # Путь к модели fast_classifier.py; без него быстрый путь выключен
+    model_path: str = os.getenv("CLASSIFIER_MODEL_PATH", None)
+    # Минимальная уверенность, при которой ответ отдаётся без LLM
+    threshold: float = float(os.getenv("CLASSIFIER_THRESHOLD", "0.9"))
+    # JSONL-журнал ответов LLM-классификатора — данные для обучения
+    log_path: str = os.getenv("CLASSIFIER_LOG_PATH", None)
+
+
+CONFIG_CLASSIFIER = ConfigClassifier()
+
+
+class ConfigSpeculative:
+    # Считать ответ сразу после валидации, не дожидаясь подтверждения
+    enabled: bool = os.getenv("SPECULATIVE_ENABLED", "1") == "1"
+    # Максимум одновременно считающихся спекулятивных ответов
+    max_inflight: int = int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "32"))
+    # Сколько секунд хранится результат, если подтверждения нет
+    ttl: float = float(os.getenv("SPECULATIVE_TTL", "300"))
+    # Сколько confirm ждёт незавершённую задачу
+    collect_timeout: float = float(os.getenv("SPECULATIVE_COLLECT_TIMEOUT", "120"))
+    # Общий Redis для результатов: confirm может прийти в другой воркер uvicorn.
+    # Без него при SPEAKER_WORKERS > 1 спекуляция выключается
+    redis_url: str = os.getenv("SPECULATIVE_REDIS_URL", os.getenv("CACHE_REDIS_URL"))
+
+
+CONFIG_SPECULATIVE = ConfigSpeculative()
+
+
+def _parse_limits(raw: str) -> dict:
+    """"validation=32,general_inference=16" -> {"validation": 32, "general_inference": 16}"""
+    out = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            out[name.strip()] = int(value)
+    return out
+
+
+class ConfigUpstream:
+    # Другой адрес OpenAI-совместимого API (например, локальный фейк для нагрузочного теста)
+    base_url: str = os.getenv("OPENAI_BASE_URL", None)
+    # Пул соединений httpx
+    http2: bool = os.getenv("UPSTREAM_HTTP2", "1") == "1"
+    max_connections: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    max_keepalive: int = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+    keepalive_expiry: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+    connect_timeout: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+    read_timeout: float = float(os.getenv("UPSTREAM_READ_TIMEOUT", "120"))
+    # Одновременных вызовов на эндпоинт в одном воркере; default — для прочих
+    concurrency: dict = _parse_limits(
+        os.getenv("UPSTREAM_CONCURRENCY", "validation=32,general_inference=16,default=32")
+    )
+    # Лимиты организации OpenAI на воркер; 0 — без ограничения
+    rpm: float = float(os.getenv("UPSTREAM_RPM", "500"))
+    tpm: float = float(os.getenv("UPSTREAM_TPM", "200000"))
+    expected_output_tokens: int = int(os.getenv("UPSTREAM_EXPECTED_OUTPUT_TOKENS", "800"))
+    # Повторы на 429/5xx/сеть
+    retries: int = int(os.getenv("UPSTREAM_RETRIES", "4"))
+    backoff_base: float = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+    backoff_max: float = float(os.getenv("UPSTREAM_BACKOFF_MAX", "20"))
+    # Circuit breaker: отказов подряд до размыкания и пауза до пробного запроса
+    breaker_failures: int = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+    breaker_reset: float = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+
+
+CONFIG_UPSTREAM = ConfigUpstream()
+
+
+class ConfigImages:
+    # Разрешение, которое модель использует в режиме high detail
+    max_long_side: int = int(os.getenv("IMAGE_MAX_LONG_SIDE", "2048"))
+    max_short_side: int = int(os.getenv("IMAGE_MAX_SHORT_SIDE", "768"))
+    # Формат и размер результата: JPEG или WEBP
+    format: str = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+    quality: int = int(os.getenv("IMAGE_QUALITY", "85"))
+    min_quality: int = int(os.getenv("IMAGE_MIN_QUALITY", "55"))
+    max_bytes: int = int(os.getenv("IMAGE_MAX_BYTES", "400000"))
+    # Потоки для decode/resize/encode
+    workers: int = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # Кэш подготовленных картинок по sha256: штук и секунд
+    cache_size: int = int(os.getenv("IMAGE_CACHE_SIZE", "256"))
+    ttl: int = int(os.getenv("IMAGE_TTL", "3600"))
+
+
+CONFIG_IMAGES = ConfigImages()
+
+
+class ConfigBatch:
+    # /chat_ai/validation/batch: максимум элементов и параллельных классификаций
+    max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+
+CONFIG_BATCH = ConfigBatch()
+
+
+class ConfigServer:
+    host: str = os.getenv("SPEAKER_HOST", "0.0.0.0")
+    port: int = int(os.getenv("SPEAKER_PORT", "80"))
+    # Процессов uvicorn; 1 — без супервизора
+    workers: int = int(os.getenv("SPEAKER_WORKERS", "1"))
+    # Очередь listen() — всплески соединений не отбиваются ядром
+    backlog: int = int(os.getenv("SPEAKER_BACKLOG", "2048"))
+    # Больше, чем idle-таймаут клиента/прокси, чтобы сервер не рвал соединение первым
+    keep_alive: int = int(os.getenv("SPEAKER_KEEP_ALIVE", "75"))
+    # Сколько ждать текущие запросы при остановке (ответ LLM может идти минуту)
+    graceful_timeout: int = int(os.getenv("SPEAKER_GRACEFUL_TIMEOUT", "90"))
+    # Пауза между SIGTERM и закрытием сокета, пока /ready отдаёт 503
+    drain_delay: float = float(os.getenv("SPEAKER_DRAIN_DELAY", "5"))
+    # Максимум одновременных соединений+задач на воркер, сверх — 503
+    limit_concurrency: int = int(os.getenv("SPEAKER_LIMIT_CONCURRENCY", "0")) or None
+    forwarded_allow_ips: str = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+CONFIG_SERVER = ConfigServer()
@@ -0,0 +1,136 @@
+"""Локальный быстрый классификатор тем перед вызовом LLM.
+
+char n-gram TF-IDF + логистическая регрессия, обучается на журнале ответов
+LLM-классификатора (JSONL: {"query", "true_topic_idx", "cost"}, пишется в
+CLASSIFIER_LOG_PATH). Уверенные ответы (max proba ≥ порога) отдаются сразу,
+остальные идут в LLM.
+
+CLI:
+    python fast_classifier.py train --data classifier_log.jsonl --out fast_classifier.joblib
+    python fast_classifier.py eval  --data holdout.jsonl --model fast_classifier.joblib
+"""
+import argparse
+import json
+import random
+from typing import Iterable, Sequence
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+
+class FastClassifier:
+    def __init__(self, max_features: int = 200_000, C: float = 4.0):
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=(2, 5),
+            lowercase=True,
+            sublinear_tf=True,
+            max_features=max_features,
+            dtype=np.float32,
+        )
+        self.topic_model = LogisticRegression(C=C, max_iter=2000)
+        self.cost_model = LogisticRegression(C=C, max_iter=2000)
+
+    def fit(self, queries: Sequence[str], topic_idx: Sequence[int], costs: Sequence[int]) -> "FastClassifier":
+        X = self.vectorizer.fit_transform(queries)
+        self.topic_model.fit(X, topic_idx)
+        self.cost_model.fit(X, costs)
+        return self
+
+    def predict_batch(self, queries: Sequence[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Векторизованный predict: (true_topic_idx, cost, confidence) для каждой строки.
+
+        confidence — минимум из уверенностей по теме и по стоимости.
+        """
+        X = self.vectorizer.transform(queries)
+        topic_proba = self.topic_model.predict_proba(X)
+        cost_proba = self.cost_model.predict_proba(X)
+        topic = self.topic_model.classes_[topic_proba.argmax(axis=1)]
+        cost = self.cost_model.classes_[cost_proba.argmax(axis=1)]
+        confidence = np.minimum(topic_proba.max(axis=1), cost_proba.max(axis=1))
+        return topic, cost, confidence
+
+    def predict(self, query: str) -> tuple[int, int, float]:
+        topic, cost, confidence = self.predict_batch([query])
+        return int(topic[0]), int(cost[0]), float(confidence[0])
+
+    def save(self, path: str) -> None:
+        # Сохраняем компоненты, а не сам объект: pickle класса из `python fast_classifier.py`
+        # ссылался бы на __main__ и не загружался бы из router
+        joblib.dump(
+            {"vectorizer": self.vectorizer, "topic_model": self.topic_model, "cost_model": self.cost_model},
+            path,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "FastClassifier":
+        parts = joblib.load(path)
+        model = cls.__new__(cls)
+        model.vectorizer = parts["vectorizer"]
+        model.topic_model = parts["topic_model"]
+        model.cost_model = parts["cost_model"]
+        return model
+
+
+def read_log(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _columns(rows: Iterable[dict]) -> tuple[list[str], list[int], list[int]]:
+    rows = list(rows)
+    return (
+        [r["query"] for r in rows],
+        [int(r["true_topic_idx"]) for r in rows],
+        [int(r["cost"]) for r in rows],
+    )
+
+
+def evaluate(model: FastClassifier, rows: list[dict], threshold: float) -> dict:
+    queries, topics, costs = _columns(rows)
+    topic, cost, confidence = model.predict_batch(queries)
+    topics, costs = np.asarray(topics), np.asarray(costs)
+    confident = confidence >= threshold
+    correct = (topic == topics) & (cost == costs)
+    return {
+        "n": len(rows),
+        "accuracy": float(correct.mean()),
+        "coverage": float(confident.mean()),
+        "accuracy_confident": float(correct[confident].mean()) if confident.any() else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    train = sub.add_parser("train", help="обучить и сохранить модель")
+    train.add_argument("--data", required=True)
+    train.add_argument("--out", default="fast_classifier.joblib")
+    train.add_argument("--holdout", type=float, default=0.2, help="доля строк для оценки")
+    train.add_argument("--threshold", type=float, default=0.9)
+
+    ev = sub.add_parser("eval", help="оценить модель на размеченном наборе")
+    ev.add_argument("--data", required=True)
+    ev.add_argument("--model", default="fast_classifier.joblib")
+    ev.add_argument("--threshold", type=float, default=0.9)
+
+    args = parser.parse_args()
+    rows = read_log(args.data)
+
+    if args.cmd == "train":
+        random.shuffle(rows)
+        split = int(len(rows) * (1 - args.holdout))
+        model = FastClassifier().fit(*_columns(rows[:split]))
+        if rows[split:]:
+            print(json.dumps(evaluate(model, rows[split:], args.threshold)))
+        model.save(args.out)
+        print(f"saved to {args.out}")
+    else:
+        print(json.dumps(evaluate(FastClassifier.load(args.model), rows, args.threshold)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Подготовка изображений перед отправкой в OpenAI.
+
+Картинка декодируется один раз, уменьшается до разрешения, которое модель всё равно
+использует (high detail: вписать в 2048×2048, короткая сторона ≤ 768), и
+перекодируется в JPEG/WebP не больше `max_bytes`. Тяжёлая работа идёт в пуле потоков,
+результат кэшируется по sha256 исходных байт: одно и то же фото (повторный вопрос,
+валидация → ответ) готовится один раз. Кэш — in-memory LRU и опционально Redis
+(CACHE_REDIS_URL), чтобы image_id, выданный одним воркером, находил другой.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from configs import CONFIG_CACHE, CONFIG_IMAGES
+from metrics import CACHE_REQUESTS, FAILURES
+
+logger = logging.getLogger(__name__)
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Что означает «битая картинка» (422), а не ошибку сервера: PIL бросает
+# DecompressionBombError (не OSError) на изображениях больше 2 * MAX_IMAGE_PIXELS
+DECODE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+@dataclass
+class PreparedImage:
+    digest: str            # sha256 исходных байт — он же image_id
+    data_url: str          # data:<mime>;base64,... — то, что уходит в OpenAI
+    width: int
+    height: int
+    original_bytes: int
+    prepared_bytes: int
+
+    def info(self) -> Dict[str, int | str]:
+        return {
+            "image_id": self.digest,
+            "width": self.width,
+            "height": self.height,
+            "original_bytes": self.original_bytes,
+            "prepared_bytes": self.prepared_bytes,
+        }
+
+
+def target_size(width: int, height: int,
+                max_long: int = CONFIG_IMAGES.max_long_side,
+                max_short: int = CONFIG_IMAGES.max_short_side) -> tuple[int, int]:
+    scale = min(1.0, max_long / max(width, height), max_short / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def process_image(raw: bytes, digest: str) -> PreparedImage:
+    """Синхронная часть: decode → resize → encode. Вызывается в пуле потоков."""
+    img = Image.open(BytesIO(raw))
+    fmt = CONFIG_IMAGES.format
+    size = target_size(*img.size)
+
+    # уже подходящий JPEG/WebP без поворота по EXIF — отправляем как есть
+    if (img.format == fmt and size == img.size and len(raw) <= CONFIG_IMAGES.max_bytes
+            and img.getexif().get(0x0112, 1) == 1):
+        encoded = raw
+    else:
+        # JPEG умеет декодировать сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+        img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        size = target_size(*img.size)
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        quality = CONFIG_IMAGES.quality
+        while True:
+            buf = BytesIO()
+            img.save(buf, format=fmt, quality=quality)
+            encoded = buf.getvalue()
+            if len(encoded) <= CONFIG_IMAGES.max_bytes or quality <= CONFIG_IMAGES.min_quality:
+                break
+            quality -= 10
+
+    width, height = size
+    data_url = f"data:{_MIME[fmt]};base64,{base64.b64encode(encoded).decode()}"
+    return PreparedImage(digest, data_url, width, height, len(raw), len(encoded))
+
+
+class ImagePipeline:
+    def __init__(self, workers: int = CONFIG_IMAGES.workers, size: int = CONFIG_IMAGES.cache_size,
+                 ttl: int = CONFIG_IMAGES.ttl, redis_url: Optional[str] = CONFIG_CACHE.redis_url):
+        if CONFIG_IMAGES.format not in _MIME:
+            raise ValueError(f"IMAGE_FORMAT must be one of {sorted(_MIME)}, got {CONFIG_IMAGES.format!r}")
+        self.ttl = ttl
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+        self._local: OrderedDict[str, tuple[float, PreparedImage]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(redis_url)
+        self.counters = {"prepared": 0, "hits": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "cached": len(self._local)}
+
+    def _local_get(self, digest: str) -> Optional[PreparedImage]:
+        item = self._local.get(digest)
+        if item is None:
+            return None
+        expires, image = item
+        if expires < time.monotonic():
+            del self._local[digest]
+            return None
+        self._local.move_to_end(digest)
+        return image
+
+    def _local_put(self, image: PreparedImage) -> None:
+        self._local[image.digest] = (time.monotonic() + self.ttl, image)
+        self._local.move_to_end(image.digest)
+        while len(self._local) > self.size:
+            self._local.popitem(last=False)
+
+    async def get(self, digest: str) -> Optional[PreparedImage]:
+        """Подготовленная картинка по image_id или None, если её нет / истекла."""
+        image = self._local_get(digest)
+        if image is None and self._redis is not None:
+            try:
+                raw = await self._redis.get(f"speaker:image:{digest}")
+            except Exception as exc:  # noqa: BLE001
+                FAILURES.labels("image_cache", "redis_get").inc()
+                logger.warning("image redis get failed: %s", exc)
+                raw = None
+            if raw is not None:
+                image = PreparedImage(**json.loads(raw))
+                self._local_put(image)
+        if image is not None:
+            self.counters["hits"] += 1
+        CACHE_REQUESTS.labels("image", "images", "hit" if image is not None else "miss").inc()
+        return image
+
+    async def prepare(self, raw: bytes) -> PreparedImage:
+        digest = hashlib.sha256(raw).hexdigest()
+        image = await self.get(digest)
+        if image is not None:
+            return image
+
+        inflight = self._inflight.get(digest)
+        if inflight is not None:
+            self.counters["hits"] += 1
+            CACHE_REQUESTS.labels("image", "images", "coalesced").inc()
+            return await asyncio.shield(inflight)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, process_image, raw, digest)
+        self._inflight[digest] = future
+        try:
+            image = await future
+        finally:
+            del self._inflight[digest]
+
+        self.counters["prepared"] += 1
+        self.counters["bytes_in"] += image.original_bytes
+        self.counters["bytes_out"] += image.prepared_bytes
+        self._local_put(image)
+        if self._redis is not None:
+            try:
+                await self._redis.set(f"speaker:image:{digest}", json.dumps(asdict(image)), ex=self.ttl)
+            except Exception as exc:  # noqa: BLE001
+                FAILURES.labels("image_cache", "redis_set").inc()
+                logger.warning("image redis set failed: %s", exc)
+        return image
+
+    async def prepare_b64(self, base64_image: str) -> PreparedImage:
+        return await self.prepare(base64.b64decode(base64_image))
+
+
+image_pipeline = ImagePipeline()
@@ -1,9 +1,29 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from router import router as router_main
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render
+from serving import InflightMiddleware, lifecycle, loop_info, serve
+from upstream import CircuitOpen
+
+# логгеры модулей (cache, images, router, ...) пишут рядом с логом uvicorn
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(name)s: %(message)s")
+# httpx на INFO пишет строку на каждый вызов OpenAI
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.getLogger("uvicorn.error").info("Speaker worker started (%s)", loop_info())
+    lifecycle.started = True
+    yield
+    lifecycle.started = False
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:80",
@@ -18,7 +38,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
     
+app.add_middleware(InflightMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router_main)
 
+
+@app.get("/health")
+async def health() -> dict:
+    """Liveness: процесс жив и обслуживает event loop."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Readiness: 503 до старта и во время остановки — балансировщик снимает трафик."""
+    return JSONResponse(
+        status_code=200 if lifecycle.ready else 503,
+        content={"ready": lifecycle.ready, "draining": lifecycle.draining, "inflight": lifecycle.inflight},
+    )
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus: сумма по всем воркерам, если задан PROMETHEUS_MULTIPROC_DIR."""
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request: Request, exc: CircuitOpen) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
 if __name__ == '__main__':
-    uvicorn.run(app, host='0.0.0.0', port=80)
+    serve("main:app")
@@ -0,0 +1,111 @@
+"""Метрики Prometheus: GET /metrics.
+
+Только Counter и Histogram — они корректно суммируются по воркерам uvicorn:
+при заданном PROMETHEUS_MULTIPROC_DIR каждый воркер пишет значения в свои файлы
+в этом каталоге, а /metrics любого воркера отдаёт сумму (multiprocess mode
+prometheus_client). serve() очищает каталог при старте.
+
+Сбои, которые сервис переживает без падения запроса (Redis недоступен — работаем
+без него), пишутся в лог и считаются в speaker_failures_total.
+
+Доли попаданий в кэш считаются в PromQL, например:
+    sum by (endpoint) (rate(speaker_cache_requests_total{result!="miss"}[5m]))
+      / sum by (endpoint) (rate(speaker_cache_requests_total[5m]))
+"""
+import os
+import shutil
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_LATENCY = Histogram(
+    "speaker_http_request_duration_seconds",
+    "Время обработки HTTP-запроса (для стримов — до конца тела)",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+OPENAI_LATENCY = Histogram(
+    "speaker_openai_request_duration_seconds",
+    "Время одного вызова OpenAI Responses API (для stream — до response.completed)",
+    ["endpoint", "topic", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 120),
+)
+OPENAI_TOKENS = Counter(
+    "speaker_openai_tokens_total",
+    "Токены OpenAI по usage: input (включая cached), cached, output",
+    ["endpoint", "topic", "kind"],
+)
+OPENAI_ERRORS = Counter(
+    "speaker_openai_errors_total",
+    "Неудачные вызовы OpenAI: HTTP-статус или класс исключения",
+    ["endpoint", "topic", "error"],
+)
+CACHE_REQUESTS = Counter(
+    "speaker_cache_requests_total",
+    "Обращения к кэшам: response (ответы LLM) и image (подготовленные картинки)",
+    ["cache", "endpoint", "result"],
+)
+FAILURES = Counter(
+    "speaker_failures_total",
+    "Перехваченные сбои: Redis кэшей и спекуляции, обрыв стрима upstream, неудачный confirm",
+    ["component", "operation"],
+)
+
+
+def prepare_multiproc_dir() -> None:
+    """Очищает каталог multiprocess-метрик от прошлого запуска; вызывается до старта воркеров."""
+    if MULTIPROC_DIR:
+        shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def render() -> bytes:
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def error_label(exc: BaseException) -> str:
+    status = getattr(exc, "status_code", None)
+    return str(status) if status is not None else type(exc).__name__
+
+
+class MetricsMiddleware:
+    """Гистограмма времени HTTP-запросов; route — шаблон пути, а не сам путь."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - t0)
+
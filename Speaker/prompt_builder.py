@@ -0,0 +1,75 @@
+"""Сборка сообщений для OpenAI с неизменным префиксом.
+
+Кэш промптов OpenAI срабатывает, только если начало запроса (tools, system, ...)
+побайтно совпадает с недавним запросом и длиннее 1024 токенов. Поэтому:
+  * системное сообщение для каждой темы собирается один раз при импорте и
+    переиспользуется как есть;
+  * всё изменчивое — вопрос, картинка, дата — идёт после него, дата последней.
+
+Доля закэшированных токенов по эндпоинтам — cached_ratio в GET /chat_ai/upstream/stats
+(из usage.input_tokens_details.cached_tokens).
+"""
+import json
+from datetime import date
+from typing import Any, Dict, Optional
+
+from prompts import (
+    CLASSIFIER_PROMPT_TEMPLATE,
+    CLASSIFIER_SYSTEM_PROMPT,
+    DATE_CONTEXT_TEMPLATE,
+    DATED_TOPICS,
+    TOPIC_NAMES,
+    topic_system_prompts,
+)
+
+
+class PromptSkeleton:
+    """Готовое системное сообщение + правила для хвоста."""
+
+    __slots__ = ("system_text", "system_message", "needs_date")
+
+    def __init__(self, system_text: str, needs_date: bool = False):
+        self.system_text = system_text
+        self.system_message = {
+            "role": "system",
+            "content": [{"type": "input_text", "text": system_text}],
+        }
+        self.needs_date = needs_date
+
+    def build(self, prompt: str, image_url: Optional[str] = None,
+              today: Optional[date] = None) -> list[dict]:
+        content = [{"type": "input_text", "text": prompt}]
+        if image_url:
+            content.append({"type": "input_image", "image_url": image_url})
+        if self.needs_date:
+            today = today or date.today()
+            content.append({"type": "input_text", "text": DATE_CONTEXT_TEMPLATE.format(date=today.strftime("%d.%m.%Y"))})
+        return [self.system_message, {"role": "user", "content": content}]
+
+
+TOPIC_SKELETONS: Dict[str, PromptSkeleton] = {
+    topic: PromptSkeleton(text, needs_date=topic in DATED_TOPICS)
+    for topic, text in topic_system_prompts.items()
+}
+CLASSIFIER_SKELETON = PromptSkeleton(CLASSIFIER_SYSTEM_PROMPT)
+
+
+def classifier_messages(query: str, chosen_topic: str, image_url: Optional[str] = None) -> list[dict]:
+    return CLASSIFIER_SKELETON.build(
+        CLASSIFIER_PROMPT_TEMPLATE.format(query=query, topic=chosen_topic), image_url
+    )
+
+
+def parse_classifier_output(text: str) -> Dict[str, Any]:
+    """JSON ответа классификатора + true_topic по индексу; ValueError, если формат не тот."""
+    try:
+        res_dict = json.loads(text)
+        topic_idx = res_dict["true_topic_idx"]
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"unexpected classifier output: {text!r}") from exc
+    # -1 — «Другое», иначе 1..len(TOPIC_NAMES); 0 и прочие отрицательные индексы
+    # не должны молча превращаться в тему с конца списка
+    if type(topic_idx) is not int or not (topic_idx == -1 or 1 <= topic_idx <= len(TOPIC_NAMES)):
+        raise ValueError(f"classifier topic index out of range: {text!r}")
+    res_dict["true_topic"] = TOPIC_NAMES[topic_idx - 1] if topic_idx != -1 else "Другое"
+    return res_dict
@@ -19,8 +19,6 @@ BEAUTY_SYSTEM_PROMPT = """
 *   **Неформальное общение:** Ты подружка, а не аристократка — говори просто, с душой и без занудства😊
 *   **Ссылки необязательны, но желательны:** Если ссылки будут в ответе выглядеть неуместно, писать их не нужно.
 *   **Ссылки в формате Markdown:** Все ссылки должны оформляться в формате Markdown и соответствовать определённым словам/предложениям: [название ссылки](url)
-
-Сегодняшнее число: {time}
 """.strip()
 
 STUDY_SYSTEM_PROMPT = """
@@ -203,6 +201,16 @@ query: {query}
 topic: {topic}
 """.strip()
 
+# Порядок важен: классификатор отвечает индексом темы (1-6) в этом списке
+TOPIC_NAMES = [
+    "Разбор переписки",
+    "Астрология",
+    "Косметика и уход",
+    "Здоровье и спорт",
+    "Стиль",
+    "Учёба",
+]
+
 topic_system_prompts = {
     'Косметика и уход': BEAUTY_SYSTEM_PROMPT,
     'Разбор переписки': CHAT_SYSTEM_PROMPT,
@@ -210,4 +218,9 @@ topic_system_prompts = {
     'Стиль': STYLE_SYSTEM_PROMPT,
     'Здоровье и спорт': SPORT_SYSTEM_PROMPT,
     'Учёба': STUDY_SYSTEM_PROMPT
-}   
\ No newline at end of file
+}   
+
+# Изменчивые значения не входят в системные промпты: они дописываются в конец
+# запроса (prompt_builder.py), чтобы статический префикс попадал в кэш промптов OpenAI
+DATE_CONTEXT_TEMPLATE = "Сегодняшнее число: {date}"
+DATED_TOPICS = {'Косметика и уход'}
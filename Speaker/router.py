@@ -1,34 +1,103 @@
+import asyncio
 import json
+import logging
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
-from fastapi import APIRouter
-from openai import AsyncOpenAI
-from typing import Optional, Dict, Any
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional, Dict, Any
 
-from prompts import topic_system_prompts, CLASSIFIER_PROMPT_TEMPLATE, CLASSIFIER_SYSTEM_PROMPT
-from utils import form_messages, encode_image
+from cache import make_key, response_cache
+from configs import CONFIG_BATCH, CONFIG_CACHE, CONFIG_CLASSIFIER, CONFIG_SPECULATIVE
+from images import DECODE_ERRORS, PreparedImage, image_pipeline
+from metrics import FAILURES
+from prompt_builder import CLASSIFIER_SKELETON, TOPIC_SKELETONS, classifier_messages, parse_classifier_output
+from prompts import TOPIC_NAMES
+from speculative import speculative_runner
+from upstream import CircuitOpen, UpstreamClient, build_openai_client
+from utils import encode_image
 from pydantic import BaseModel
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
+logger = logging.getLogger(__name__)
 
 MODEL_NAME = 'gpt-4.1'  # "gpt-4.1-mini"
-client = AsyncOpenAI(api_key=API_KEY)
+client = UpstreamClient(build_openai_client(API_KEY))
 router = APIRouter(
     prefix='/chat_ai'
 )
 
 
+fast_classifier = None
+if CONFIG_CLASSIFIER.model_path:
+    from fast_classifier import FastClassifier
+
+    fast_classifier = FastClassifier.load(CONFIG_CLASSIFIER.model_path)
+
+
 class InferenceRequest(BaseModel):
     query: str
     topic: str
     base64_image: Optional[str] = None
+    # картинка, загруженная через POST /chat_ai/images
+    image_id: Optional[str] = None
 
 
 class ValidationRequest(BaseModel):
     query: str
     chosen_topic: str
     base64_image: Optional[str] = None
+    image_id: Optional[str] = None
+
+
+# =========================== IMAGES =========================================
+
+@router.post("/images")
+async def upload_image(image: UploadFile = File(...)) -> Dict[str, Any]:
+    """
+    Загрузка фото сырыми байтами (multipart/form-data, поле image).
+
+    Возвращает image_id — его передают в /validation и /general_inference
+    вместо base64_image. Повторная загрузка тех же байт берётся из кэша.
+    """
+    raw = await image.read()
+    try:
+        prepared = await image_pipeline.prepare(raw)
+    except DECODE_ERRORS:
+        raise HTTPException(status_code=422, detail="cannot decode image")
+    return prepared.info()
+
+
+@router.get("/images/stats")
+async def images_stats() -> Dict[str, Any]:
+    return image_pipeline.stats()
+
+
+@router.get("/images/{image_id}")
+async def image_info(image_id: str) -> Dict[str, Any]:
+    """Жива ли ещё картинка: клиент проверяет image_id перед повторным использованием."""
+    image = await image_pipeline.get(image_id)
+    if image is None:
+        raise HTTPException(status_code=404, detail="image not found or expired, upload it again")
+    return image.info()
+
+
+async def _prepare_image(payload: InferenceRequest | ValidationRequest) -> Optional[PreparedImage]:
+    if payload.image_id:
+        image = await image_pipeline.get(payload.image_id)
+        if image is None:
+            raise HTTPException(status_code=404, detail="image not found or expired, upload it again")
+        return image
+    if payload.base64_image:
+        try:
+            return await image_pipeline.prepare_b64(payload.base64_image)
+        except DECODE_ERRORS:
+            raise HTTPException(status_code=422, detail="cannot decode image")
+    return None
 
 
 @router.post("/pipeline")
@@ -54,7 +123,9 @@ async def pipeline_example(chosen_topic: str,
     base64_image = encode_image(image_path) if image_path else None
 
     # Проверка валидности + стоимость
-    validation_result = await check_validity_and_cost(query=query, base64_image=base64_image, chosen_topic=chosen_topic)
+    validation_result = await check_validity_and_cost(
+        ValidationRequest(query=query, base64_image=base64_image, chosen_topic=chosen_topic)
+    )
     is_valid = validation_result['is_valid']
     true_topic = validation_result['true_topic']
     cost = validation_result['cost']
@@ -75,7 +146,9 @@ async def pipeline_example(chosen_topic: str,
 
     # Основной запрос к ИИ
     if button_is_pressed:
-        inference_result = await general_inference(query=query, topic=true_topic, base64_image=base64_image)
+        inference_result = await general_inference(
+            InferenceRequest(query=query, topic=true_topic, base64_image=base64_image)
+        )
         response_text = inference_result['response_text']
     else:
         response_text = None
@@ -94,24 +167,96 @@ async def general_inference(payload: InferenceRequest) -> Dict[str, Any]:
     {
         "query": "...",
         "topic": "...",
-        "base64_image": "<опционально>"
+        "base64_image": "<опционально>",
+        "image_id": "<опционально, из POST /chat_ai/images>"
     }
     """
-    topic_system_prompt = topic_system_prompts[payload.topic]
+    skeleton = TOPIC_SKELETONS[payload.topic]
+    image = await _prepare_image(payload)
 
-    messages = form_messages(
-        base64_image=payload.base64_image,
-        system_prompt=topic_system_prompt,
-        prompt=payload.query,
-    )
+    async def compute() -> Dict[str, Any]:
+        messages = skeleton.build(payload.query, image.data_url if image else None)
 
-    response = await client.responses.create(
-        model=MODEL_NAME,
-        tools=[{"type": "web_search_preview"}],
-        input=messages,
+        response = await client.create(
+            "general_inference",
+            payload.topic,
+            model=MODEL_NAME,
+            tools=[{"type": "web_search_preview"}],
+            input=messages,
+        )
+
+        return {"response_text": response.output_text}
+
+    key = make_key("general_inference", MODEL_NAME, skeleton.system_text,
+                   payload.query, payload.topic, image.digest if image else None)
+    return await response_cache.get_or_compute(
+        "general_inference", key, CONFIG_CACHE.inference_ttl, compute
     )
 
-    return {"response_text": response.output_text}
+
+def _ndjson(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode()
+
+
+async def _stream_inference(payload: InferenceRequest,
+                            image: Optional[PreparedImage] = None) -> AsyncIterator[bytes]:
+    t0 = time.perf_counter()
+    skeleton = TOPIC_SKELETONS[payload.topic]
+    key = make_key("general_inference", MODEL_NAME, skeleton.system_text,
+                   payload.query, payload.topic, image.digest if image else None)
+
+    cached = await response_cache.get("general_inference", key)
+    if cached is not None:
+        yield _ndjson({"type": "delta", "text": cached["response_text"]})
+        yield _ndjson({"type": "done", "response_text": cached["response_text"], "cached": True,
+                       "ttft_ms": (time.perf_counter() - t0) * 1000})
+        return
+
+    messages = skeleton.build(payload.query, image.data_url if image else None)
+
+    parts: list[str] = []
+    ttft_ms: Optional[float] = None
+    try:
+        async for event in client.stream(
+            "general_inference",
+            payload.topic,
+            model=MODEL_NAME,
+            tools=[{"type": "web_search_preview"}],
+            input=messages,
+        ):
+            if event.type == "response.output_text.delta":
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                parts.append(event.delta)
+                yield _ndjson({"type": "delta", "text": event.delta})
+    except Exception as exc:  # noqa: BLE001
+        FAILURES.labels("general_inference_stream", "upstream").inc()
+        logger.warning("general_inference/stream upstream error: %s", exc)
+        yield _ndjson({"type": "error", "message": str(exc)})
+        return
+
+    response_text = "".join(parts)
+    total_ms = (time.perf_counter() - t0) * 1000
+    logger.info("general_inference/stream topic=%s ttft=%.0fms total=%.0fms", payload.topic, ttft_ms or 0, total_ms)
+    await response_cache.set("general_inference", key, {"response_text": response_text},
+                             CONFIG_CACHE.inference_ttl)
+    yield _ndjson({"type": "done", "response_text": response_text, "cached": False,
+                   "ttft_ms": ttft_ms, "total_ms": total_ms})
+
+
+@router.post("/general_inference/stream")
+async def general_inference_stream(payload: InferenceRequest) -> StreamingResponse:
+    """
+    Потоковый вариант general_inference: NDJSON по мере генерации.
+
+    Строки ответа:
+        {"type": "delta", "text": "..."}                 — очередной фрагмент
+        {"type": "done", "response_text": "...", ...}    — конец, полный текст и ttft_ms
+        {"type": "error", "message": "..."}              — ошибка upstream
+    """
+    # картинку готовим до начала ответа, чтобы ошибка пришла HTTP-статусом
+    image = await _prepare_image(payload)
+    return StreamingResponse(_stream_inference(payload, image), media_type="application/x-ndjson")
 
 
 # =========================== VALIDATION =====================================
@@ -125,47 +270,193 @@ async def check_validity_and_cost(payload: ValidationRequest) -> Dict[str, Any]:
     {
         "chosen_topic": "...",
         "query": "...",
-        "base64_image": "<опционально>"
+        "base64_image": "<опционально>",
+        "image_id": "<опционально, из POST /chat_ai/images>"
     }
     """
-    messages = form_messages(
-        base64_image=payload.base64_image,
-        system_prompt=CLASSIFIER_SYSTEM_PROMPT,
-        prompt=CLASSIFIER_PROMPT_TEMPLATE.format(
-            query=payload.query,
-            topic=payload.chosen_topic,
-        ),
-    )
+    # Быстрый путь: локальная модель, если она уверена (только текст, без фото)
+    if fast_classifier is not None and not payload.base64_image and not payload.image_id:
+        topic_idx, cost, confidence = fast_classifier.predict(payload.query)
+        if confidence >= CONFIG_CLASSIFIER.threshold:
+            return _validation_result(topic_idx, cost, payload.chosen_topic)
+
+    image = await _prepare_image(payload)
+    key = make_key("validation", MODEL_NAME, CLASSIFIER_SKELETON.system_text,
+                   payload.query, payload.chosen_topic, image.digest if image else None)
+    try:
+        return await response_cache.get_or_compute(
+            "validation", key, CONFIG_CACHE.validation_ttl, lambda: _classify(payload, image)
+        )
+    except _UnparsedClassification as exc:
+        # ответ модели не распарсился — отдаём дефолт, но не кэшируем его
+        return exc.fallback
+
+
+def _validation_result(topic_idx: int, cost: int, chosen_topic: str) -> Dict[str, Any]:
+    true_topic = TOPIC_NAMES[topic_idx - 1] if topic_idx != -1 else "Другое"
+    return {
+        "is_valid": true_topic == chosen_topic,
+        "true_topic": true_topic,
+        "cost": cost,
+    }
+
+
+# строки журнала пишутся из потоков to_thread — не даём им перемешаться
+_classification_log_lock = threading.Lock()
+
+
+def _append_classification(line: str) -> None:
+    with _classification_log_lock, open(CONFIG_CLASSIFIER.log_path, "a", encoding="utf-8") as f:
+        f.write(line)
 
-    response = await client.responses.create(
+
+async def _log_classification(query: str, res_dict: Dict[str, Any]) -> None:
+    """Журнал ответов LLM — обучающие данные для fast_classifier.py.
+
+    Запись в файл — в пуле потоков, чтобы не блокировать event loop.
+    """
+    if not CONFIG_CLASSIFIER.log_path:
+        return
+    record = {"query": query, "true_topic_idx": res_dict["true_topic_idx"], "cost": res_dict["cost"]}
+    await asyncio.to_thread(_append_classification, json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class _UnparsedClassification(Exception):
+    def __init__(self, fallback: Dict[str, Any]):
+        super().__init__("classifier output is not valid JSON")
+        self.fallback = fallback
+
+
+async def _classify(payload: ValidationRequest, image: Optional[PreparedImage] = None) -> Dict[str, Any]:
+    messages = classifier_messages(payload.query, payload.chosen_topic, image.data_url if image else None)
+
+    response = await client.create(
+        "validation",
+        # метка метрик: только известные темы, чтобы не плодить ряды
+        payload.chosen_topic if payload.chosen_topic in TOPIC_NAMES else "other",
         model=MODEL_NAME,
         input=messages,
     )
 
-    topic_names = [
-        "Разбор переписки",
-        "Астрология",
-        "Косметика и уход",
-        "Здоровье и спорт",
-        "Стиль",
-        "Учёба",
-    ]
-
     try:
-        res_dict = json.loads(response.output_text)
-        if res_dict["true_topic_idx"] != -1:
-            res_dict["true_topic"] = topic_names[res_dict["true_topic_idx"] - 1]
-        else:
-            res_dict["true_topic"] = "Другое"
-    except (json.JSONDecodeError, KeyError):
-        res_dict = {
-            "valid": False,
+        res_dict = parse_classifier_output(response.output_text)
+    except ValueError:
+        raise _UnparsedClassification({
+            "is_valid": False,
             "true_topic": "Другое",
             "cost": 2,
-        }
+        })
+
+    if image is None:
+        await _log_classification(payload.query, res_dict)
 
     return {
         "is_valid": res_dict["valid"],
         "true_topic": res_dict["true_topic"],
         "cost": res_dict["cost"],
     }
+
+
+class ValidationBatchRequest(BaseModel):
+    items: List[ValidationRequest]
+    # не больше CONFIG_BATCH.concurrency
+    concurrency: Optional[int] = None
+
+
+@router.post("/validation/batch")
+async def check_validity_batch(payload: ValidationBatchRequest) -> Dict[str, Any]:
+    """
+    Классификация списка запросов с ограниченным параллелизмом.
+
+    Результаты — в порядке items; ошибка одного элемента не роняет остальные:
+    {"results": [{"ok": true, "result": {...}}, {"ok": false, "status": 502, "error": "..."}]}
+    Офлайн-прогоны через OpenAI Batch API — batch.py.
+    """
+    if len(payload.items) > CONFIG_BATCH.max_items:
+        raise HTTPException(status_code=413, detail=f"at most {CONFIG_BATCH.max_items} items per batch")
+
+    sem = asyncio.Semaphore(max(1, min(payload.concurrency or CONFIG_BATCH.concurrency, CONFIG_BATCH.concurrency)))
+
+    async def one(item: ValidationRequest) -> Dict[str, Any]:
+        async with sem:
+            try:
+                return {"ok": True, "result": await check_validity_and_cost(item)}
+            except HTTPException as exc:
+                return {"ok": False, "status": exc.status_code, "error": exc.detail}
+            except CircuitOpen as exc:
+                return {"ok": False, "status": 503, "error": str(exc)}
+            except Exception as exc:  # noqa: BLE001
+                return {"ok": False, "status": 502, "error": f"{type(exc).__name__}: {exc}"}
+
+    return {"results": await asyncio.gather(*(one(item) for item in payload.items))}
+
+
+# =========================== SPECULATIVE ====================================
+
+class SpeculativeValidationRequest(ValidationRequest):
+    request_id: Optional[str] = None
+
+
+@router.post("/validation/speculative")
+async def validate_and_speculate(payload: SpeculativeValidationRequest) -> Dict[str, Any]:
+    """
+    Валидация + фоновый запуск general_inference по найденной теме.
+
+    Ответ — как у /validation, плюс:
+        "request_id": ключ для /speculative/{request_id}/confirm и /cancel
+        "speculative": запущен ли ответ в фоне (False — лимит или тема «Другое»)
+    """
+    result = await check_validity_and_cost(payload)
+    request_id = payload.request_id or uuid.uuid4().hex
+
+    started = False
+    if speculative_runner.enabled and result["true_topic"] != "Другое":
+        inference_payload = InferenceRequest(
+            query=payload.query,
+            topic=result["true_topic"],
+            base64_image=payload.base64_image,
+            image_id=payload.image_id,
+        )
+        started = speculative_runner.start(request_id, lambda: general_inference(inference_payload))
+
+    return {**result, "request_id": request_id, "speculative": started}
+
+
+@router.post("/speculative/{request_id}/confirm")
+async def speculative_confirm(request_id: str) -> Dict[str, Any]:
+    """
+    Ответ, посчитанный после /validation/speculative.
+
+    404 — задачи нет (не запускалась, истекла или отменена): клиент идёт
+    в обычный /general_inference.
+    """
+    try:
+        return await speculative_runner.collect(request_id, CONFIG_SPECULATIVE.collect_timeout)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="speculative result not found")
+    except Exception as exc:  # noqa: BLE001
+        FAILURES.labels("speculative", "confirm").inc()
+        logger.warning("speculative %s failed: %r", request_id, exc)
+        raise HTTPException(status_code=502, detail="inference failed")
+
+
+@router.post("/speculative/{request_id}/cancel")
+async def speculative_cancel(request_id: str) -> Dict[str, Any]:
+    return {"cancelled": await speculative_runner.cancel(request_id)}
+
+
+@router.get("/speculative/stats")
+async def speculative_stats() -> Dict[str, Any]:
+    return speculative_runner.stats()
+
+
+@router.get("/upstream/stats")
+async def upstream_stats() -> Dict[str, Any]:
+    """Вызовы OpenAI, ошибки и повторы по эндпоинтам, состояние circuit breaker."""
+    return client.stats()
+
+
+@router.get("/cache/stats")
+async def cache_stats() -> Dict[str, Any]:
+    """Попадания / промахи кэша ответов по эндпоинтам."""
+    return response_cache.stats()
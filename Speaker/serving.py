@@ -0,0 +1,128 @@
+"""Боевой запуск Speaker: несколько воркеров uvicorn и плавная остановка.
+
+    python main.py            # параметры — из SPEAKER_* (configs.ConfigServer)
+
+uvloop и httptools подхватываются автоматически, если установлены (loop/http = "auto").
+При workers > 1 воркеры делят один сокет под супервизором uvicorn.
+
+Остановка по SIGTERM:
+  1. /ready начинает отвечать 503, новые соединения ещё принимаются
+     SPEAKER_DRAIN_DELAY секунд — балансировщик успевает убрать инстанс;
+  2. uvicorn закрывает сокет и ждёт текущие запросы (в том числе стримы LLM)
+     до SPEAKER_GRACEFUL_TIMEOUT секунд, потом отменяет оставшиеся.
+Повторный SIGINT/SIGTERM во время паузы — сразу к шагу 2.
+
+При нескольких воркерах задайте PROMETHEUS_MULTIPROC_DIR, иначе /metrics покажет
+только воркер, принявший запрос (см. metrics.py).
+"""
+import logging
+import time
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from configs import CONFIG_SERVER
+from metrics import prepare_multiproc_dir
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class Lifecycle:
+    """Состояние процесса для /ready; у каждого воркера своё."""
+
+    def __init__(self):
+        self.started = False
+        self.draining = False
+        self.inflight = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.draining
+
+
+lifecycle = Lifecycle()
+
+
+class InflightMiddleware:
+    """Считает HTTP-запросы в работе (до конца тела ответа, включая стримы)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        lifecycle.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lifecycle.inflight -= 1
+
+
+class DrainingServer(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, drain_delay: float = CONFIG_SERVER.drain_delay):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self._pending_signal: Optional[int] = None
+        self._drain_deadline = 0.0
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if lifecycle.draining or self.drain_delay <= 0:
+            lifecycle.draining = True
+            self._pending_signal = None
+            return super().handle_exit(sig, frame)
+        lifecycle.draining = True
+        self._pending_signal = sig
+        self._drain_deadline = time.monotonic() + self.drain_delay
+        logger.info("Draining: not ready, shutting down in %.1fs (%d in flight)",
+                    self.drain_delay, lifecycle.inflight)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self._pending_signal is not None and time.monotonic() >= self._drain_deadline:
+            sig, self._pending_signal = self._pending_signal, None
+            logger.info("Drain delay over, waiting for %d request(s)", lifecycle.inflight)
+            super().handle_exit(sig, None)
+        return await super().on_tick(counter)
+
+
+def serve(app: str = "main:app") -> None:
+    config = uvicorn.Config(
+        app,
+        host=CONFIG_SERVER.host,
+        port=CONFIG_SERVER.port,
+        workers=CONFIG_SERVER.workers,
+        loop="auto",
+        http="auto",
+        backlog=CONFIG_SERVER.backlog,
+        timeout_keep_alive=CONFIG_SERVER.keep_alive,
+        timeout_graceful_shutdown=CONFIG_SERVER.graceful_timeout,
+        limit_concurrency=CONFIG_SERVER.limit_concurrency,
+        proxy_headers=True,
+        forwarded_allow_ips=CONFIG_SERVER.forwarded_allow_ips,
+    )
+    server = DrainingServer(config)
+    prepare_multiproc_dir()
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+def loop_info() -> str:
+    """Какие реализации event loop и HTTP-парсера будут выбраны в режиме auto."""
+    try:
+        import uvloop  # noqa: F401
+
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    try:
+        import httptools  # noqa: F401
+
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    return f"loop={loop} http={http}"
@@ -0,0 +1,174 @@
+"""Спекулятивное выполнение general_inference между валидацией и подтверждением.
+
+Как только валидация вернула тему, ответ начинает считаться в фоне под request_id.
+Подтверждение («✅ Да») забирает готовый или ещё считающийся результат,
+«❌ Нет» отменяет задачу. Ограничения:
+  * не больше `max_inflight` одновременно считающихся задач — сверх лимита
+    спекуляция просто не запускается, и ответ считается обычным путём;
+  * результат живёт `ttl` секунд с момента старта, потом задача отменяется
+    и запись удаляется.
+
+Задача считается в воркере, принявшем /validation/speculative, а confirm при
+нескольких воркерах uvicorn обычно приходит в другой. Поэтому состояние
+дублируется в Redis (SPECULATIVE_REDIS_URL, по умолчанию CACHE_REDIS_URL):
+    speaker:speculative:<request_id> = {"state": "running" | "done" | "failed", "result": ...}
+Чужой воркер ждёт, пока state станет done, и забирает результат GETDEL-ом;
+cancel удаляет ключ, и воркер-владелец не публикует результат (SET XX).
+Без Redis и при SPEAKER_WORKERS > 1 спекуляция выключена: confirm ушёл бы
+в 404, а ответ был бы оплачен дважды.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from configs import CONFIG_SERVER, CONFIG_SPECULATIVE
+from metrics import FAILURES
+
+logger = logging.getLogger(__name__)
+
+# Как часто чужой воркер перечитывает состояние незавершённой задачи
+_POLL_INTERVAL = 0.1
+
+
+def _redis_key(request_id: str) -> str:
+    return f"speaker:speculative:{request_id}"
+
+
+class SpeculativeRunner:
+    def __init__(self, max_inflight: int = CONFIG_SPECULATIVE.max_inflight,
+                 ttl: float = CONFIG_SPECULATIVE.ttl,
+                 enabled: bool = CONFIG_SPECULATIVE.enabled,
+                 redis_url: Optional[str] = CONFIG_SPECULATIVE.redis_url,
+                 workers: int = CONFIG_SERVER.workers):
+        self.max_inflight = max_inflight
+        self.ttl = ttl
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._expiry: Dict[str, asyncio.TimerHandle] = {}
+        self.counters: Counter = Counter()
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(redis_url)
+        elif enabled and workers > 1:
+            logger.warning("speculation disabled: %d workers and no SPECULATIVE_REDIS_URL / CACHE_REDIS_URL", workers)
+            enabled = False
+        self.enabled = enabled
+
+    def inflight(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "stored": len(self._tasks), "inflight": self.inflight(), "enabled": self.enabled}
+
+    def start(self, request_id: str, compute: Callable[[], Awaitable[Any]]) -> bool:
+        """Запускает `compute()` в фоне; False — спекуляция выключена или лимит исчерпан."""
+        if not self.enabled:
+            return False
+        if request_id in self._tasks:
+            return True
+        if self.inflight() >= self.max_inflight:
+            self.counters["rejected"] += 1
+            return False
+
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(self._run(request_id, compute))
+        task.add_done_callback(_consume_exception)
+        self._tasks[request_id] = task
+        self._expiry[request_id] = loop.call_later(self.ttl, self._drop, request_id, "expired")
+        self.counters["started"] += 1
+        return True
+
+    async def collect(self, request_id: str, timeout: Optional[float] = None) -> Any:
+        """
+        Результат задачи (ждёт, если она ещё идёт) и удаление записи.
+
+        KeyError — задачи нет (не запускалась, отменена или истекла).
+        """
+        task = self._tasks.pop(request_id, None)
+        if task is None:
+            return await self._collect_shared(request_id, timeout)
+        self._expiry.pop(request_id).cancel()
+        self.counters["collected_ready" if task.done() else "collected_running"] += 1
+        result = await asyncio.wait_for(task, timeout)
+        await self._redis_call("delete", _redis_key(request_id))
+        return result
+
+    async def cancel(self, request_id: str) -> bool:
+        deleted = await self._redis_call("delete", _redis_key(request_id))
+        if request_id not in self._tasks:
+            return bool(deleted)
+        self._drop(request_id, "cancelled")
+        return True
+
+    def _drop(self, request_id: str, reason: str) -> None:
+        task = self._tasks.pop(request_id, None)
+        if task is None:
+            return
+        self._expiry.pop(request_id).cancel()
+        if not task.done():
+            task.cancel()
+        self.counters[reason] += 1
+
+    # -------- общее состояние в Redis ---------------------------------
+
+    async def _redis_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Команда к Redis; без Redis или при его ошибке — None, спекуляция работает локально."""
+        if self._redis is None:
+            return None
+        try:
+            return await getattr(self._redis, method)(*args, **kwargs)
+        except Exception as exc:  # noqa: BLE001
+            self.counters["redis_errors"] += 1
+            FAILURES.labels("speculative", f"redis_{method}").inc()
+            logger.warning("speculative redis %s failed: %s", method, exc)
+            return None
+
+    async def _run(self, request_id: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        key = _redis_key(request_id)
+        await self._redis_call("set", key, json.dumps({"state": "running"}), ex=max(1, round(self.ttl)))
+        try:
+            result = await compute()
+        except Exception:
+            await self._redis_call("set", key, json.dumps({"state": "failed"}), xx=True, keepttl=True)
+            raise
+        # XX: после cancel ключа нет — результат не публикуется
+        await self._redis_call("set", key, json.dumps({"state": "done", "result": result}, ensure_ascii=False),
+                               xx=True, keepttl=True)
+        return result
+
+    async def _collect_shared(self, request_id: str, timeout: Optional[float]) -> Any:
+        key = _redis_key(request_id)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            raw = await self._redis_call("get", key)
+            if raw is None:
+                self.counters["missed"] += 1
+                raise KeyError(request_id)
+            state = json.loads(raw)
+            if state["state"] == "done":
+                # GETDEL — из двух одновременных confirm результат достаётся одному
+                raw = await self._redis_call("getdel", key)
+                if raw is None:
+                    self.counters["missed"] += 1
+                    raise KeyError(request_id)
+                self.counters["collected_shared"] += 1
+                return json.loads(raw)["result"]
+            if state["state"] == "failed":
+                await self._redis_call("delete", key)
+                raise RuntimeError(f"speculative inference {request_id} failed in another worker")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(_POLL_INTERVAL)
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # результат может так и не забрать никто — не шумим "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+speculative_runner = SpeculativeRunner()
@@ -0,0 +1,324 @@
+"""Управление вызовами OpenAI из Speaker.
+
+Один настроенный AsyncOpenAI на процесс (пул соединений, таймауты, HTTP/2) и обёртка
+`UpstreamClient`, через которую идут все запросы:
+  * семафор на эндпоинт — сколько одновременных вызовов делает воркер;
+  * token bucket по RPM и TPM; токены оцениваются до запроса и
+    уточняются по `usage` после ответа;
+  * повторы с экспоненциальной задержкой на 429/5xx/ошибки сети,
+    `Retry-After` от сервера имеет приоритет и тормозит всех;
+  * circuit breaker — после серии отказов upstream запросы сразу получают CircuitOpen.
+
+Ретраи SDK выключены (max_retries=0), чтобы не повторять запросы дважды.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+import httpx
+
+from configs import CONFIG_UPSTREAM
+from metrics import OPENAI_ERRORS, OPENAI_LATENCY, OPENAI_TOKENS, error_label
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"upstream circuit is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# =========================== RATE LIMIT =====================================
+
+class TokenBucket:
+    """Пополняется равномерно `per_minute / 60` в секунду; per_minute <= 0 — без лимита."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, n: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        n = min(n, self.capacity)
+        # под замком — ждущие обслуживаются по очереди, большие запросы не голодают
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """Доплата (delta > 0) или возврат (delta < 0) после точного подсчёта; баланс может уйти в минус."""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._blocked_until = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def block(self, seconds: float) -> None:
+        """Retry-After от upstream: никто из воркера не идёт в OpenAI `seconds` секунд."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+# =========================== CIRCUIT BREAKER ================================
+
+class CircuitBreaker:
+    """closed → (failure_threshold отказов подряд) → open → (reset_timeout) → half_open → один пробный запрос."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe = False
+
+    def before(self) -> bool:
+        """Пропускает запрос или бросает CircuitOpen; True — этот запрос и есть пробный."""
+        if self.state == "closed":
+            return False
+        if self.state == "open":
+            wait = self.opened_at + self.reset_timeout - time.monotonic()
+            if wait > 0:
+                raise CircuitOpen(wait)
+            self.state = "half_open"
+        if self._probe:
+            raise CircuitOpen(self.reset_timeout)
+        self._probe = True
+        return True
+
+    def release(self, probe: bool) -> None:
+        """Пробный запрос отменён — ни успех, ни отказ: следующий запрос станет пробным."""
+        if probe:
+            self._probe = False
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probe = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+# =========================== CLIENT =========================================
+
+def build_openai_client(api_key: Optional[str], base_url: Optional[str] = CONFIG_UPSTREAM.base_url) -> AsyncOpenAI:
+    http2 = CONFIG_UPSTREAM.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+    http_client = DefaultAsyncHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=CONFIG_UPSTREAM.max_connections,
+            max_keepalive_connections=CONFIG_UPSTREAM.max_keepalive,
+            keepalive_expiry=CONFIG_UPSTREAM.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            CONFIG_UPSTREAM.read_timeout,
+            connect=CONFIG_UPSTREAM.connect_timeout,
+        ),
+    )
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Грубая оценка до запроса: ~4 символа на токен, картинка ~1000, плюс ожидаемый ответ."""
+    chars = 0
+    images = 0
+    for message in kwargs.get("input") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "input_image":
+                images += 1
+            else:
+                chars += len(part.get("text") or "")
+    return chars // 4 + images * 1000 + CONFIG_UPSTREAM.expected_output_tokens
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, openai.APIConnectionError):  # включает APITimeoutError
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+class UpstreamClient:
+    def __init__(self, raw: Any, limits: Optional[Dict[str, int]] = None,
+                 rpm: float = CONFIG_UPSTREAM.rpm, tpm: float = CONFIG_UPSTREAM.tpm):
+        self.raw = raw
+        limits = limits or CONFIG_UPSTREAM.concurrency
+        self._default_limit = limits.get("default", 32)
+        self._semaphores = {name: asyncio.Semaphore(n) for name, n in limits.items()}
+        self.limiter = RateLimiter(rpm, tpm)
+        self.breaker = CircuitBreaker(CONFIG_UPSTREAM.breaker_failures, CONFIG_UPSTREAM.breaker_reset)
+        self.counters: Dict[str, Counter] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for name, c in self.counters.items():
+            endpoints[name] = {
+                **c,
+                # доля входных токенов из кэша промптов OpenAI
+                "cached_ratio": c["cached_tokens"] / c["input_tokens"] if c["input_tokens"] else 0.0,
+            }
+        return {"endpoints": endpoints, "breaker": self.breaker.state}
+
+    @asynccontextmanager
+    async def _slot(self, endpoint: str):
+        sem = self._semaphores.get(endpoint)
+        if sem is None:
+            sem = self._semaphores[endpoint] = asyncio.Semaphore(self._default_limit)
+        async with sem:
+            yield
+
+    async def _call(self, endpoint: str, kwargs: Dict[str, Any], topic: str) -> Any:
+        counters = self.counters.setdefault(endpoint, Counter())
+        estimate = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            probe = self.breaker.before()
+            t0 = time.perf_counter()
+            try:
+                await self.limiter.acquire(estimate)
+                counters["requests"] += 1
+                t0 = time.perf_counter()
+                result = await self.raw.responses.create(**kwargs)
+            except Exception as exc:
+                OPENAI_ERRORS.labels(endpoint, topic, error_label(exc)).inc()
+                OPENAI_LATENCY.labels(endpoint, topic, "error").observe(time.perf_counter() - t0)
+                if not _is_retryable(exc):
+                    self.breaker.success()  # 4xx — upstream жив, ошибка в запросе
+                    raise
+                status = getattr(exc, "status_code", None)
+                counters[f"error_{status or 'network'}"] += 1
+                if status != 429:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+                attempt += 1
+                if attempt > CONFIG_UPSTREAM.retries:
+                    counters["gave_up"] += 1
+                    raise
+                delay = _retry_after(exc)
+                if delay is not None:
+                    self.limiter.block(delay)
+                else:
+                    # full jitter
+                    delay = random.uniform(0, min(CONFIG_UPSTREAM.backoff_max,
+                                                  CONFIG_UPSTREAM.backoff_base * 2 ** attempt))
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # CancelledError: отмена спекуляции, таймаут wait_for, обрыв стрима клиентом —
+                # upstream тут ни при чём, пробный слот освобождается без смены состояния
+                self.breaker.release(probe)
+                raise
+            self.breaker.success()
+            if not kwargs.get("stream"):
+                OPENAI_LATENCY.labels(endpoint, topic, "ok").observe(time.perf_counter() - t0)
+                self._reconcile(endpoint, estimate, getattr(result, "usage", None), topic)
+            return result
+
+    def _reconcile(self, endpoint: str, estimate: int, usage: Any, topic: str) -> None:
+        if usage is None:
+            return
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        details = getattr(usage, "input_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        counters = self.counters.setdefault(endpoint, Counter())
+        counters["input_tokens"] += input_tokens
+        counters["cached_tokens"] += cached_tokens
+        counters["output_tokens"] += output_tokens
+        OPENAI_TOKENS.labels(endpoint, topic, "input").inc(input_tokens)
+        OPENAI_TOKENS.labels(endpoint, topic, "cached").inc(cached_tokens)
+        OPENAI_TOKENS.labels(endpoint, topic, "output").inc(output_tokens)
+        self.limiter.tokens.adjust(input_tokens + output_tokens - estimate)
+
+    async def create(self, endpoint: str, topic: str = "-", **kwargs: Any) -> Any:
+        """`topic` — только метка метрик, в OpenAI не уходит."""
+        async with self._slot(endpoint):
+            return await self._call(endpoint, kwargs, topic)
+
+    async def stream(self, endpoint: str, topic: str = "-", **kwargs: Any) -> AsyncIterator[Any]:
+        """События stream=True; слот эндпоинта занят до конца потока, ретраи — только до первого события."""
+        kwargs["stream"] = True
+        estimate = estimate_tokens(kwargs)
+        async with self._slot(endpoint):
+            t0 = time.perf_counter()
+            events = await self._call(endpoint, kwargs, topic)
+            outcome = "aborted"  # клиент ушёл до конца потока
+            try:
+                async for event in events:
+                    if event.type == "response.completed":
+                        outcome = "ok"
+                        self._reconcile(endpoint, estimate, getattr(getattr(event, "response", None), "usage", None),
+                                        topic)
+                    yield event
+            except Exception as exc:
+                outcome = "error"
+                OPENAI_ERRORS.labels(endpoint, topic, error_label(exc)).inc()
+                raise
+            finally:
+                OPENAI_LATENCY.labels(endpoint, topic, outcome).observe(time.perf_counter() - t0)
@@ -0,0 +1,73 @@
+"""Общие утилиты для бенчмарков TelegramService.
+
+Скрипты запускаются из каталога TelegramService:
+    python -m benchmarks.<name> [--опции]
+"""
+import statistics
+from types import SimpleNamespace
+from typing import Any, Iterable, Optional
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """q-й перцентиль (0..100) по методу nearest-rank."""
+    data = sorted(samples)
+    if not data:
+        return 0.0
+    k = max(0, min(len(data) - 1, int(round(q / 100 * len(data))) - 1))
+    return data[k]
+
+
+def report(title: str, latencies_s: list[float], total_s: Optional[float] = None) -> None:
+    """Печатает p50/p99/mean в миллисекундах (и rps, если известна общая длительность)."""
+    ms = [x * 1000 for x in latencies_s]
+    line = (
+        f"{title:<28} n={len(ms):<6} "
+        f"p50={percentile(ms, 50):8.2f}ms  p99={percentile(ms, 99):8.2f}ms  "
+        f"mean={statistics.fmean(ms) if ms else 0:8.2f}ms"
+    )
+    if total_s:
+        line += f"  rps={len(ms) / total_s:10.1f}"
+    print(line)
+
+
+def require_postgres() -> None:
+    """Выход с понятным сообщением, если Postgres из POSTGRE_* недоступен."""
+    import sqlalchemy as sa
+
+    import database as db
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(sa.text("SELECT 1"))
+    except sa.exc.OperationalError as exc:
+        raise SystemExit(f"this benchmark needs a live Postgres (POSTGRE_* env): {exc.orig}") from None
+
+
+async def _noop(*args: Any, **kwargs: Any) -> None:
+    return None
+
+
+def fake_update(user_id: int, username: str = "bench", text: str = "/start",
+                callback_data: Optional[str] = None) -> SimpleNamespace:
+    """Минимальный duck-typed Update: ровно те поля, которые читают наши хендлеры."""
+    user = SimpleNamespace(id=user_id, username=username)
+    message = SimpleNamespace(text=text, reply_html=_noop, reply_text=_noop, reply_markdown_v2=_noop)
+    callback_query = None
+    if callback_data is not None:
+        callback_query = SimpleNamespace(
+            data=callback_data,
+            message=message,
+            answer=_noop,
+            edit_message_reply_markup=_noop,
+        )
+    return SimpleNamespace(
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=user_id),
+        effective_message=message,
+        message=message,
+        callback_query=callback_query,
+    )
+
+
+def fake_context() -> SimpleNamespace:
+    return SimpleNamespace(user_data={}, chat_data={}, bot_data={})
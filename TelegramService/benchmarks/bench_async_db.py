@@ -0,0 +1,65 @@
+"""N конкурентных /start: латентность хендлера в sync (psycopg2) и async (asyncpg) режимах.
+
+Нужен живой Postgres из переменных POSTGRE_* (без них — bench:bench@localhost:5432/bench).
+Каждый прогон вставляет новых пользователей с уникальными id и удаляет их в конце.
+
+    python -m benchmarks.bench_async_db -n 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+import main  # noqa: E402
+from configs import CONFIG_POSTGRE  # noqa: E402
+from benchmarks._common import fake_context, fake_update, report, require_postgres  # noqa: E402
+
+
+async def _run_mode(async_mode: bool, n: int, base_id: int) -> None:
+    CONFIG_POSTGRE.async_mode = async_mode
+    # __wrapped__ — чистый хендлер без log_event, чтобы мерить только БД
+    handler = main.start.__wrapped__
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        t0 = time.perf_counter()
+        await handler(fake_update(base_id + i, f"bench_{i}"), fake_context())
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    report("async (asyncpg)" if async_mode else "sync (psycopg2)", latencies, time.perf_counter() - t0)
+
+
+def _cleanup(ids: range) -> None:
+    with db.SessionLocal() as session:
+        session.execute(sa.delete(db.UserHub).where(db.UserHub.id.between(ids.start, ids.stop)))
+        session.commit()
+
+
+async def main_bench(n: int) -> None:
+    base = random.randint(10**8, 2 * 10**8)
+    try:
+        await _run_mode(False, n, base)
+        await _run_mode(True, n, base + n)
+    finally:
+        _cleanup(range(base, base + 2 * n))
+        await db.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200, help="число конкурентных /start")
+    args = parser.parse_args()
+    require_postgres()
+    asyncio.run(main_bench(args.n))
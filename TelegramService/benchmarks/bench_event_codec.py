@@ -0,0 +1,45 @@
+"""Кодеки spylog-буфера: байт на событие, скорость кодирования и декодирования.
+
+    python -m benchmarks.bench_event_codec -n 200000
+"""
+import argparse
+import time
+
+from event_codec import ENCODERS, decode_row, encode_event
+
+SAMPLES = [
+    ("start", 123456789, 123456789, "/start", None),
+    ("about_me", 987654321, 987654321, "Привет! Я Pinky – твоя digital-подруга", "about_me"),
+    ("free_text", 555000111, 555000111, "какой тональный крем выбрать для сухой кожи зимой?", None),
+    ("custom_event", None, None, None, None),
+]
+
+
+def run(n: int) -> None:
+    ts_us = time.time_ns() // 1000
+    print(f"{'codec':>8} {'bytes/event':>12} {'encode ev/s':>13} {'decode ev/s':>13}")
+    for codec in ENCODERS:
+        try:
+            one = [encode_event(e, u, c, ts_us, m, cb, codec=codec) for e, u, c, m, cb in SAMPLES]
+        except ImportError:
+            print(f"{codec:>8}  (не установлен)")
+            continue
+
+        t0 = time.perf_counter()
+        raws = [encode_event(*SAMPLES[i % len(SAMPLES)][:3], ts_us, *SAMPLES[i % len(SAMPLES)][3:], codec=codec)
+                for i in range(n)]
+        enc = n / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for raw in raws:
+            decode_row(raw)
+        dec = n / (time.perf_counter() - t0)
+
+        size = sum(len(r) for r in one) / len(one)
+        print(f"{codec:>8} {size:>12.1f} {enc:>13.0f} {dec:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200_000)
+    run(parser.parse_args().n)
@@ -0,0 +1,123 @@
+"""Конкурентные списания по «горячим» пользователям.
+
+Сравнивает атомарный `ledger.reserve` (UPDATE ... WHERE balance >= :c RETURNING)
+с наивным read-modify-write под SERIALIZABLE (SELECT, проверка, UPDATE) и
+проверяет инвариант: итоговый баланс = начальный − успешные списания + возвраты.
+
+Нужен живой Postgres из переменных POSTGRE_* (без них — bench:bench@localhost:5432/bench);
+созданные строки удаляются.
+
+    python -m benchmarks.bench_ledger --hot-users 10 -n 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+from benchmarks._common import report, require_postgres  # noqa: E402
+from database.queries import async_db_update  # noqa: E402
+
+BASE_ID = 700_000_000
+
+
+@async_db_update
+async def naive_reserve(session, user_id: int, cost: int, action: str = "answer"):
+    user = await session.get(db.UserHub, user_id)
+    if user.balance < cost:
+        raise db.InsufficientFunds(user_id)
+    user.balance = user.balance - cost
+    session.add(db.Transaction(price=cost, action=action, user_id=user_id))
+
+
+def _reset(hot_users: int, balance: int) -> None:
+    with db.SessionLocal() as session:
+        ids = sa.select(db.UserHub.id).where(db.UserHub.id >= BASE_ID)
+        session.execute(sa.delete(db.PFunc).where(db.PFunc.user_id.in_(ids)))
+        session.execute(sa.delete(db.Transaction).where(db.Transaction.user_id.in_(ids)))
+        session.execute(sa.delete(db.UserHub).where(db.UserHub.id >= BASE_ID))
+        if hot_users:
+            session.execute(
+                sa.insert(db.UserHub),
+                [{"id": BASE_ID + i, "name": f"hot{i}", "balance": balance} for i in range(hot_users)],
+            )
+        session.commit()
+
+
+def _balances() -> int:
+    with db.SessionLocal() as session:
+        return session.execute(
+            sa.select(sa.func.sum(db.UserHub.balance)).where(db.UserHub.id >= BASE_ID)
+        ).scalar_one()
+
+
+async def _run_mode(title: str, args, atomic: bool) -> None:
+    _reset(args.hot_users, args.balance)
+    latencies: list[float] = []
+    charged = refunded = rejected = failed = 0
+    if atomic:
+        await db.ledger_writer.start()
+
+    async def one(i: int) -> None:
+        nonlocal charged, refunded, rejected, failed
+        user_id = BASE_ID + random.randrange(args.hot_users)
+        t0 = time.perf_counter()
+        try:
+            if atomic:
+                r = await db.reserve(user_id, args.cost)
+                if random.random() < args.refund_ratio:
+                    await db.ledger_writer.refund(r)
+                    refunded += 1
+                else:
+                    await db.ledger_writer.charge(r, message="q", answer="a", cls="bench")
+                    charged += 1
+            else:
+                await naive_reserve(user_id=user_id, cost=args.cost)
+                charged += 1
+        except db.InsufficientFunds:
+            rejected += 1
+        except Exception:  # noqa: BLE001
+            failed += 1
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.n)))
+    total = time.perf_counter() - t0
+    if atomic:
+        await db.ledger_writer.stop()
+
+    report(title, latencies, total)
+    expected = args.hot_users * args.balance - charged * args.cost
+    actual = _balances()
+    print(f"{'':<28} charged={charged} refunded={refunded} rejected={rejected} failed={failed} "
+          f"balance expected={expected} actual={actual} {'OK' if expected == actual else 'MISMATCH'}")
+
+
+async def run(args) -> None:
+    try:
+        await _run_mode("naive read-modify-write", args, atomic=False)
+        await _run_mode("atomic reserve + batched", args, atomic=True)
+    finally:
+        _reset(0, 0)
+        await db.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hot-users", type=int, default=10)
+    parser.add_argument("-n", type=int, default=5000)
+    parser.add_argument("--balance", type=int, default=10_000)
+    parser.add_argument("--cost", type=int, default=2)
+    parser.add_argument("--refund-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    require_postgres()
+    asyncio.run(run(args))
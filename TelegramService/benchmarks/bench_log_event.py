@@ -0,0 +1,70 @@
+"""Накладные расходы log_event на вызов хендлера: прямой RPUSH vs EventBatcher.
+
+    python -m benchmarks.bench_log_event --redis-url redis://localhost:6379/15 -n 20000
+    python -m benchmarks.bench_log_event --fake          # fakeredis, без сети
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# tasks создаёт Redis-пул при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import redis.asyncio as aioredis  # noqa: E402
+
+import tasks  # noqa: E402
+from benchmarks._common import fake_context, fake_update, report  # noqa: E402
+
+
+@tasks.log_event("bench")
+async def noop_handler(update, context) -> None:
+    return None
+
+
+async def _measure(n: int, concurrency: int) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await noop_handler(fake_update(i % 1000 + 1, callback_data="about_me"), fake_context())
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies, time.perf_counter() - t0
+
+
+async def run(args) -> None:
+    if args.fake:
+        import fakeredis
+
+        tasks.redis_conn = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        tasks.redis_conn = aioredis.from_url(args.redis_url, decode_responses=True)
+    await tasks.redis_conn.delete(tasks.CONFIG_REDIS.buffer_key)
+
+    latencies, total = await _measure(args.n, args.concurrency)
+    report("direct push", latencies, total)
+
+    await tasks.event_batcher.start()
+    latencies, total = await _measure(args.n, args.concurrency)
+    await tasks.event_batcher.stop()
+    report("batched", latencies, total)
+    print(f"batcher stats: {tasks.event_batcher.stats()}")
+
+    await tasks.redis_conn.delete(tasks.CONFIG_REDIS.buffer_key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--fake", action="store_true", help="fakeredis вместо настоящего Redis")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""1000 одновременных /start: SERIALIZABLE insert-and-fail vs INSERT ... ON CONFLICT.
+
+«legacy» воспроизводит прежний async_db_update как был: SERIALIZABLE,
+flush по одному объекту перед commit, без повторов — нынешний async_db_update
+повторяет транзакцию и исказил бы сравнение.
+
+Два сценария — все события от одного пользователя и от разных пользователей.
+Нужен живой Postgres из переменных POSTGRE_* (без них — bench:bench@localhost:5432/bench);
+созданные строки удаляются.
+
+    python -m benchmarks.bench_new_user -n 1000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+from benchmarks._common import report, require_postgres  # noqa: E402
+from database.queries import _get_async_session  # noqa: E402
+
+BASE_ID = 800_000_000
+
+
+async def legacy_new_user(id: int, name: str) -> None:
+    """Прежняя реализация: session.add под SERIALIZABLE, flush по объекту, без повтора."""
+    async with _get_async_session("SERIALIZABLE") as session:
+        try:
+            session.add(db.UserHub(id=id, name=name))
+            for obj in list(session.new):
+                await session.flush([obj])
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def _burst(title: str, func, ids: list[int]) -> None:
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(user_id: int) -> None:
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            await func(id=user_id, name="bench")
+        except Exception:  # noqa: BLE001
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in ids))
+    report(title, latencies, time.perf_counter() - t0)
+    print(f"{'':<28} errors={errors}")
+
+
+def _cleanup() -> None:
+    with db.SessionLocal() as session:
+        session.execute(sa.delete(db.UserHub).where(db.UserHub.id >= BASE_ID))
+        session.commit()
+
+
+async def run(n: int) -> None:
+    scenarios = {
+        "same user": [BASE_ID] * n,
+        "distinct users": [BASE_ID + i for i in range(n)],
+    }
+    try:
+        for scenario, ids in scenarios.items():
+            print(f"--- {scenario}")
+            for title, func in (("legacy serializable", legacy_new_user), ("upsert", db.new_user_async)):
+                _cleanup()
+                await _burst(title, func, ids)
+    finally:
+        _cleanup()
+        await db.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1000)
+    args = parser.parse_args()
+    require_postgres()
+    asyncio.run(run(args.n))
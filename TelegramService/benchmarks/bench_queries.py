@@ -0,0 +1,103 @@
+"""Типовые запросы бота к userhub / transactions / tasks: с индексами по FK и без.
+
+Лукапы: история баланса пользователя, активные задания к исполнению,
+число рефералов. Сначала с индексами из миграции 0003, затем без них.
+
+ВНИМАНИЕ: пересоздаёт таблицы — запускать только на отдельной БД.
+
+    python -m benchmarks.bench_queries --dsn postgresql+psycopg2://u:p@localhost/bench
+"""
+import argparse
+import datetime as dt
+import os
+import random
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+from benchmarks._common import report  # noqa: E402
+
+TABLES = [db.UserHub.__table__, db.Transaction.__table__, db.PFunc.__table__, db.Task.__table__]
+INDEXES = [
+    "ix_userhub_refferer_id",
+    "ix_transactions_user_ts",
+    "ix_pfunc_user_id",
+    "ix_pfunc_pay_id",
+    "ix_tasks_user_id",
+    "ix_tasks_active_date",
+]
+
+
+def seed(engine, users: int, transactions: int, tasks: int) -> None:
+    db.Base.metadata.drop_all(engine, tables=TABLES)
+    db.Base.metadata.create_all(engine, tables=TABLES)
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "INSERT INTO userhub (id, name, refferer_id) "
+            "SELECT g, 'u' || g, CASE WHEN g > 100 AND random() < 0.3 THEN 1 + (random() * 99)::int END "
+            "FROM generate_series(1, :n) g"
+        ), {"n": users})
+        conn.execute(sa.text(
+            "INSERT INTO transactions (price, action, user_id, ts) "
+            "SELECT (random() * 10)::int, 'answer', 1 + (random() * (:users - 1))::int, "
+            "       now() - random() * INTERVAL '180 days' "
+            "FROM generate_series(1, :n) g"
+        ), {"n": transactions, "users": users})
+        conn.execute(sa.text(
+            "INSERT INTO tasks (user_id, test, date, is_active) "
+            "SELECT 1 + (random() * (:users - 1))::int, 'task', "
+            "       now() + (random() - 0.5) * INTERVAL '60 days', random() < 0.05 "
+            "FROM generate_series(1, :n) g"
+        ), {"n": tasks, "users": users})
+        for table in TABLES:
+            conn.execute(sa.text(f"ANALYZE {table.name}"))
+    print(f"seeded in {time.perf_counter() - t0:.1f}s")
+
+
+def run_suite(users: int, repeat: int) -> None:
+    cases = {
+        "balance_history": lambda: db.balance_history(random.randint(1, users)),
+        "active_tasks_due": lambda: db.active_tasks_due(dt.datetime.now(dt.timezone.utc)),
+        "referral_count": lambda: db.referral_count(random.randint(1, 100)),
+    }
+    for title, call in cases.items():
+        latencies = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - t0)
+        report(title, latencies)
+
+
+def run(args) -> None:
+    engine = sa.create_engine(args.dsn)
+    db.SessionLocal.remove()
+    db.SessionLocal.configure(bind=engine)
+    seed(engine, args.users, args.transactions, args.tasks)
+
+    print("--- with FK / partial indexes")
+    run_suite(args.users, args.repeat)
+
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(sa.text(f"DROP INDEX IF EXISTS {name}"))
+    print("--- without indexes")
+    run_suite(args.users, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--transactions", type=int, default=2_000_000)
+    parser.add_argument("--tasks", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    run(parser.parse_args())
@@ -0,0 +1,95 @@
+"""Пропускная способность слива spylog-буфера: события/сек при разных batch_size.
+
+Redis подменяется на fakeredis, Postgres — на SQLite (по умолчанию в памяти)
+или на любой DSN из --dsn.
+
+    python -m benchmarks.bench_spylog_flush --events 100000
+    python -m benchmarks.bench_spylog_flush --dsn postgresql+psycopg2://u:p@localhost/db
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import fakeredis  # noqa: E402
+import sqlalchemy as sa  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import database as db  # noqa: E402
+from database.queries import drain_spylog  # noqa: E402
+
+BATCH_SIZES = (100, 1_000, 5_000, 10_000, 50_000)
+N_USERS = 1_000
+
+
+def make_events(n: int) -> list[str]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        json.dumps({
+            "event": "start",
+            "user_id": i % N_USERS + 1,
+            "chat_id": i % N_USERS + 1,
+            "iso_ts": now,
+            "message": "/start",
+            "callback_data": None,
+        })
+        for i in range(n)
+    ]
+
+
+# Для не-Postgres бэкендов: секционирование и составной PK (id, ts) там не нужны
+_PLAIN_SPYLOG_DDL = (
+    "CREATE TABLE spylog (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INT NOT NULL, "
+    "action TEXT NOT NULL, ts TIMESTAMP NOT NULL, event_id TEXT, UNIQUE (event_id, ts))"
+)
+
+
+def prepare_db(dsn: str):
+    engine = sa.create_engine(dsn)
+    db.Base.metadata.drop_all(engine, tables=[db.SpyLog.__table__, db.UserHub.__table__])
+    db.Base.metadata.create_all(engine, tables=[db.UserHub.__table__])
+    if engine.dialect.name == "postgresql":
+        db.Base.metadata.create_all(engine, tables=[db.SpyLog.__table__])
+        with engine.begin() as conn:
+            conn.execute(sa.text("CREATE TABLE spylog_default PARTITION OF spylog DEFAULT"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(sa.text(_PLAIN_SPYLOG_DDL))
+    with engine.begin() as conn:
+        conn.execute(sa.insert(db.UserHub), [{"id": i, "name": f"u{i}"} for i in range(1, N_USERS + 1)])
+    return engine, sessionmaker(bind=engine)
+
+
+def run(dsn: str, n_events: int) -> None:
+    events = make_events(n_events)
+    engine, factory = prepare_db(dsn)
+    key = "bench_spylog_buffer"
+
+    print(f"{'batch_size':>10} {'events':>8} {'seconds':>9} {'events/sec':>12}")
+    for batch_size in BATCH_SIZES:
+        conn = fakeredis.FakeRedis(decode_responses=True)
+        for i in range(0, len(events), 10_000):
+            conn.rpush(key, *events[i:i + 10_000])
+
+        with engine.begin() as c:
+            c.execute(sa.delete(db.SpyLog))
+
+        t0 = time.perf_counter()
+        flushed = drain_spylog(conn, factory, batch_size=batch_size, key=key)
+        dt = time.perf_counter() - t0
+        print(f"{batch_size:>10} {flushed:>8} {dt:>9.3f} {flushed / dt:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--dsn", default="sqlite+pysqlite:///:memory:")
+    args = parser.parse_args()
+    run(args.dsn, args.events)
@@ -0,0 +1,51 @@
+"""Сравнение стратегий записи spylog: executemany vs INSERT ... VALUES vs COPY.
+
+COPY имеет смысл только на Postgres; на SQLite стратегия ``copy`` автоматически
+откатывается на ``values`` (в выводе помечено).
+
+    python -m benchmarks.bench_spylog_ingest --dsn postgresql+psycopg2://u:p@localhost/db
+"""
+import argparse
+import time
+
+import fakeredis
+import sqlalchemy as sa
+
+from benchmarks.bench_spylog_flush import make_events, prepare_db
+import database as db
+from database.ingest import WRITERS
+from database.queries import drain_spylog
+
+
+def run(dsn: str, n_events: int, batch_size: int) -> None:
+    events = make_events(n_events)
+    engine, factory = prepare_db(dsn)
+    key = "bench_spylog_buffer"
+    fallback = engine.dialect.name != "postgresql"
+
+    print(f"{'mode':>12} {'events':>8} {'seconds':>9} {'events/sec':>12}")
+    for mode in WRITERS:
+        conn = fakeredis.FakeRedis(decode_responses=True)
+        for i in range(0, len(events), 10_000):
+            conn.rpush(key, *events[i:i + 10_000])
+
+        with engine.begin() as c:
+            c.execute(sa.delete(db.SpyLog))
+
+        t0 = time.perf_counter()
+        flushed = drain_spylog(conn, factory, batch_size=batch_size, key=key, mode=mode)
+        dt = time.perf_counter() - t0
+        label = f"{mode}*" if mode == "copy" and fallback else mode
+        print(f"{label:>12} {flushed:>8} {dt:>9.3f} {flushed / dt:>12.0f}")
+
+    if fallback:
+        print("* не Postgres: copy выполнен через INSERT ... VALUES")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--dsn", default="sqlite+pysqlite:///:memory:")
+    args = parser.parse_args()
+    run(args.dsn, args.events, args.batch_size)
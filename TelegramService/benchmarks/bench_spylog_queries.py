@@ -0,0 +1,106 @@
+"""Типовые аналитические запросы к spylog на сгенерированных данных.
+
+Сравнивает секционированную spylog (BRIN по ts, btree по (user_id, ts)) с
+обычной кучей без индексов с теми же данными (spylog_heap).
+
+ВНИМАНИЕ: пересоздаёт userhub и spylog — запускать только на отдельной БД.
+
+    python -m benchmarks.bench_spylog_queries --dsn postgresql+psycopg2://u:p@localhost/bench --rows 5000000
+"""
+import argparse
+import datetime as dt
+import os
+import random
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+from benchmarks._common import report  # noqa: E402
+from database.partitions import ensure_spylog_partitions  # noqa: E402
+
+QUERIES = {
+    "user: last 50 events": (
+        "SELECT id, action, ts FROM {t} WHERE user_id = :u ORDER BY ts DESC LIMIT 50"
+    ),
+    "user: count in 7 days": (
+        "SELECT count(*) FROM {t} WHERE user_id = :u AND ts >= :a AND ts < :a + INTERVAL '7 days'"
+    ),
+    "window: events by type 1 day": (
+        "SELECT action->>'event', count(*) FROM {t} "
+        "WHERE ts >= :a AND ts < :a + INTERVAL '1 day' GROUP BY 1"
+    ),
+}
+
+
+def seed(engine, rows: int, users: int, days: int) -> dt.datetime:
+    start = dt.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - dt.timedelta(days=days)
+
+    db.Base.metadata.drop_all(engine, tables=[db.SpyLog.__table__])
+    with engine.begin() as conn:
+        conn.execute(sa.text("DROP TABLE IF EXISTS spylog_heap"))
+    db.Base.metadata.drop_all(engine, tables=[db.UserHub.__table__])
+    db.Base.metadata.create_all(engine, tables=[db.UserHub.__table__, db.SpyLog.__table__])
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE spylog_default PARTITION OF spylog DEFAULT"))
+    ensure_spylog_partitions(engine, ahead=days // 28 + 2, granularity="month", today=start.date())
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(
+            sa.text("INSERT INTO userhub (id, name) SELECT g, 'u' || g FROM generate_series(1, :n) g"),
+            {"n": users},
+        )
+        conn.execute(
+            sa.text(
+                "INSERT INTO spylog (user_id, action, ts) "
+                "SELECT 1 + (random() * (:users - 1))::int, "
+                "       jsonb_build_object('event', (ARRAY['start','about_me','what_i_do','register','agree','free_text'])"
+                "                                   [1 + (g % 6)]), "
+                "       :start + (g::float / :rows) * (:days * INTERVAL '1 day') "
+                "FROM generate_series(1, :rows) g"
+            ),
+            {"users": users, "rows": rows, "days": days, "start": start},
+        )
+        conn.execute(sa.text("CREATE TABLE spylog_heap AS SELECT * FROM spylog"))
+        conn.execute(sa.text("ANALYZE spylog"))
+        conn.execute(sa.text("ANALYZE spylog_heap"))
+    print(f"seeded {rows} rows for {users} users over {days} days in {time.perf_counter() - t0:.1f}s")
+    return start
+
+
+def run(args) -> None:
+    engine = sa.create_engine(args.dsn)
+    start = seed(engine, args.rows, args.users, args.days)
+
+    for table in ("spylog", "spylog_heap"):
+        print(f"--- {table}")
+        for title, sql in QUERIES.items():
+            stmt = sa.text(sql.format(t=table))
+            latencies = []
+            with engine.connect() as conn:
+                for _ in range(args.repeat):
+                    params = {
+                        "u": random.randint(1, args.users),
+                        "a": start + dt.timedelta(days=random.randint(0, args.days - 7)),
+                    }
+                    t0 = time.perf_counter()
+                    conn.execute(stmt, params).fetchall()
+                    latencies.append(time.perf_counter() - t0)
+            report(title, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=50)
+    run(parser.parse_args())
@@ -0,0 +1,124 @@
+"""Stream-буфер spylog: пропускная способность и потери при падении воркеров.
+
+Запускает несколько процессов-флашеров (`drain_spylog_stream`) над одним стримом,
+периодически убивает случайный из них SIGKILL посреди пачки (commit искусственно
+замедлен) и поднимает новый. В конце сверяет число строк в spylog с числом
+отправленных событий: потерь и дублей быть не должно.
+
+Нужен настоящий Redis ≥ 6.2 (процессы делят один стрим):
+
+    python -m benchmarks.bench_spylog_stream --redis-url redis://localhost:6379/15 --events 50000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import signal
+import tempfile
+import time
+
+from benchmarks.bench_spylog_flush import make_events, prepare_db
+
+import redis
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+import database as db
+from configs import CONFIG_REDIS
+from database.queries import drain_spylog_stream
+
+KEY = "bench_spylog_stream"
+
+
+def _slow_commit_factory(factory, delay: float):
+    """Фабрика сессий, у которых commit ждёт `delay` секунд — окно для SIGKILL."""
+
+    def make():
+        session = factory()
+        commit = session.commit
+
+        def slow_commit():
+            time.sleep(delay)
+            commit()
+
+        session.commit = slow_commit
+        return session
+
+    return make
+
+
+def _worker(name: str, redis_url: str, dsn: str, batch_size: int, commit_delay: float, claim_idle_ms: int):
+    CONFIG_REDIS.stream_claim_idle_ms = claim_idle_ms
+    conn = redis.Redis.from_url(redis_url, decode_responses=True)
+    engine = sa.create_engine(dsn, connect_args={"timeout": 60} if dsn.startswith("sqlite") else {})
+    factory = _slow_commit_factory(sessionmaker(bind=engine), commit_delay)
+    while True:
+        if not drain_spylog_stream(conn, factory, batch_size=batch_size, key=KEY, consumer=name):
+            time.sleep(0.05)
+
+
+def run(args) -> None:
+    dsn = args.dsn or f"sqlite+pysqlite:///{tempfile.mkdtemp()}/spylog_bench.db"
+    engine, _ = prepare_db(dsn)
+
+    conn = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    conn.delete(KEY)
+    events = make_events(args.events)
+    pipe = conn.pipeline(transaction=False)
+    for raw in events:
+        pipe.xadd(KEY, {"data": raw})
+    pipe.execute()
+
+    def spawn(i: int) -> mp.Process:
+        p = mp.Process(
+            target=_worker,
+            args=(f"w{i}", args.redis_url, dsn, args.batch_size, args.commit_delay, args.claim_idle_ms),
+            daemon=True,
+        )
+        p.start()
+        return p
+
+    workers = [spawn(i) for i in range(args.workers)]
+    next_id, kills = args.workers, 0
+    t0 = time.perf_counter()
+    deadline = t0 + args.timeout
+
+    while time.perf_counter() < deadline:
+        time.sleep(args.kill_every)
+        pending = conn.xpending(KEY, CONFIG_REDIS.stream_group)["pending"] if conn.exists(KEY) else 0
+        if conn.xlen(KEY) == 0 and pending == 0:
+            break
+        if kills < args.max_kills:
+            victim = random.randrange(len(workers))
+            os.kill(workers[victim].pid, signal.SIGKILL)
+            workers[victim].join()
+            workers[victim] = spawn(next_id)
+            next_id += 1
+            kills += 1
+
+    dt = time.perf_counter() - t0
+    for p in workers:
+        p.kill()
+
+    with engine.connect() as c:
+        rows = c.execute(sa.select(sa.func.count()).select_from(db.SpyLog)).scalar_one()
+        distinct = c.execute(sa.select(sa.func.count(sa.distinct(db.SpyLog.event_id)))).scalar_one()
+
+    print(f"workers={args.workers} kills={kills} seconds={dt:.2f} events/sec={rows / dt:.0f}")
+    print(f"sent={len(events)} stored={rows} distinct={distinct} "
+          f"lost={len(events) - distinct} duplicates={rows - distinct}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--dsn", default=None, help="по умолчанию — временный файл SQLite")
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--commit-delay", type=float, default=0.2)
+    parser.add_argument("--claim-idle-ms", type=int, default=2_000)
+    parser.add_argument("--kill-every", type=float, default=0.5)
+    parser.add_argument("--max-kills", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300)
+    run(parser.parse_args())
@@ -0,0 +1,85 @@
+"""Проверка «есть ли пользователь / зарегистрирован ли»: напрямую в Postgres vs UserStateCache.
+
+Идентификаторы запросов распределены по Zipf-подобному закону (активные
+пользователи заходят чаще). Нужны живые Postgres и Redis из переменных POSTGRE_* / REDIS_*
+(без них — bench:bench@localhost:5432/bench и localhost:6379); пользователи с id
+из диапазона бенчмарка создаются и удаляются.
+
+    python -m benchmarks.bench_user_cache --users 10000 -n 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import sqlalchemy as sa  # noqa: E402
+
+import database as db  # noqa: E402
+from benchmarks._common import report, require_postgres  # noqa: E402
+
+BASE_ID = 900_000_000
+
+
+def _zipf_ids(users: int, n: int) -> list[int]:
+    weights = [1 / (i + 1) for i in range(users)]
+    return [BASE_ID + i for i in random.choices(range(users), weights=weights, k=n)]
+
+
+async def _measure(title: str, lookup, ids: list[int], concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(user_id: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await lookup(user_id)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in ids))
+    report(title, latencies, time.perf_counter() - t0)
+
+
+async def run(args) -> None:
+    with db.SessionLocal() as session:
+        session.execute(sa.delete(db.UserHub).where(db.UserHub.id >= BASE_ID))
+        session.execute(
+            sa.insert(db.UserHub),
+            [{"id": BASE_ID + i, "name": f"bench{i}", "is_reg": i % 2 == 0} for i in range(args.users)],
+        )
+        session.commit()
+
+    ids = _zipf_ids(args.users, args.n)
+    cache = db.UserStateCache()
+    for i in range(args.users):
+        await cache.invalidate(BASE_ID + i)
+
+    try:
+        await _measure("postgres (asyncpg)", lambda uid: db.get_user_state_async(id=uid), ids, args.concurrency)
+        await _measure("cache, cold", cache.get, ids, args.concurrency)
+        await _measure("cache, warm", cache.get, ids, args.concurrency)
+        print(f"cache stats: {cache.stats()}")
+    finally:
+        for i in range(args.users):
+            await cache.invalidate(BASE_ID + i)
+        with db.SessionLocal() as session:
+            session.execute(sa.delete(db.UserHub).where(db.UserHub.id >= BASE_ID))
+            session.commit()
+        await db.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("-n", type=int, default=50_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    require_postgres()
+    asyncio.run(run(args))
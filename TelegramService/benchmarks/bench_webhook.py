@@ -0,0 +1,169 @@
+"""Нагрузка на webhook: синтетические Update JSON → ASGI-эндпоинт → хендлеры PTB.
+
+Telegram Bot API заменён заглушкой с задержкой --api-ms (getMe, sendMessage, ...),
+хендлер спит --handler-ms (имитация БД/Speaker) и отвечает в чат. Сравниваются
+последовательная обработка и PerChatUpdateProcessor; для каждого чата проверяется,
+что апдейты обработаны в порядке отправки. Задержка — от POST до конца хендлера.
+
+    python -m benchmarks.bench_webhook -n 5000 --chats 500 --handler-ms 50 --concurrency 1 64 256
+    python -m benchmarks.bench_webhook --url http://localhost:8443/telegram --secret ...   # живой сервер
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+from telegram.request import BaseRequest, RequestData
+
+from benchmarks._common import report
+from configs import CONFIG_WEBHOOK
+from update_processor import PerChatUpdateProcessor
+from webhook import SECRET_HEADER, build_asgi
+
+
+class FakeBotApi(BaseRequest):
+    """Ответы Bot API без сети: успешный результат нужной формы после `latency` секунд."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if api_method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif api_method in ("sendMessage", "editMessageText"):
+            await asyncio.sleep(self.latency)
+            result = {"message_id": 1, "date": int(time.time()), "text": params.get("text", ""),
+                      "chat": {"id": params.get("chat_id", 1), "type": "private"}}
+        else:
+            await asyncio.sleep(self.latency)
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def update_json(update_id: int, chat_id: int, seq: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+            "text": str(seq),
+        },
+    }
+
+
+async def run_once(args, concurrency: int) -> None:
+    sent_at: dict[int, float] = {}
+    latencies: list[float] = []
+    last_seq: dict[int, int] = defaultdict(lambda: -1)
+    violations = 0
+    done = asyncio.Event()
+
+    async def handler(update, context) -> None:
+        nonlocal violations
+        await asyncio.sleep(args.handler_ms / 1000)
+        await update.message.reply_text("ok")
+        chat_id, seq = update.effective_chat.id, int(update.message.text)
+        if seq < last_seq[chat_id]:
+            violations += 1
+        last_seq[chat_id] = seq
+        latencies.append(time.perf_counter() - sent_at[update.update_id])
+        if len(latencies) == args.n:
+            done.set()
+
+    api = FakeBotApi(args.api_ms / 1000)
+    builder = (
+        ApplicationBuilder()
+        .token("123456:bench")
+        .request(api)
+        .get_updates_request(api)
+        .update_queue(asyncio.Queue(maxsize=args.queue_size))
+    )
+    if concurrency > 1:
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(concurrency))
+    application = builder.build()
+    application.add_handler(MessageHandler(filters.TEXT, handler))
+
+    CONFIG_WEBHOOK.secret = args.secret
+    transport = httpx.ASGITransport(app=build_asgi(application))
+    sem = asyncio.Semaphore(args.connections)
+
+    async with application:
+        await application.start()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def post(update_id: int) -> None:
+                chat_id = update_id % args.chats + 1
+                body = update_json(update_id, chat_id, update_id // args.chats)
+                async with sem:
+                    sent_at[update_id] = time.perf_counter()
+                    r = await client.post(CONFIG_WEBHOOK.path, json=body, headers={SECRET_HEADER: args.secret})
+                    r.raise_for_status()
+
+            t0 = time.perf_counter()
+            # один отправитель на чат — как Telegram, который шлёт апдейты чата по порядку
+            await asyncio.gather(*(post(i) for i in range(args.n)))
+            await asyncio.wait_for(done.wait(), timeout=600)
+            total = time.perf_counter() - t0
+        await application.stop()
+
+    title = "sequential" if concurrency <= 1 else f"per-chat c={concurrency}"
+    report(title, latencies, total)
+    print(f"{'':<28} order violations={violations}")
+
+
+async def run_remote(args) -> None:
+    latencies: list[float] = []
+    limits = httpx.Limits(max_connections=args.connections)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def post(update_id: int) -> None:
+            chat_id = update_id % args.chats + 1
+            t0 = time.perf_counter()
+            r = await client.post(args.url, json=update_json(update_id, chat_id, update_id // args.chats),
+                                  headers={SECRET_HEADER: args.secret})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(args.n)))
+        report("webhook POST (accept)", latencies, time.perf_counter() - t0)
+
+
+async def run(args) -> None:
+    if args.url:
+        await run_remote(args)
+        return
+    for concurrency in args.concurrency:
+        await run_once(args, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--handler-ms", type=float, default=50)
+    parser.add_argument("--api-ms", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 64, 256])
+    parser.add_argument("--connections", type=int, default=40, help="как max_connections у Telegram")
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--secret", default="bench")
+    parser.add_argument("--url", default=None, help="POST на запущенный сервер вместо in-process")
+    asyncio.run(run(parser.parse_args()))
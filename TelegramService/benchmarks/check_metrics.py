@@ -0,0 +1,168 @@
+"""Проверка метрик бота и экспортёра буфера: синтетическая нагрузка, затем scrape по HTTP.
+
+Postgres и Redis не нужны: Redis подменяется на fakeredis, Postgres — на
+SQLite-файл с маленьким QueuePool, чтобы потоки ждали соединение; в середине
+нагрузки engine.dispose() пересоздаёт пул. Хендлеры — заглушки под
+tasks.log_event, один из них падает. Оба реестра (бот и metrics_exporter)
+отдаются через start_http_server и читаются urllib-ом. Код выхода 1, если
+какой-то ожидаемый ряд отсутствует или равен нулю.
+
+    python -m benchmarks.check_metrics -n 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# database/ создаёт engine-ы при импорте — даём заглушки, если окружение пустое
+for _k, _v in {"POSTGRE_USERNAME": "bench", "POSTGRE_PASSWORD": "bench", "POSTGRE_HOST": "localhost",
+               "POSTGRE_PORT": "5432", "POSTGRE_DB_NAME": "bench",
+               "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(_k, _v)
+
+import fakeredis  # noqa: E402
+import sqlalchemy as sa  # noqa: E402
+from prometheus_client import CollectorRegistry, REGISTRY, start_http_server  # noqa: E402
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+import metrics  # noqa: E402
+import tasks  # noqa: E402
+from benchmarks._common import fake_context, fake_update  # noqa: E402
+from event_codec import ENCODERS, encode_event, event_time  # noqa: E402
+from metrics_exporter import BufferCollector  # noqa: E402
+
+# (имя сэмпла, обязательные метки) — значение должно быть > 0
+EXPECTED = [
+    ("bot_handler_duration_seconds_count", {"event": "about_me", "outcome": "ok"}),
+    ("bot_handler_duration_seconds_count", {"event": "agree", "outcome": "error"}),
+    ("bot_db_pool_checkout_seconds_count", {"engine": "check"}),
+    ("bot_db_query_duration_seconds_count", {"engine": "check", "statement": "SELECT"}),
+    ("bot_db_query_duration_seconds_count", {"engine": "check", "statement": "INSERT"}),
+    ("bot_db_errors_total", {"engine": "check"}),
+    ("bot_log_events_total", {"result": "flushed"}),
+    ("bot_spylog_exporter_up", {}),
+    ("bot_spylog_buffer_length", {}),
+    ("bot_spylog_buffer_oldest_age_seconds", {}),
+    ("bot_spylog_last_flush_age_seconds", {}),
+]
+
+
+@tasks.log_event("about_me")
+async def ok_handler(update, context) -> None:
+    await asyncio.sleep(0.001)
+
+
+@tasks.log_event("agree")
+async def failing_handler(update, context) -> None:
+    raise RuntimeError("handler failed")
+
+
+async def handlers_workload(n: int) -> None:
+    tasks.redis_conn = fakeredis.FakeAsyncRedis()
+    await tasks.event_batcher.start()
+
+    async def one(i: int) -> None:
+        handler = failing_handler if i % 10 == 0 else ok_handler
+        try:
+            await handler(fake_update(i % 100 + 1, callback_data="about_me"), fake_context())
+        except RuntimeError:
+            pass
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    await tasks.event_batcher.stop()
+
+
+def checkout_count() -> float:
+    return REGISTRY.get_sample_value("bot_db_pool_checkout_seconds_count", {"engine": "check"}) or 0
+
+
+def db_workload(n: int, threads: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "check.sqlite")
+    engine = sa.create_engine(f"sqlite:///{path}", poolclass=QueuePool, pool_size=2, max_overflow=0)
+    metrics.instrument_engine(engine, "check")
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)"))
+
+    def one(i: int) -> None:
+        with engine.begin() as conn:
+            conn.execute(sa.text("INSERT INTO t (v) VALUES (:v)"), {"v": f"v{i}"})
+            conn.execute(sa.text("SELECT count(*) FROM t")).scalar()
+            time.sleep(0.001)  # держим соединение, чтобы остальные потоки ждали пул
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(n // 2)))
+    # dispose() подменяет пул — ожидание checkout должно считаться и на новом
+    engine.dispose()
+    before = checkout_count()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(n // 2, n)))
+    if checkout_count() == before:
+        raise SystemExit("checkout wait is not observed after engine.dispose()")
+    try:
+        with engine.connect() as conn:
+            conn.execute(sa.text("SELECT * FROM missing_table"))
+    except sa.exc.OperationalError:
+        pass
+
+
+def check_event_time() -> None:
+    ts_us = time.time_ns() // 1000
+    for codec in ENCODERS:
+        got = event_time(encode_event("start", 1, 1, ts_us, "/start", None, codec=codec))
+        if abs(got - ts_us / 1_000_000) > 1e-3:
+            raise SystemExit(f"event_time({codec}) = {got}, expected {ts_us / 1_000_000}")
+
+
+def exporter_registry() -> CollectorRegistry:
+    conn = fakeredis.FakeRedis()
+    key = "check_spylog_buffer"
+    ts_us = (time.time_ns() // 1000) - 30_000_000  # самое старое событие — 30 с назад
+    conn.rpush(key, *(encode_event("start", i, i, ts_us + i, "/start", None) for i in range(100)))
+    conn.set(f"{key}:last_flush", time.time() - 5)
+    registry = CollectorRegistry()
+    registry.register(BufferCollector(conn, key=key, mode="list", last_flush_key=f"{key}:last_flush"))
+    return registry
+
+
+def scrape(port: int) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as r:
+        return r.read().decode()
+
+
+def check(text: str) -> list[str]:
+    samples = [s for family in text_string_to_metric_families(text) for s in family.samples]
+    missing = []
+    for name, labels in EXPECTED:
+        total = sum(s.value for s in samples
+                    if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()))
+        status = "ok " if total > 0 else "MISSING"
+        print(f"{status:<8} {name}{labels} = {total:g}")
+        if total <= 0:
+            missing.append(name)
+    return missing
+
+
+def run(args) -> int:
+    asyncio.run(handlers_workload(args.n))
+    db_workload(args.n, args.threads)
+    check_event_time()
+    metrics.register_app_collectors()
+
+    start_http_server(args.port, "127.0.0.1", registry=REGISTRY)
+    start_http_server(args.port + 1, "127.0.0.1", registry=exporter_registry())
+    missing = check(scrape(args.port) + scrape(args.port + 1))
+    print("FAILED" if missing else "OK")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=9111)
+    sys.exit(run(parser.parse_args()))
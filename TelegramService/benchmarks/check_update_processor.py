@@ -0,0 +1,84 @@
+"""Проверка PerChatUpdateProcessor: «горячий» чат не задерживает остальные.
+
+В один чат сразу приходит --hot апдейтов (хендлер спит --handler-ms), следом —
+по одному апдейту из --chats других чатов. Апдейты подаются так же, как это
+делает Application: отдельная задача на каждый process_update. Проверяется:
+  * другие чаты обработаны, пока горячий ещё разбирает свою очередь;
+  * апдейты горячего чата выполнены в порядке прихода и не параллельно.
+Код выхода 1 при любом расхождении.
+
+    python -m benchmarks.check_update_processor --hot 200 --chats 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update
+
+from update_processor import PerChatUpdateProcessor
+
+HOT_CHAT = 1
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, text="hi"))
+
+
+async def run(args) -> int:
+    processor = PerChatUpdateProcessor(args.concurrency)
+    handler_s = args.handler_ms / 1000
+    hot_order: list[int] = []
+    hot_running = 0
+    hot_overlap = False
+    finished: dict[int, float] = {}
+
+    async def handle(update: Update) -> None:
+        nonlocal hot_running, hot_overlap
+        chat_id = update.effective_chat.id
+        if chat_id == HOT_CHAT:
+            hot_running += 1
+            hot_overlap |= hot_running > 1
+            hot_order.append(update.update_id)
+        await asyncio.sleep(handler_s)
+        if chat_id == HOT_CHAT:
+            hot_running -= 1
+        finished[update.update_id] = time.perf_counter()
+
+    updates = [make_update(i, HOT_CHAT) for i in range(args.hot)]
+    updates += [make_update(args.hot + i, 100 + i) for i in range(args.chats)]
+    t0 = time.perf_counter()
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(processor.process_update(update, handle(update))))
+        await asyncio.sleep(0)  # Application ставит задачи по одной, по мере выборки из очереди
+    await asyncio.gather(*tasks)
+
+    errors = []
+    hot_done = max(finished[u.update_id] for u in updates[:args.hot]) - t0
+    others_done = max(finished[u.update_id] for u in updates[args.hot:]) - t0
+    print(f"hot chat drained in {hot_done * 1000:.0f}ms, other chats done in {others_done * 1000:.0f}ms")
+    # остальные чаты не должны ждать очередь горячего: хватает пары «раундов» хендлера
+    if others_done > handler_s * (args.chats / args.concurrency + 3):
+        errors.append("other chats waited behind the hot chat")
+    if hot_order != list(range(args.hot)):
+        errors.append("hot chat updates ran out of order")
+    if hot_overlap:
+        errors.append("hot chat updates ran concurrently")
+    if processor.active_chats:
+        errors.append(f"{processor.active_chats} chat queues left after drain")
+    for error in errors:
+        print(f"FAILED   {error}")
+    print("FAILED" if errors else "OK")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hot", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--handler-ms", type=float, default=10)
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -7,10 +7,31 @@ class ConfigPostgre:
     host: str = os.getenv("POSTGRE_HOST", None)
     port: str = os.getenv("POSTGRE_PORT", None)
     db_name: str = os.getenv("POSTGRE_DB_NAME", None)
+    # "1" — хендлеры бота ходят в БД через asyncpg, "0" — через синхронный psycopg2
+    async_mode: bool = os.getenv("POSTGRE_ASYNC_MODE", "1") == "1"
+    # Повтор транзакций при serialization failure / deadlock (см. database.queries.db_write)
+    retry_attempts: int = int(os.getenv("POSTGRE_RETRY_ATTEMPTS", "5"))
+    retry_base_delay: float = float(os.getenv("POSTGRE_RETRY_BASE_DELAY", "0.02"))
+    # Пакетная запись итогов платных ответов (database/ledger.py)
+    ledger_batch_max_ops: int = int(os.getenv("POSTGRE_LEDGER_BATCH_MAX_OPS", "500"))
+    ledger_batch_max_delay_ms: int = int(os.getenv("POSTGRE_LEDGER_BATCH_MAX_DELAY_MS", "20"))
+    ledger_queue_size: int = int(os.getenv("POSTGRE_LEDGER_QUEUE_SIZE", "10000"))
+    ledger_retry_attempts: int = int(os.getenv("POSTGRE_LEDGER_RETRY_ATTEMPTS", "3"))
+    # Redis-список для операций, которые не записались и поодиночке
+    ledger_dead_letter_key: str = os.getenv("POSTGRE_LEDGER_DEAD_LETTER_KEY", "ledger_dead_letter")
+    # Стратегия записи spylog-буфера: copy | values | executemany (см. database/ingest.py)
+    spylog_ingest: str = os.getenv("POSTGRE_SPYLOG_INGEST", "copy")
+    # Секционирование spylog: month | day, сколько секций держать наперёд и сколько дней хранить
+    spylog_partition: str = os.getenv("POSTGRE_SPYLOG_PARTITION", "month")
+    spylog_partitions_ahead: int = int(os.getenv("POSTGRE_SPYLOG_PARTITIONS_AHEAD", "3"))
+    spylog_retention_days: int = int(os.getenv("POSTGRE_SPYLOG_RETENTION_DAYS", "180"))
 
     def __call__(self):
         return f"postgresql+psycopg2://{self.username}:{self.password}@{self.host}:{self.port}/{self.db_name}"
 
+    def async_url(self):
+        return f"postgresql+asyncpg://{self.username}:{self.password}@{self.host}:{self.port}/{self.db_name}"
+
 
 CONFIG_POSTGRE = ConfigPostgre()
 
@@ -20,6 +41,36 @@ class ConfigRedis:
     port: str = os.getenv("REDIS_PORT", None)
     num_buffer: str = os.getenv("REDIS_NUM_BUFFER", "0")
     buffer_key: str = os.getenv("REDIS_BUFFER_KEY", "spylog_buffer")
+    max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+    # Как часто Celery beat запускает слив буфера в spylog (секунды) и размер пачки
+    flush_interval: float = float(os.getenv("REDIS_FLUSH_INTERVAL", "5"))
+    flush_batch_size: int = int(os.getenv("REDIS_FLUSH_BATCH_SIZE", "5000"))
+    # Тип буфера spylog: list (RPUSH/LPOP) или stream (XADD/XREADGROUP/XACK)
+    buffer_mode: str = os.getenv("REDIS_BUFFER_MODE", "list")
+    # Формат записей в буфере: struct | msgpack | json (см. event_codec.py)
+    event_codec: str = os.getenv("REDIS_EVENT_CODEC", "struct")
+    stream_maxlen: int = int(os.getenv("REDIS_STREAM_MAXLEN", "1000000"))
+    stream_group: str = os.getenv("REDIS_STREAM_GROUP", "spylog_flushers")
+    # Через сколько мс «зависшая» у упавшего воркера запись переходит другому (XAUTOCLAIM)
+    stream_claim_idle_ms: int = int(os.getenv("REDIS_STREAM_CLAIM_IDLE_MS", "60000"))
+    # После стольких доставок запись уходит в стрим `{buffer_key}:dead` (не блокирует слив)
+    stream_max_deliveries: int = int(os.getenv("REDIS_STREAM_MAX_DELIVERIES", "5"))
+    # In-process батчинг log_event (см. tasks.EventBatcher)
+    batch_enabled: bool = os.getenv("REDIS_BATCH_ENABLED", "1") == "1"
+    batch_max_events: int = int(os.getenv("REDIS_BATCH_MAX_EVENTS", "500"))
+    batch_max_delay_ms: int = int(os.getenv("REDIS_BATCH_MAX_DELAY_MS", "50"))
+    batch_queue_size: int = int(os.getenv("REDIS_BATCH_QUEUE_SIZE", "10000"))
+    batch_overflow: str = os.getenv("REDIS_BATCH_OVERFLOW", "drop")  # drop | block
+    # Кэш состояния пользователей (database/user_cache.py): локальный LRU + Redis
+    user_cache_size: int = int(os.getenv("REDIS_USER_CACHE_SIZE", "100000"))
+    user_cache_local_ttl: float = float(os.getenv("REDIS_USER_CACHE_LOCAL_TTL", "30"))
+    user_cache_ttl: int = int(os.getenv("REDIS_USER_CACHE_TTL", "86400"))
+    user_cache_negative_ttl: int = int(os.getenv("REDIS_USER_CACHE_NEGATIVE_TTL", "10"))
+    # user_data/chat_data бота в Redis (persistence.py); "0" — только в памяти процесса
+    state_enabled: bool = os.getenv("REDIS_STATE_ENABLED", "1") == "1"
+    state_prefix: str = os.getenv("REDIS_STATE_PREFIX", "botstate")
+    state_ttl: int = int(os.getenv("REDIS_STATE_TTL", str(30 * 86400)))
+    state_update_interval: float = float(os.getenv("REDIS_STATE_UPDATE_INTERVAL", "1"))
 
     def __call__(self):
         return f"redis://{self.host}:{self.port}/{self.num_buffer}"
@@ -30,6 +81,39 @@ CONFIG_REDIS = ConfigRedis()
 
 class ConfigBot:
     token: str = os.getenv("BOT_TOKEN")
+    # polling — для разработки, webhook — боевой режим (webhook.py)
+    mode: str = os.getenv("BOT_MODE", "polling")
+    # Сколько апдейтов обрабатывается одновременно (update_processor.py); 1 — по одному
+    concurrent_updates: int = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+    # Очередь апдейтов между приёмом (polling/webhook) и обработкой
+    update_queue_size: int = int(os.getenv("BOT_UPDATE_QUEUE_SIZE", "1000"))
 
 
 CONFIG_BOT = ConfigBot()
+
+
+class ConfigWebhook:
+    # Публичный адрес, который регистрируется в Telegram; пусто — setWebhook не вызывается
+    url: str = os.getenv("BOT_WEBHOOK_URL", None)
+    path: str = os.getenv("BOT_WEBHOOK_PATH", "/telegram")
+    secret: str = os.getenv("BOT_WEBHOOK_SECRET", None)
+    listen: str = os.getenv("BOT_WEBHOOK_LISTEN", "0.0.0.0")
+    port: int = int(os.getenv("BOT_WEBHOOK_PORT", "8443"))
+    # Сколько одновременных HTTPS-соединений держит Telegram (1-100)
+    max_connections: int = int(os.getenv("BOT_WEBHOOK_MAX_CONNECTIONS", "40"))
+    keep_alive: int = int(os.getenv("BOT_WEBHOOK_KEEP_ALIVE", "75"))
+    drop_pending_updates: bool = os.getenv("BOT_WEBHOOK_DROP_PENDING", "0") == "1"
+
+
+CONFIG_WEBHOOK = ConfigWebhook()
+
+
+class ConfigMetrics:
+    # /metrics процесса бота (metrics.py); 0 — не поднимать
+    port: int = int(os.getenv("BOT_METRICS_PORT", "9101"))
+    # Отдельный экспортёр spylog-буфера (metrics_exporter.py)
+    exporter_port: int = int(os.getenv("METRICS_EXPORTER_PORT", "9102"))
+    listen: str = os.getenv("METRICS_LISTEN", "0.0.0.0")
+
+
+CONFIG_METRICS = ConfigMetrics()
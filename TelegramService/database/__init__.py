@@ -1,4 +1,4 @@
-from .database import Base, engine, SessionLocal
+from .database import Base, engine, SessionLocal, async_engine, AsyncSessionLocal
 from .models import (
     UserHub,
     Transaction,
@@ -9,4 +9,13 @@ from .models import (
 from .queries import (
     new_user,
     user_reg,
+    get_user_state,
+    get_user_state_async,
+    balance_history,
+    active_tasks_due,
+    referral_count,
+    new_user_async,
+    user_reg_async,
 )
+from .user_cache import UserState, UserStateCache, user_cache
+from .ledger import InsufficientFunds, Reservation, reserve, ledger_writer
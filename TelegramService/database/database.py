@@ -1,10 +1,12 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import scoped_session, sessionmaker, DeclarativeBase
 from configs import CONFIG_POSTGRE
 
 
 DATABASE_URL = CONFIG_POSTGRE()
+ASYNC_DATABASE_URL = CONFIG_POSTGRE.async_url()
 
 
 engine = create_engine(
@@ -19,6 +21,20 @@ SessionLocal = scoped_session(
     sessionmaker(bind=engine, autocommit=False, autoflush=False)
 )
 
+# Асинхронный путь (asyncpg) — для хендлеров бота, чтобы не блокировать event loop.
+# Синхронный engine выше остаётся для Celery-воркеров.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20,
+    echo=False,
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 class Base(DeclarativeBase):
     pass
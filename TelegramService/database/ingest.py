@@ -0,0 +1,206 @@
+"""Стратегии записи пачки событий из spylog-буфера в Postgres.
+
+Каждая стратегия принимает открытую сессию, сырые записи буфера из Redis
+(любой формат из `event_codec`) и (для stream-буфера) их id в Redis Stream;
+возвращает число вставленных строк:
+
+* ``executemany`` — ``insert(SpyLog)`` со списком dict-ов (executemany в psycopg2);
+* ``values``      — многострочный ``INSERT ... VALUES`` (``execute_values`` в psycopg2);
+* ``copy``        — ``COPY spylog (user_id, action, ts) FROM STDIN``, только Postgres.
+
+``values`` и ``copy`` не собирают промежуточные dict-ы: для json-записей поле
+``action`` пишется исходной строкой из буфера, ``ts`` — исходной ISO-строкой.
+
+Если переданы id записей стрима, вставка идёт с ``ON CONFLICT DO NOTHING`` по
+уникальному индексу ``(event_id, ts)``: повторно доставленная запись, которую
+уже закоммитил другой воркер (даже если он ещё не успел сделать XACK), не
+вставляется второй раз. ``copy`` для этого пишет во временную таблицу и
+переносит строки в spylog одним ``INSERT ... SELECT ... ON CONFLICT``.
+Возвращается число реально вставленных строк.
+"""
+import io
+from datetime import datetime
+from typing import Callable, Iterator, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from event_codec import decode_event, decode_row
+from log_handle import log
+from .models import SpyLog
+
+# Облегчённая таблица без типов колонок: значения уходят в драйвер как есть,
+# без повторной JSON-сериализации action.
+_spylog_raw = sa.table(
+    "spylog", sa.column("user_id"), sa.column("action"), sa.column("ts"), sa.column("event_id")
+)
+
+# Сколько строк класть в один INSERT ... VALUES (ограничение SQLite на число параметров)
+_VALUES_PAGE_SIZE = 1000
+
+_COPY_SQL = "COPY spylog (user_id, action, ts, event_id) FROM STDIN"
+
+_STAGE_SQL = (
+    "CREATE TEMP TABLE IF NOT EXISTS spylog_stage "
+    "(user_id INT, action JSONB, ts TIMESTAMPTZ, event_id TEXT) ON COMMIT DELETE ROWS"
+)
+_STAGE_COPY_SQL = "COPY spylog_stage (user_id, action, ts, event_id) FROM STDIN"
+_STAGE_MOVE_SQL = (
+    "INSERT INTO spylog (user_id, action, ts, event_id) "
+    "SELECT user_id, action, ts, event_id FROM spylog_stage ON CONFLICT DO NOTHING"
+)
+
+
+def _with_ids(raw_records: list, event_ids: Optional[Sequence[str]]):
+    if event_ids is None:
+        return ((raw, None) for raw in raw_records)
+    return zip(raw_records, event_ids)
+
+
+def _decode_rows(raw_records: list, event_ids: Optional[Sequence[str]] = None) -> list[dict]:
+    """Записи буфера → dict-ы, готовые к insert(SpyLog)."""
+    rows = []
+    for raw, event_id in _with_ids(raw_records, event_ids):
+        try:
+            doc = decode_event(raw)
+            if doc.get("user_id") is None:
+                continue  # пропуск анонимов / системных событий
+            rows.append(
+                {
+                    "user_id": int(doc["user_id"]),
+                    "action": doc,  # хранится как JSONB
+                    "ts": datetime.fromisoformat(doc["iso_ts"]),
+                    "event_id": event_id,
+                }
+            )
+        except Exception as exc:  # noqa: BLE001
+            log.warning(f"[WARN] corrupt log entry dropped: {exc}: {raw!r}")
+    return rows
+
+
+def _iter_raw_rows(raw_records: list,
+                   event_ids: Optional[Sequence[str]] = None) -> Iterator[tuple[int, str, str, Optional[str]]]:
+    """Записи буфера → кортежи (user_id, action json, iso_ts, event_id)."""
+    for raw, event_id in _with_ids(raw_records, event_ids):
+        try:
+            user_id, action, iso_ts = decode_row(raw)
+            if user_id is None:
+                continue  # пропуск анонимов / системных событий
+            yield user_id, action, iso_ts, event_id
+        except Exception as exc:  # noqa: BLE001
+            log.warning(f"[WARN] corrupt log entry dropped: {exc}: {raw!r}")
+
+
+def _copy_escape(value: str) -> str:
+    """Экранирование для текстового формата COPY."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def _insert_ignore(session: Session, table):
+    """INSERT ... ON CONFLICT DO NOTHING для текущего диалекта."""
+    if _is_postgres(session):
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
+
+
+# -------- стратегии -------------------------------------------------
+
+def write_executemany(session: Session, raw_records: list,
+                      event_ids: Optional[Sequence[str]] = None) -> int:
+    rows = _decode_rows(raw_records, event_ids)
+    if not rows:
+        return 0
+    if event_ids is not None:
+        stmt = _insert_ignore(session, SpyLog).returning(SpyLog.id)
+        return len(session.execute(stmt, rows).all())
+    session.execute(sa.insert(SpyLog), rows)
+    return len(rows)
+
+
+def write_values(session: Session, raw_records: list,
+                 event_ids: Optional[Sequence[str]] = None) -> int:
+    rows = list(_iter_raw_rows(raw_records, event_ids))
+    if not rows:
+        return 0
+
+    if _is_postgres(session):
+        from psycopg2.extras import execute_values
+
+        sql = "INSERT INTO spylog (user_id, action, ts, event_id) VALUES %s"
+        if event_ids is not None:
+            sql += " ON CONFLICT DO NOTHING RETURNING 1"
+        cursor = session.connection().connection.cursor()
+        try:
+            inserted = execute_values(
+                cursor, sql, rows, page_size=_VALUES_PAGE_SIZE, fetch=event_ids is not None,
+            )
+        finally:
+            cursor.close()
+        return len(inserted) if event_ids is not None else len(rows)
+
+    insert = _insert_ignore(session, _spylog_raw) if event_ids is not None else sa.insert(_spylog_raw)
+    inserted = 0
+    for i in range(0, len(rows), _VALUES_PAGE_SIZE):
+        page = rows[i:i + _VALUES_PAGE_SIZE]
+        result = session.execute(
+            insert.values([{"user_id": u, "action": a, "ts": t, "event_id": e} for u, a, t, e in page])
+        )
+        inserted += result.rowcount
+    return inserted
+
+
+def write_copy(session: Session, raw_records: list,
+               event_ids: Optional[Sequence[str]] = None) -> int:
+    if not _is_postgres(session):
+        # COPY есть только у Postgres — тестовые бэкенды идут через VALUES
+        return write_values(session, raw_records, event_ids)
+
+    buf = io.StringIO()
+    n = 0
+    for user_id, raw, iso_ts, event_id in _iter_raw_rows(raw_records, event_ids):
+        event_col = "\\N" if event_id is None else event_id
+        buf.write(f"{user_id}\t{_copy_escape(raw)}\t{_copy_escape(iso_ts)}\t{event_col}\n")
+        n += 1
+    if not n:
+        return 0
+
+    buf.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        if event_ids is None:
+            cursor.copy_expert(_COPY_SQL, buf)
+            return n
+        # COPY не умеет ON CONFLICT — через временную таблицу (очищается на commit)
+        cursor.execute(_STAGE_SQL)
+        cursor.copy_expert(_STAGE_COPY_SQL, buf)
+        cursor.execute(_STAGE_MOVE_SQL)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+Writer = Callable[..., int]
+
+WRITERS: dict[str, Writer] = {
+    "executemany": write_executemany,
+    "values": write_values,
+    "copy": write_copy,
+}
+
+
+def get_writer(mode: str) -> Writer:
+    try:
+        return WRITERS[mode]
+    except KeyError:
+        raise ValueError(f"unknown spylog ingest mode: {mode!r}, expected one of {sorted(WRITERS)}") from None
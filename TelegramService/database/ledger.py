@@ -0,0 +1,296 @@
+"""Баланс пользователей: резерв стоимости ответа, списание и возврат.
+
+Поток для платного ответа:
+  1. ``reserve`` — при нажатии «✅ Да»: атомарно списывает стоимость одним
+     ``UPDATE userhub SET balance = balance - :c WHERE id = :id AND balance >= :c
+     RETURNING balance`` и пишет Transaction. Недостаточно средств → InsufficientFunds.
+  2. после инференса — ``ledger_writer.charge(...)`` (ответ выдан, пишем PFunc)
+     или ``ledger_writer.refund(...)`` (ошибка ИИ, возвращаем деньги).
+
+Хендлеры TelegramService пока не вызывают этот поток: кнопка «✅ Да» есть только
+в TelegramServiceTest, у которого нет доступа к этой БД. main.py лишь запускает и
+останавливает `ledger_writer`; вызовы подключаются вместе с платным сценарием.
+
+Резерв выполняется сразу — пользователь ждёт его результата. Записи после
+инференса никто не ждёт, поэтому `LedgerWriter` копит их и пишет пачкой в одной
+транзакции: PFunc — одним executemany, возвраты — одним UPDATE по всем
+пользователям пачки (суммы по одному пользователю складываются).
+
+Возврат идемпотентен: Transaction возврата ссылается на списание
+(refund_of, уникальный индекс) и вставляется с ON CONFLICT DO NOTHING,
+а баланс пополняется только на вставленные строки. Повторный refund() той
+же резервации или повтор пачки после неоднозначной ошибки commit деньги
+второй раз не начисляют.
+
+Пачка, не записавшаяся за `ledger_retry_attempts` попыток, повторяется по одной
+операции, чтобы одна плохая операция (например, нарушение FK в PFunc) не держала
+остальные. Операции, упавшие и поодиночке, уходят в Redis-список
+`ledger_dead_letter_key` (json) для ручного разбора — не теряются молча.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import tasks
+from configs import CONFIG_POSTGRE
+from log_handle import log
+from .models import PFunc, Transaction, UserHub
+from .queries import _get_async_session, async_db_write
+from .user_cache import user_cache
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Reservation:
+    id: int  # transactions.id списания
+    user_id: int
+    cost: int
+    balance: int  # баланс после списания
+
+
+_DEBIT_STMT = (
+    sa.update(UserHub)
+    .where(UserHub.id == sa.bindparam("user_id"), UserHub.balance >= sa.bindparam("cost"))
+    .values(balance=UserHub.balance - sa.bindparam("cost"))
+    .returning(UserHub.balance)
+)
+
+_BULK_CREDIT_SQL = sa.text(
+    "UPDATE userhub AS u SET balance = u.balance + v.delta "
+    "FROM unnest(CAST(:ids AS int[]), CAST(:deltas AS int[])) AS v(id, delta) "
+    "WHERE u.id = v.id"
+)
+
+
+@async_db_write()
+async def _reserve(session, user_id: int, cost: int, action: str) -> Reservation:
+    balance = (await session.execute(_DEBIT_STMT, {"user_id": user_id, "cost": cost})).scalar()
+    if balance is None:
+        raise InsufficientFunds(f"UserHub(id={user_id}) has not enough balance for {cost}")
+    tx_id = (
+        await session.execute(
+            sa.insert(Transaction)
+            .values(price=cost, action=action, user_id=user_id)
+            .returning(Transaction.id)
+        )
+    ).scalar_one()
+    log.info(f"UPDATE POSTGRESQL UserHub --- id: {user_id}, balance -= {cost} -> {balance}")
+    return Reservation(id=tx_id, user_id=user_id, cost=cost, balance=balance)
+
+
+async def reserve(user_id: int, cost: int, action: str = "answer") -> Reservation:
+    """Списывает `cost` с баланса. InsufficientFunds, если денег не хватает."""
+    reservation = await _reserve(user_id=user_id, cost=cost, action=action)
+    await user_cache.invalidate(user_id)
+    return reservation
+
+
+class LedgerWriter:
+    """Пакетная запись итогов платных ответов (PFunc) и возвратов."""
+
+    def __init__(
+        self,
+        max_ops: int = CONFIG_POSTGRE.ledger_batch_max_ops,
+        max_delay_ms: int = CONFIG_POSTGRE.ledger_batch_max_delay_ms,
+        queue_size: int = CONFIG_POSTGRE.ledger_queue_size,
+        retry_attempts: int = CONFIG_POSTGRE.ledger_retry_attempts,
+        dead_letter_key: str = CONFIG_POSTGRE.ledger_dead_letter_key,
+        conn=None,
+    ):
+        self.max_ops = max_ops
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self.retry_attempts = retry_attempts
+        self.dead_letter_key = dead_letter_key
+        self.conn = conn
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        # счётчики
+        self.charges = 0
+        self.refunds = 0
+        self.duplicate_refunds = 0
+        self.batches = 0
+        self.flush_errors = 0
+        self.dead_lettered = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "charges": self.charges,
+            "refunds": self.refunds,
+            "duplicate_refunds": self.duplicate_refunds,
+            "batches": self.batches,
+            "flush_errors": self.flush_errors,
+            "dead_lettered": self.dead_lettered,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run(), name="ledger-writer")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._closing = True
+        await self._task
+        self._task = None
+        log.info(f"ledger writer stopped --- {self.stats()}")
+
+    async def charge(self, reservation: Reservation, message: str, answer: str,
+                     cls: Optional[str] = None, position: Optional[str] = None) -> None:
+        """Ответ выдан: фиксируем PFunc, привязанный к транзакции списания."""
+        op = ("charge", {
+            "message": message,
+            "cls": cls,
+            "answer": answer,
+            "position": position,
+            "user_id": reservation.user_id,
+            "pay_id": reservation.id,
+        })
+        await self._submit(op)
+
+    async def refund(self, reservation: Reservation, action: str = "refund") -> None:
+        """Инференс не удался: возвращаем стоимость на баланс."""
+        await self._submit(("refund", (reservation, action)))
+
+    async def _submit(self, op: tuple) -> None:
+        if self.running:
+            # Очередь полна — ждём место: деньги нельзя отбрасывать, как события log_event
+            await self._queue.put(op)
+        else:
+            await self._flush([op])
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), self.max_delay)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_ops:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, ops: list) -> list[int]:
+        """Одна транзакция на пачку. Возвращает id пользователей с изменённым балансом."""
+        pfunc_rows = [payload for kind, payload in ops if kind == "charge"]
+        refunds = [payload for kind, payload in ops if kind == "refund"]
+
+        credits: dict[int, int] = defaultdict(int)
+        refunded = 0
+        async with _get_async_session("READ COMMITTED") as session:
+            try:
+                if pfunc_rows:
+                    await session.execute(sa.insert(PFunc), pfunc_rows)
+                if refunds:
+                    # уже возвращённые списания (и дубли внутри пачки) пропускаются
+                    inserted = await session.execute(
+                        pg_insert(Transaction)
+                        .values([
+                            {"price": -reservation.cost, "action": action,
+                             "user_id": reservation.user_id, "refund_of": reservation.id}
+                            for reservation, action in refunds
+                        ])
+                        .on_conflict_do_nothing(index_elements=["refund_of"])
+                        .returning(Transaction.user_id, Transaction.price)
+                    )
+                    for user_id, price in inserted:
+                        credits[user_id] -= price
+                        refunded += 1
+                    if credits:
+                        await session.execute(
+                            _BULK_CREDIT_SQL,
+                            {"ids": list(credits), "deltas": list(credits.values())},
+                        )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+        self.charges += len(pfunc_rows)
+        self.refunds += refunded
+        self.duplicate_refunds += len(refunds) - refunded
+        self.batches += 1
+        return list(credits)
+
+    async def _write_with_retry(self, ops: list) -> list[int]:
+        delay = 0.1
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                return await self._write(ops)
+            except Exception as exc:  # noqa: BLE001
+                self.flush_errors += 1
+                if attempt == self.retry_attempts:
+                    raise
+                log.warning(f"[WARN] ledger batch of {len(ops)} ops failed, retry in {delay:.1f}s: {exc}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def _flush(self, ops: list) -> None:
+        """Пишет пачку; при неудаче — по одной операции, оставшиеся — в dead letter."""
+        try:
+            credited = await self._write_with_retry(ops)
+        except Exception as exc:  # noqa: BLE001
+            if len(ops) == 1:
+                await self._dead_letter(ops[0], exc)
+                return
+            log.error(f"[ERROR] ledger batch of {len(ops)} ops failed, writing one by one: {exc}")
+            credited = []
+            for op in ops:
+                try:
+                    credited += await self._write_with_retry([op])
+                except Exception as op_exc:  # noqa: BLE001
+                    await self._dead_letter(op, op_exc)
+
+        for user_id in set(credited):
+            await user_cache.invalidate(user_id)
+
+    async def _dead_letter(self, op: tuple, exc: Exception) -> None:
+        kind, payload = op
+        if kind == "refund":
+            reservation, action = payload
+            payload = {"reservation": asdict(reservation), "action": action}
+        record = json.dumps({"kind": kind, "payload": payload, "error": repr(exc)}, ensure_ascii=False)
+        self.dead_lettered += 1
+        try:
+            await (self.conn or tasks.redis_conn).rpush(self.dead_letter_key, record)
+            log.error(f"[ERROR] ledger op moved to {self.dead_letter_key}: {record}")
+        except Exception as redis_exc:  # noqa: BLE001
+            # Последний рубеж — запись целиком в лог, чтобы её можно было восстановить
+            log.critical(f"[CRITICAL] ledger op lost (dead letter unavailable: {redis_exc}): {record}")
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+
+ledger_writer = LedgerWriter()
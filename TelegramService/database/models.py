@@ -2,14 +2,18 @@ import datetime as dt
 from typing import Optional, List
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     ForeignKey,
+    Index,
     Integer,
     Text,
     TIMESTAMP,
     JSON,
     func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -18,12 +22,17 @@ from .database import Base
 class UserHub(Base):
     __tablename__ = "userhub"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    __table_args__ = (
+        Index("ix_userhub_refferer_id", "refferer_id"),
+    )
+
+    # id = Telegram user id, задаётся явно
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
     name: Mapped[Optional[str]] = mapped_column(Text)
     tstart: Mapped[dt.datetime] = mapped_column(
         TIMESTAMP(timezone=True), server_default=func.now()
     )
-    balance: Mapped[Optional[int]] = mapped_column(
+    balance: Mapped[int] = mapped_column(
         Integer, server_default="0", nullable=False
     )
     is_reg: Mapped[bool] = mapped_column(
@@ -32,7 +41,7 @@ class UserHub(Base):
 
     # self-reference
     refferer_id: Mapped[Optional[int]] = mapped_column(
-        Integer, ForeignKey("userhub.id", ondelete="SET NULL")
+        Integer, ForeignKey("userhub.id", name="fk_userhub_refferer", ondelete="SET NULL")
     )
     referrals: Mapped[List["UserHub"]] = relationship(
         back_populates="refferer", remote_side="UserHub.id"
@@ -48,6 +57,11 @@ class UserHub(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_ts", "user_id", "ts"),
+        # не больше одного возврата на списание (database/ledger.py)
+        Index("ux_transactions_refund_of", "refund_of", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     price: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -57,9 +71,13 @@ class Transaction(Base):
     )
 
     user_id: Mapped[Optional[int]] = mapped_column(
-        Integer, ForeignKey("userhub.id")
+        Integer, ForeignKey("userhub.id", name="fk_transactions_user")
     )
     user: Mapped[Optional[UserHub]] = relationship(back_populates="transactions")
+    # для возврата — id транзакции списания, которую он отменяет
+    refund_of: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("transactions.id", name="fk_transactions_refund_of")
+    )
 
 
 class PFunc(Base):
@@ -76,10 +94,10 @@ class PFunc(Base):
 
     # FK
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("userhub.id"), nullable=False
+        Integer, ForeignKey("userhub.id", name="fk_pfunc_user"), nullable=False, index=True
     )
     pay_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("transactions.id"), nullable=False
+        Integer, ForeignKey("transactions.id", name="fk_pfunc_payment"), nullable=False, index=True
     )
 
     user: Mapped[UserHub] = relationship(back_populates="pfuncs")
@@ -88,6 +106,10 @@ class PFunc(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # «активные задания к исполнению» — только по активным строкам
+        Index("ix_tasks_active_date", "date", postgresql_where=text("is_active")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ts: Mapped[dt.datetime] = mapped_column(
@@ -98,29 +120,44 @@ class Task(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, nullable=False)
 
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("userhub.id"), nullable=False
+        Integer, ForeignKey("userhub.id", name="fk_tasks_user"), nullable=False, index=True
     )
     user: Mapped[UserHub] = relationship(back_populates="tasks")
 
 
 class SpyLog(Base):
     """
-    Обновлённая версия spylog:
-      id       SERIAL PRIMARY KEY
+    Секционированная по ts версия spylog (PARTITION BY RANGE (ts)):
+      id       BIGSERIAL, PRIMARY KEY (id, ts)
       user_id  INT NOT NULL (FK → userhub)
-      action   JSON/Text
-      ts       TIMESTAMP NOT NULL
+      action   JSONB
+      ts       TIMESTAMPTZ NOT NULL — ключ секционирования
+      event_id TEXT NULL — id записи в Redis Stream (для дедупликации при повторной доставке)
+
+    Секции создаёт/удаляет `database.partitions`.
     """
 
     __tablename__ = "spylog"
+    __table_args__ = (
+        Index("ix_spylog_ts_brin", "ts", postgresql_using="brin"),
+        Index("ix_spylog_user_ts", "user_id", "ts"),
+        # Уникальность повторно доставленных записей stream-буфера; ts — ключ
+        # секционирования, без него UNIQUE на секционированной таблице невозможен.
+        # NULL (list-буфер) не конфликтуют.
+        Index("ix_spylog_event_id", "event_id", "ts", unique=True),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("userhub.id"), nullable=False
+        Integer, ForeignKey("userhub.id", name="fk_spylog_user"), nullable=False
+    )
+    action: Mapped[dict] = mapped_column(
+        JSON().with_variant(JSONB, "postgresql"), nullable=False
     )
-    action: Mapped[dict] = mapped_column(JSON, nullable=False)
     ts: Mapped[dt.datetime] = mapped_column(
-        TIMESTAMP(timezone=True), default=func.now(), nullable=False
+        TIMESTAMP(timezone=True), primary_key=True, default=func.now(), nullable=False
     )
+    event_id: Mapped[Optional[str]] = mapped_column(Text)
 
     user: Mapped[UserHub] = relationship(back_populates="spylogs")
@@ -0,0 +1,188 @@
+"""Обслуживание секций spylog.
+
+spylog секционирована по ts (PARTITION BY RANGE), секции называются
+``spylog_pYYYYMM`` (month) или ``spylog_pYYYYMMDD`` (day), границы — по UTC. Два Celery-таска
+по расписанию beat:
+
+* ``spylog.ensure_partitions``   — заранее создаёт секции на N периодов вперёд,
+  чтобы вставки не попадали в ``spylog_default``;
+* ``spylog.drop_old_partitions`` — удаляет секции целиком старше срока хранения
+  (DROP TABLE вместо DELETE: без bloat и долгих блокировок).
+
+Каждая секция создаётся в своей транзакции: ошибка одного периода не отменяет
+остальные. Если beat пропустил запуск и строки периода уже легли в
+``spylog_default``, Postgres не даст создать секцию поверх них — тогда default
+отсоединяется, секция создаётся, строки переносятся в неё, default
+присоединяется обратно.
+"""
+import datetime as dt
+import re
+
+import sqlalchemy as sa
+
+from configs import CONFIG_POSTGRE
+from log_handle import log
+from tasks import celery_app
+from .database import engine
+
+_NAME_RE = re.compile(r"^spylog_p(\d{6}|\d{8})$")
+_DEFAULT = "spylog_default"
+_COLUMNS = "id, user_id, action, ts, event_id"
+
+
+def _utc_today() -> dt.date:
+    # Границы секций — по UTC, локальная дата сервера может отличаться
+    return dt.datetime.now(dt.timezone.utc).date()
+
+
+def _period_start(day: dt.date, granularity: str) -> dt.date:
+    return day if granularity == "day" else day.replace(day=1)
+
+
+def _next_period(start: dt.date, granularity: str) -> dt.date:
+    if granularity == "day":
+        return start + dt.timedelta(days=1)
+    return (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(start: dt.date, granularity: str) -> str:
+    return f"spylog_p{start:%Y%m%d}" if granularity == "day" else f"spylog_p{start:%Y%m}"
+
+
+def _partition_upper_bound(name: str) -> dt.date | None:
+    """Верхняя граница секции по её имени; None для чужих/служебных секций."""
+    m = _NAME_RE.match(name)
+    if not m:
+        return None
+    digits = m.group(1)
+    if len(digits) == 8:
+        return _next_period(dt.datetime.strptime(digits, "%Y%m%d").date(), "day")
+    return _next_period(dt.datetime.strptime(digits, "%Y%m").date(), "month")
+
+
+def _existing_partitions(conn) -> list[str]:
+    return list(
+        conn.execute(
+            sa.text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'spylog'::regclass"
+            )
+        ).scalars()
+    )
+
+
+def _bounds(start: dt.date, end: dt.date) -> tuple[str, str]:
+    return f"{start.isoformat()} 00:00:00+00", f"{end.isoformat()} 00:00:00+00"
+
+
+def _create_partition(conn, name: str, start: dt.date, end: dt.date, has_default: bool) -> int:
+    """Создаёт секцию [start, end). Returns: сколько строк перенесено из spylog_default."""
+    lower, upper = _bounds(start, end)
+    create = sa.text(
+        f'CREATE TABLE "{name}" PARTITION OF spylog '
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    )
+    stray = has_default and conn.execute(
+        sa.text(f"SELECT EXISTS (SELECT 1 FROM {_DEFAULT} WHERE ts >= :lower AND ts < :upper)"),
+        {"lower": lower, "upper": upper},
+    ).scalar()
+    if not stray:
+        conn.execute(create)
+        return 0
+
+    conn.execute(sa.text(f"ALTER TABLE spylog DETACH PARTITION {_DEFAULT}"))
+    conn.execute(create)
+    moved = conn.execute(
+        sa.text(
+            f"WITH moved AS (DELETE FROM {_DEFAULT} WHERE ts >= :lower AND ts < :upper "
+            f"RETURNING {_COLUMNS}) "
+            f'INSERT INTO "{name}" ({_COLUMNS}) SELECT {_COLUMNS} FROM moved'
+        ),
+        {"lower": lower, "upper": upper},
+    ).rowcount
+    conn.execute(sa.text(f"ALTER TABLE spylog ATTACH PARTITION {_DEFAULT} DEFAULT"))
+    return moved
+
+
+def ensure_spylog_partitions(bind=None, ahead: int | None = None,
+                             granularity: str | None = None, today: dt.date | None = None) -> list[str]:
+    """Создаёт секции с текущего периода на `ahead` периодов вперёд.
+
+    Returns:
+        Имена созданных секций.
+    """
+    bind = bind or engine
+    ahead = CONFIG_POSTGRE.spylog_partitions_ahead if ahead is None else ahead
+    granularity = granularity or CONFIG_POSTGRE.spylog_partition
+    start = _period_start(today or _utc_today(), granularity)
+
+    with bind.connect() as conn:
+        existing = set(_existing_partitions(conn))
+    has_default = _DEFAULT in existing
+
+    created = []
+    for _ in range(ahead + 1):
+        end = _next_period(start, granularity)
+        name = _partition_name(start, granularity)
+        if name not in existing:
+            try:
+                with bind.begin() as conn:
+                    moved = _create_partition(conn, name, start, end, has_default)
+            except Exception as exc:  # noqa: BLE001
+                log.error(f"[ERROR] failed to create spylog partition {name}: {exc}")
+            else:
+                created.append(name)
+                if moved:
+                    log.info(f"UPDATE POSTGRESQL {_DEFAULT} --- moved {moved} rows to {name}")
+        start = end
+
+    if created:
+        log.info(f"CREATE POSTGRESQL spylog partitions --- {created}")
+    return created
+
+
+def drop_old_spylog_partitions(bind=None, retention_days: int | None = None,
+                               today: dt.date | None = None) -> list[str]:
+    """Удаляет секции, целиком лежащие раньше `today - retention_days`.
+
+    Строки старше срока в spylog_default (туда попадают вставки при пропущенном
+    ensure_partitions) удаляются DELETE-ом — их там немного.
+
+    Returns:
+        Имена удалённых секций.
+    """
+    bind = bind or engine
+    retention_days = CONFIG_POSTGRE.spylog_retention_days if retention_days is None else retention_days
+    cutoff = (today or _utc_today()) - dt.timedelta(days=retention_days)
+
+    dropped = []
+    purged = 0
+    with bind.begin() as conn:
+        existing = _existing_partitions(conn)
+        for name in existing:
+            upper = _partition_upper_bound(name)
+            if upper is not None and upper <= cutoff:
+                conn.execute(sa.text(f'DROP TABLE "{name}"'))
+                dropped.append(name)
+        if _DEFAULT in existing:
+            purged = conn.execute(
+                sa.text(f"DELETE FROM {_DEFAULT} WHERE ts < :cutoff"),
+                {"cutoff": f"{cutoff.isoformat()} 00:00:00+00"},
+            ).rowcount
+
+    if dropped:
+        log.info(f"DROP POSTGRESQL spylog partitions --- {dropped}")
+    if purged:
+        log.info(f"DELETE POSTGRESQL {_DEFAULT} --- {purged} rows older than {cutoff}")
+    return dropped
+
+
+@celery_app.task(name="spylog.ensure_partitions")
+def ensure_partitions() -> list[str]:
+    return ensure_spylog_partitions()
+
+
+@celery_app.task(name="spylog.drop_old_partitions")
+def drop_old_partitions() -> list[str]:
+    return drop_old_spylog_partitions()
@@ -1,12 +1,21 @@
+import asyncio
 import functools
-from contextlib import contextmanager
-from typing import Callable, TypeVar, ParamSpec
-
+import os
+import random
+import socket
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Awaitable, Callable, Sequence, TypeVar, ParamSpec
+
+import redis
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from .database import SessionLocal
+from .database import SessionLocal, AsyncSessionLocal
+from .ingest import get_writer
 from .models import *
-from tasks import celery_app
+from configs import CONFIG_POSTGRE, CONFIG_REDIS
+from tasks import LAST_FLUSH_KEY, celery_app, redis_sync_conn
 from log_handle import log
 
 _P = ParamSpec("_P")
@@ -29,6 +38,40 @@ def _get_session(isolation: str):
         session.close()
 
 
+@asynccontextmanager
+async def _get_async_session(isolation: str):
+    """Асинхронный аналог `_get_session` поверх asyncpg."""
+    session = AsyncSessionLocal()
+    try:
+        await session.connection(
+            execution_options={"isolation_level": isolation}
+        )
+        yield session
+    finally:
+        await session.close()
+
+
+# -----------------------------
+# Повтор при конфликте сериализации
+# -----------------------------
+# 40001 serialization_failure, 40P01 deadlock_detected
+_RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    orig = getattr(exc, "orig", None)
+    for err in (orig, getattr(orig, "__cause__", None)):
+        code = getattr(err, "pgcode", None) or getattr(err, "sqlstate", None)
+        if code in _RETRYABLE_SQLSTATES:
+            return True
+    return False
+
+
+def _retry_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с full jitter."""
+    return random.uniform(0, CONFIG_POSTGRE.retry_base_delay * (2 ** attempt))
+
+
 # -----------------------------
 # Декораторы
 # -----------------------------
@@ -48,107 +91,457 @@ def db_query(func: Callable[_P, _R]) -> Callable[_P, _R]:
     return wrapper
 
 
-def db_update(func: Callable[_P, _R]) -> Callable[_P, _R]:
+def db_write(isolation: str = "READ COMMITTED",
+             retries: int | None = None) -> Callable[[Callable[_P, _R]], Callable[_P, _R]]:
     """
-    SERIALIZABLE, commit по окончании.
-    Также авто-заполняет server-default поля, если объект ещё не в БД
-    (например, `ts = func.now()`).
+    Транзакция на запись с заданным уровнем изоляции, commit по окончании.
+    При serialization failure / deadlock вся функция повторяется
+    (до `retries` раз, задержка с jitter), поэтому она должна быть идемпотентной.
     """
+    attempts = (CONFIG_POSTGRE.retry_attempts if retries is None else retries) + 1
 
-    @functools.wraps(func)
-    def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _R:  # type: ignore[name-defined]
-        with _get_session("SERIALIZABLE") as session:
-            try:
-                result = func(session, *args, **kwargs)
+    def decorator(func: Callable[_P, _R]) -> Callable[_P, _R]:
+        @functools.wraps(func)
+        def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _R:  # type: ignore[name-defined]
+            for attempt in range(attempts):
+                with _get_session(isolation) as session:
+                    try:
+                        result = func(session, *args, **kwargs)
+                        session.commit()
+                        return result
+                    except Exception as exc:
+                        session.rollback()
+                        if attempt + 1 == attempts or not _is_retryable(exc):
+                            raise
+                time.sleep(_retry_delay(attempt))
 
-                # --- auto defaults ---
-                # Прогоняем before_flush, чтобы серверные default-ы проставились
-                for obj in session.new:
-                    session.flush([obj])
+        return wrapper
 
-                session.commit()
-                return result
+    return decorator
+
+
+# SERIALIZABLE, commit по окончании, повтор при конфликте сериализации
+db_update = db_write("SERIALIZABLE")
+
+
+def async_db_query(func: Callable[_P, Awaitable[_R]]) -> Callable[_P, Awaitable[_R]]:
+    """Асинхронный `db_query`: READ COMMITTED, rollback on error, без commit."""
+
+    @functools.wraps(func)
+    async def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _R:  # type: ignore[name-defined]
+        async with _get_async_session("READ COMMITTED") as session:
+            try:
+                return await func(session, *args, **kwargs)
             except Exception:
-                session.rollback()
+                await session.rollback()
                 raise
 
     return wrapper
 
 
+def async_db_write(isolation: str = "READ COMMITTED",
+                   retries: int | None = None) -> Callable[[Callable[_P, Awaitable[_R]]], Callable[_P, Awaitable[_R]]]:
+    """Асинхронный `db_write`."""
+    attempts = (CONFIG_POSTGRE.retry_attempts if retries is None else retries) + 1
+
+    def decorator(func: Callable[_P, Awaitable[_R]]) -> Callable[_P, Awaitable[_R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _R:  # type: ignore[name-defined]
+            for attempt in range(attempts):
+                async with _get_async_session(isolation) as session:
+                    try:
+                        result = await func(session, *args, **kwargs)
+                        await session.commit()
+                        return result
+                    except Exception as exc:
+                        await session.rollback()
+                        if attempt + 1 == attempts or not _is_retryable(exc):
+                            raise
+                await asyncio.sleep(_retry_delay(attempt))
+
+        return wrapper
+
+    return decorator
+
+
+async_db_update = async_db_write("SERIALIZABLE")
+
+
+# -----------------------------
+# Upsert-примитивы (INSERT ... ON CONFLICT ... RETURNING)
+# -----------------------------
+def _upsert_stmt(model, values: dict, conflict_cols: Sequence[str],
+                 update_cols: Sequence[str] | None, returning: Sequence[str] | None):
+    stmt = pg_insert(model).values(**values)
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_cols),
+            set_={col: stmt.excluded[col] for col in update_cols},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_cols))
+    if returning:
+        stmt = stmt.returning(*(getattr(model, col) for col in returning))
+    return stmt
+
+
+def upsert(session, model, values: dict, conflict_cols: Sequence[str] = ("id",),
+           update_cols: Sequence[str] | None = None, returning: Sequence[str] | None = ("id",)):
+    """
+    INSERT ... ON CONFLICT DO NOTHING (или DO UPDATE SET update_cols) RETURNING.
+    Возвращает строку RETURNING или None, если строка уже была и update_cols не заданы.
+    """
+    result = session.execute(_upsert_stmt(model, values, conflict_cols, update_cols, returning))
+    return result.first() if returning else None
+
+
+async def upsert_async(session, model, values: dict, conflict_cols: Sequence[str] = ("id",),
+                       update_cols: Sequence[str] | None = None, returning: Sequence[str] | None = ("id",)):
+    """Асинхронный `upsert`."""
+    result = await session.execute(_upsert_stmt(model, values, conflict_cols, update_cols, returning))
+    return result.first() if returning else None
+
+
 # -------- REDIS FLUSH -----------------------------------------------
 
-@celery_app.task
-def flush_logs(batch_size: int = 1000) -> int:
-    """Pop events from Redis and bulk-insert into Postgres via SQLAlchemy.
+# Lua-скрипт атомарно вытаскивает up-to N элементов списка (fallback для Redis < 6.2)
+_LPOP_N_LUA = (
+    "local n=tonumber(ARGV[1]);"
+    "local res={};"
+    "for i=1,n do "
+    "  local v=redis.call('lpop', KEYS[1]);"  # FIFO pop
+    "  if not v then return res end;"
+    "  table.insert(res, v);"
+    "end;"
+    "return res;"
+)
+
+# Поддержка `LPOP key count` (Redis 6.2+): атрибут на пуле соединений клиента,
+# None — ещё не проверяли. Пул живёт столько же, сколько клиент, поэтому ответ
+# не перейдёт к другому серверу, как при кэше по id(conn).
+_LPOP_COUNT_ATTR = "_spylog_lpop_count"
+
+
+def _pop_batch(conn, key: str, batch_size: int) -> list:
+    """Атомарно снимает до `batch_size` элементов с головы списка.
+
+    Поддержку LPOP с count проверяет первый же вызов: старый Redis отвечает
+    ResponseError (wrong number of arguments), и дальше идёт Lua-скрипт.
+    """
+    holder = getattr(conn, "connection_pool", conn)
+    supported = getattr(holder, _LPOP_COUNT_ATTR, None)
+    if supported is not False:
+        try:
+            items = conn.lpop(key, batch_size)
+        except redis.exceptions.ResponseError as exc:
+            # WRONGTYPE и прочее — не про версию сервера
+            if supported or "wrong number of arguments" not in str(exc).lower():
+                raise
+            setattr(holder, _LPOP_COUNT_ATTR, False)
+        else:
+            if supported is None:
+                setattr(holder, _LPOP_COUNT_ATTR, True)
+            return items or []
+    return conn.eval(_LPOP_N_LUA, 1, key, batch_size) or []
+
+
+def drain_spylog(conn=None, session_factory=None, batch_size: int = 1000,
+                 key: str | None = None, mode: str | None = None) -> int:
+    """Сливает буфер событий из Redis в таблицу spylog пачками.
 
     Args:
-        batch_size: сколько записей брать за один проход Lua-скрипта.
+        conn: синхронный Redis-клиент (по умолчанию пул из `tasks`).
+        session_factory: фабрика сессий SQLAlchemy (по умолчанию `SessionLocal`).
+        batch_size: сколько записей брать из Redis за один проход.
+        key: ключ списка-буфера (по умолчанию `CONFIG_REDIS.buffer_key`).
+        mode: стратегия записи из `ingest.WRITERS`
+            (по умолчанию `CONFIG_POSTGRE.spylog_ingest`).
     Returns:
         Итоговое число вставленных строк.
     """
+    conn = conn if conn is not None else redis_sync_conn
+    session_factory = session_factory or SessionLocal
+    key = key or CONFIG_REDIS.buffer_key
+    write = get_writer(mode or CONFIG_POSTGRE.spylog_ingest)
 
     total_flushed = 0
-
-    # Lua-скрипт атомарно вытаскивает up-to N элементов списка
-    lua_script = (
-        "local n=tonumber(ARGV[1]);"
-        "local res={};"
-        "for i=1,n do "
-        "  local v=redis.call('lpop', KEYS[1]);"  # FIFO pop
-        "  if not v then return res end;"
-        "  table.insert(res, v);"
-        "end;"
-        "return res;"
-    )
-
     while True:
         # 1. Берём пачку json-строк из Redis
-        raw_records = redis_conn.eval(lua_script, 1, BUFFER_KEY, batch_size)
+        raw_records = _pop_batch(conn, key, batch_size)
         if not raw_records:
             break  # Всё кончилось
 
-        # 2. Преобразуем в ready-to-insert dicts
-        rows = []
-        for raw in raw_records:
-            try:
-                doc = json.loads(raw)
-                if doc.get("user_id") is None:
-                    continue  # пропуск анонимов / системных событий
-                rows.append(
-                    {
-                        "user_id": int(doc["user_id"]),
-                        "action": doc,  # хранится как JSONB
-                        "ts": datetime.fromisoformat(doc["iso_ts"]),
-                    }
-                )
-            except Exception as exc:  # noqa: BLE001
-                print(f"[WARN] corrupt log entry dropped: {exc}: {raw}")
-
-        if not rows:
-            continue
-
-        # 3. Одним батчем пишем через SQLAlchemy Core (быстрее ORM add_all)
-        with SessionLocal() as session:
-            session.execute(insert(SpyLog), rows)
+        # 2. Одним батчем пишем выбранной стратегией (executemany / VALUES / COPY)
+        with session_factory() as session:
+            total_flushed += write(session, raw_records)
             session.commit()
-            total_flushed += len(rows)
 
     return total_flushed
 
 
+# -------- REDIS STREAM FLUSH ----------------------------------------
+# Альтернативный буфер на Redis Streams: записи подтверждаются (XACK) только
+# после commit в Postgres, поэтому падение воркера посреди пачки не теряет
+# данные — незакоммиченные записи остаются в PEL группы и через
+# `stream_claim_idle_ms` их забирает другой воркер через XAUTOCLAIM.
+# Дубли отсекает сама БД: уникальный индекс (event_id, ts) и
+# ON CONFLICT DO NOTHING (см. ingest) — это работает и когда первый воркер
+# ещё не закоммитил пачку в момент повторной доставки.
+# Запись, доставленная больше `stream_max_deliveries` раз (не пишется в БД),
+# переносится в стрим `{key}:dead` и больше не мешает сливу.
+
+def _as_str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _ensure_group(conn, key: str, group: str) -> None:
+    try:
+        conn.xgroup_create(key, group, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def _write_stream_batch(conn, key: str, group: str, session_factory, write, entries: list) -> int:
+    """Пишет пачку записей стрима в Postgres, затем XACK + XDEL."""
+    ids = [entry_id for entry_id, _ in entries]
+    # fields == None — запись удалена из стрима, но висела в PEL: просто подтверждаем
+    pairs = [
+        (_as_str(entry_id), fields.get(b"data", fields.get("data")))
+        for entry_id, fields in entries if fields
+    ]
+
+    inserted = 0
+    with session_factory() as session:
+        if pairs:
+            inserted = write(session, [raw for _, raw in pairs], [entry_id for entry_id, _ in pairs])
+        session.commit()
+
+    pipe = conn.pipeline(transaction=False)
+    pipe.xack(key, group, *ids)
+    pipe.xdel(key, *ids)
+    pipe.execute()
+    return inserted
+
+
+def _write_claimed(conn, key: str, group: str, session_factory, write, entries: list) -> int:
+    """Повторно доставленные записи: при ошибке пачки — по одной.
+
+    Записи, которые не пишутся и поодиночке, остаются в PEL; их счётчик
+    доставок растёт с каждым XAUTOCLAIM, пока `_dead_letter_exhausted` их не уберёт.
+    """
+    try:
+        return _write_stream_batch(conn, key, group, session_factory, write, entries)
+    except Exception as exc:  # noqa: BLE001
+        log.warning(f"[WARN] redelivered spylog batch of {len(entries)} failed, writing one by one: {exc}")
+    inserted = 0
+    for entry in entries:
+        try:
+            inserted += _write_stream_batch(conn, key, group, session_factory, write, [entry])
+        except Exception as exc:  # noqa: BLE001
+            log.warning(f"[WARN] spylog entry {_as_str(entry[0])} failed again: {exc}")
+    return inserted
+
+
+def _dead_letter_exhausted(conn, key: str, group: str, entries: list) -> list:
+    """Переносит в `{key}:dead` записи, доставленные больше stream_max_deliveries раз.
+
+    Returns:
+        Оставшиеся записи.
+    """
+    ids = [_as_str(entry_id) for entry_id, _ in entries]
+    pending = conn.xpending_range(key, group, min=ids[0], max=ids[-1], count=len(ids))
+    exhausted = {
+        _as_str(p["message_id"]): p["times_delivered"]
+        for p in pending if p["times_delivered"] > CONFIG_REDIS.stream_max_deliveries
+    }
+    if not exhausted:
+        return entries
+
+    pipe = conn.pipeline(transaction=False)
+    for entry_id, fields in entries:
+        entry_id = _as_str(entry_id)
+        if entry_id in exhausted:
+            if fields:
+                pipe.xadd(f"{key}:dead", {
+                    "data": fields.get(b"data", fields.get("data")),
+                    "event_id": entry_id,
+                    "deliveries": exhausted[entry_id],
+                })
+            pipe.xack(key, group, entry_id)
+            pipe.xdel(key, entry_id)
+    pipe.execute()
+    log.error(f"[ERROR] {len(exhausted)} spylog entries moved to {key}:dead after "
+              f"{CONFIG_REDIS.stream_max_deliveries} deliveries: {sorted(exhausted)}")
+    return [(entry_id, fields) for entry_id, fields in entries if _as_str(entry_id) not in exhausted]
+
+
+def drain_spylog_stream(conn=None, session_factory=None, batch_size: int = 1000,
+                        key: str | None = None, mode: str | None = None,
+                        consumer: str | None = None) -> int:
+    """Сливает stream-буфер в spylog через consumer group.
+
+    Несколько воркеров могут работать параллельно: XREADGROUP раздаёт каждому
+    свои записи. Аргументы как у `drain_spylog`, плюс:
+        consumer: имя потребителя в группе (по умолчанию hostname-pid).
+    Returns:
+        Итоговое число вставленных строк.
+    """
+    conn = conn if conn is not None else redis_sync_conn
+    session_factory = session_factory or SessionLocal
+    key = key or CONFIG_REDIS.buffer_key
+    group = CONFIG_REDIS.stream_group
+    consumer = consumer or _consumer_name()
+    write = get_writer(mode or CONFIG_POSTGRE.spylog_ingest)
+
+    _ensure_group(conn, key, group)
+    total_flushed = 0
+
+    # 1. Забираем записи, зависшие у упавших воркеров; их ошибки не останавливают шаг 2
+    start_id = "0-0"
+    while True:
+        claimed = conn.xautoclaim(
+            key, group, consumer,
+            min_idle_time=CONFIG_REDIS.stream_claim_idle_ms,
+            start_id=start_id,
+            count=batch_size,
+        )
+        start_id, entries = claimed[0], claimed[1]
+        if entries:
+            entries = _dead_letter_exhausted(conn, key, group, entries)
+        if entries:
+            total_flushed += _write_claimed(conn, key, group, session_factory, write, entries)
+        if start_id in ("0-0", b"0-0"):
+            break
+
+    # 2. Новые записи. Упавшая пачка остаётся в PEL и вернётся через XAUTOCLAIM
+    while True:
+        resp = conn.xreadgroup(group, consumer, {key: ">"}, count=batch_size)
+        if not resp or not resp[0][1]:
+            break
+        total_flushed += _write_stream_batch(conn, key, group, session_factory, write, resp[0][1])
+
+    return total_flushed
+
+
+@celery_app.task(name="spylog.flush_logs")
+def flush_logs(batch_size: int = CONFIG_REDIS.flush_batch_size) -> int:
+    """Pop events from Redis and bulk-insert into Postgres via SQLAlchemy.
+
+    Запускается по расписанию Celery beat (см. `tasks.celery_app.conf.beat_schedule`).
+
+    Args:
+        batch_size: сколько записей брать за один проход.
+    Returns:
+        Итоговое число вставленных строк.
+    """
+    if CONFIG_REDIS.buffer_mode == "stream":
+        flushed = drain_spylog_stream(batch_size=batch_size)
+    else:
+        flushed = drain_spylog(batch_size=batch_size)
+    redis_sync_conn.set(LAST_FLUSH_KEY, time.time())
+    if flushed:
+        log.info(f"INSERT POSTGRESQL SpyLog --- flushed: {flushed}")
+    return flushed
+
+
 # -------- QUERIES ---------------------------------------------------
 
-@db_update
-def new_user(session, id: int, name: str):
-    session.add(UserHub(id=id, name=name))
-    log.info(f"INSERT POSTGRESQL UserHub --- id: {id}, name: {name}")
+_USER_REG_STMT = (
+    sa.update(UserHub)
+    .where(UserHub.id == sa.bindparam("user_id"))
+    .values(is_reg=True)
+    .returning(UserHub.id)
+)
 
 
-@db_update
+@db_write()
+def new_user(session, id: int, name: str) -> bool:
+    """Идемпотентно: повторный /start не падает на PK. True — пользователь создан."""
+    created = upsert(session, UserHub, {"id": id, "name": name}) is not None
+    if created:
+        log.info(f"INSERT POSTGRESQL UserHub --- id: {id}, name: {name}")
+    return created
+
+
+@db_write()
 def user_reg(session, id: int):
-    user: UserHub | None = session.get(UserHub, id)
-    if user is None:
+    if session.execute(_USER_REG_STMT, {"user_id": id}).first() is None:
         raise ValueError(f"UserHub(id={id}) not found")
+    log.info(f"UPDATE POSTGRESQL UserHub --- id: {id}, is_reg={True}")
+
+
+@db_query
+def get_user_state(session, id: int) -> tuple[bool, int] | None:
+    """(is_reg, balance) пользователя или None, если его нет."""
+    row = session.execute(
+        sa.select(UserHub.is_reg, UserHub.balance).where(UserHub.id == id)
+    ).first()
+    return None if row is None else (row.is_reg, row.balance)
+
+
+@db_query
+def balance_history(session, user_id: int, limit: int = 50) -> list[Transaction]:
+    """Последние транзакции пользователя (индекс ix_transactions_user_ts)."""
+    return list(
+        session.execute(
+            sa.select(Transaction)
+            .where(Transaction.user_id == user_id)
+            .order_by(Transaction.ts.desc())
+            .limit(limit)
+        ).scalars()
+    )
 
-    user.is_reg = True
+
+@db_query
+def active_tasks_due(session, until, limit: int = 1000) -> list[Task]:
+    """Активные задания со сроком до `until` (частичный индекс ix_tasks_active_date)."""
+    return list(
+        session.execute(
+            sa.select(Task)
+            .where(Task.is_active.is_(True), Task.date <= until)
+            .order_by(Task.date)
+            .limit(limit)
+        ).scalars()
+    )
+
+
+@db_query
+def referral_count(session, user_id: int) -> int:
+    """Сколько пользователей пришло по приглашению `user_id` (индекс ix_userhub_refferer_id)."""
+    return session.execute(
+        sa.select(sa.func.count()).select_from(UserHub).where(UserHub.refferer_id == user_id)
+    ).scalar_one()
+
+
+# -------- ASYNC QUERIES (для хендлеров бота) ------------------------
+
+@async_db_write()
+async def new_user_async(session, id: int, name: str) -> bool:
+    """Идемпотентно: повторный /start не падает на PK. True — пользователь создан."""
+    created = await upsert_async(session, UserHub, {"id": id, "name": name}) is not None
+    if created:
+        log.info(f"INSERT POSTGRESQL UserHub --- id: {id}, name: {name}")
+    return created
+
+
+@async_db_query
+async def get_user_state_async(session, id: int) -> tuple[bool, int] | None:
+    """(is_reg, balance) пользователя или None, если его нет."""
+    row = (
+        await session.execute(
+            sa.select(UserHub.is_reg, UserHub.balance).where(UserHub.id == id)
+        )
+    ).first()
+    return None if row is None else (row.is_reg, row.balance)
+
+
+@async_db_write()
+async def user_reg_async(session, id: int):
+    if (await session.execute(_USER_REG_STMT, {"user_id": id})).first() is None:
+        raise ValueError(f"UserHub(id={id}) not found")
     log.info(f"UPDATE POSTGRESQL UserHub --- id: {id}, is_reg={True}")
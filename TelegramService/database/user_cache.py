@@ -0,0 +1,158 @@
+"""Read-through кэш состояния пользователей (есть ли в userhub / is_reg / balance).
+
+Два уровня:
+  1. локальный LRU в процессе с коротким TTL (`REDIS_USER_CACHE_LOCAL_TTL`);
+  2. общий для всех реплик Redis-хэш ``userhub:{id}`` с TTL (`REDIS_USER_CACHE_TTL`).
+
+Промах обоих уровней идёт в Postgres. Отсутствие пользователя тоже кэшируется
+(negative caching), но ненадолго. После записи (new_user / user_reg / смена
+баланса) вызывающий код обязан вызвать `set` или `invalidate`; локальные копии
+на других репликах устаревают не дольше локального TTL.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from configs import CONFIG_POSTGRE, CONFIG_REDIS
+from log_handle import log
+from tasks import redis_conn as _default_redis
+from . import queries
+
+
+@dataclass(frozen=True)
+class UserState:
+    exists: bool
+    is_reg: bool = False
+    balance: int = 0
+
+
+MISSING = UserState(exists=False)
+
+
+class UserStateCache:
+    def __init__(
+        self,
+        size: int = CONFIG_REDIS.user_cache_size,
+        local_ttl: float = CONFIG_REDIS.user_cache_local_ttl,
+        redis_ttl: int = CONFIG_REDIS.user_cache_ttl,
+        negative_ttl: int = CONFIG_REDIS.user_cache_negative_ttl,
+        conn=None,
+    ):
+        self.size = size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.negative_ttl = negative_ttl
+        self.conn = conn
+        self._local: OrderedDict[int, tuple[float, UserState]] = OrderedDict()
+        # метрики
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"userhub:{user_id}"
+
+    @property
+    def _redis(self):
+        return self.conn or _default_redis
+
+    def stats(self) -> Dict[str, float]:
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_ratio": (self.local_hits + self.redis_hits) / total if total else 0.0,
+            "local_size": len(self._local),
+        }
+
+    # -------- локальный уровень ------------------------------------
+
+    def _local_get(self, user_id: int) -> Optional[UserState]:
+        item = self._local.get(user_id)
+        if item is None:
+            return None
+        expires, state = item
+        if expires < time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return state
+
+    def _local_put(self, user_id: int, state: UserState) -> None:
+        ttl = self.local_ttl if state.exists else min(self.local_ttl, self.negative_ttl)
+        self._local[user_id] = (time.monotonic() + ttl, state)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.size:
+            self._local.popitem(last=False)
+
+    # -------- Redis уровень ----------------------------------------
+
+    async def _redis_get(self, user_id: int) -> Optional[UserState]:
+        try:
+            raw = await self._redis.hgetall(self._key(user_id))
+        except Exception as exc:  # noqa: BLE001
+            self.redis_errors += 1
+            log.warning(f"[WARN] user cache redis get failed: {exc}")
+            return None
+        if not raw:
+            return None
+        raw = {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in raw.items()}
+        return UserState(bool(raw["exists"]), bool(raw.get("is_reg", 0)), raw.get("balance", 0))
+
+    async def _redis_put(self, user_id: int, state: UserState) -> None:
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.hset(self._key(user_id), mapping={
+                "exists": int(state.exists),
+                "is_reg": int(state.is_reg),
+                "balance": state.balance,
+            })
+            pipe.expire(self._key(user_id), self.redis_ttl if state.exists else self.negative_ttl)
+            await pipe.execute()
+        except Exception as exc:  # noqa: BLE001
+            self.redis_errors += 1
+            log.warning(f"[WARN] user cache redis set failed: {exc}")
+
+    # -------- публичный API ----------------------------------------
+
+    async def get(self, user_id: int) -> UserState:
+        state = self._local_get(user_id)
+        if state is not None:
+            self.local_hits += 1
+            return state
+
+        state = await self._redis_get(user_id)
+        if state is not None:
+            self.redis_hits += 1
+            self._local_put(user_id, state)
+            return state
+
+        self.misses += 1
+        if CONFIG_POSTGRE.async_mode:
+            row = await queries.get_user_state_async(id=user_id)
+        else:
+            row = queries.get_user_state(id=user_id)
+        state = MISSING if row is None else UserState(True, row[0], row[1])
+        await self.set(user_id, state)
+        return state
+
+    async def set(self, user_id: int, state: UserState) -> None:
+        """Записать известное состояние (после успешной записи в БД)."""
+        self._local_put(user_id, state)
+        await self._redis_put(user_id, state)
+
+    async def invalidate(self, user_id: int) -> None:
+        self._local.pop(user_id, None)
+        try:
+            await self._redis.delete(self._key(user_id))
+        except Exception as exc:  # noqa: BLE001
+            self.redis_errors += 1
+            log.warning(f"[WARN] user cache redis invalidate failed: {exc}")
+
+
+user_cache = UserStateCache()
@@ -0,0 +1,205 @@
+"""Сериализация событий log_event для spylog-буфера в Redis.
+
+Форматы (выбирается `CONFIG_REDIS.event_codec`):
+
+* ``json``    — исходный формат: json-объект с ключами event / user_id / chat_id /
+                iso_ts / message / callback_data;
+* ``msgpack`` — msgpack-массив [event, user_id, chat_id, ts_us, message, callback_data];
+* ``struct``  — фиксированный заголовок `<BBBqqq` + строки с длиной uint16.
+
+В бинарных форматах имя события хранится маленьким int-ом (индекс в EVENT_NAMES + 1,
+0 — имя не из словаря и идёт строкой), время — целым числом микросекунд с эпохи.
+
+Декодер определяет формат по первому байту, поэтому флашер одновременно
+понимает старые json-записи и новые бинарные — можно переключать кодек на
+работающем буфере. Запись с неизвестным первым байтом — ValueError.
+"""
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from configs import CONFIG_REDIS
+
+# Только дописывать в конец: индекс — часть формата уже лежащих в Redis записей
+EVENT_NAMES = (
+    "start",
+    "about_me",
+    "what_i_do",
+    "register",
+    "agree",
+    "free_text",
+)
+_EVENT_CODES = {name: i + 1 for i, name in enumerate(EVENT_NAMES)}
+
+_encode_basestring = json.encoder.encode_basestring_ascii
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_JSON_MARK = ord("{")
+_MSGPACK_MARK = 0x96  # fixarray из 6 элементов
+_STRUCT_MARK = 0x01
+
+# magic, flags (bit0 — есть user_id, bit1 — есть chat_id), event_code, user_id, chat_id, ts_us
+_HEADER = struct.Struct("<BBBqqq")
+_STR_LEN = struct.Struct("<H")
+_NONE_LEN = 0xFFFF
+
+
+@lru_cache(maxsize=4096)
+def _iso_second(sec: int) -> str:
+    return (_EPOCH + timedelta(seconds=sec)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _ts_to_iso(ts_us: int) -> str:
+    # События одной пачки почти всегда попадают в несколько соседних секунд —
+    # форматирование даты кэшируется посекундно, микросекунды дописываются.
+    sec, us = divmod(ts_us, 1_000_000)
+    return f"{_iso_second(sec)}.{us:06d}+00:00"
+
+
+def _event_name(code: int, name: Optional[str]) -> str:
+    return EVENT_NAMES[code - 1] if code else name
+
+
+# -------- encode ----------------------------------------------------
+
+def _encode_json(event: str, user_id, chat_id, ts_us: int, message, callback_data) -> bytes:
+    return json.dumps({
+        "event": event,
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "iso_ts": _ts_to_iso(ts_us),
+        "message": message,
+        "callback_data": callback_data,
+    }).encode()
+
+
+def _encode_msgpack(event: str, user_id, chat_id, ts_us: int, message, callback_data) -> bytes:
+    import msgpack
+
+    return msgpack.packb([_EVENT_CODES.get(event, event), user_id, chat_id, ts_us, message, callback_data])
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    if value is None:
+        return _STR_LEN.pack(_NONE_LEN)
+    data = value.encode()[:_NONE_LEN - 1]
+    return _STR_LEN.pack(len(data)) + data
+
+
+def _encode_struct(event: str, user_id, chat_id, ts_us: int, message, callback_data) -> bytes:
+    code = _EVENT_CODES.get(event, 0)
+    flags = (user_id is not None) | (chat_id is not None) << 1
+    parts = [_HEADER.pack(_STRUCT_MARK, flags, code, user_id or 0, chat_id or 0, ts_us)]
+    if not code:
+        parts.append(_pack_str(event))
+    parts.append(_pack_str(message))
+    parts.append(_pack_str(callback_data))
+    return b"".join(parts)
+
+
+ENCODERS = {
+    "json": _encode_json,
+    "msgpack": _encode_msgpack,
+    "struct": _encode_struct,
+}
+
+
+def encode_event(event: str, user_id: Optional[int], chat_id: Optional[int], ts_us: int,
+                 message: Optional[str], callback_data: Optional[str], codec: Optional[str] = None) -> bytes:
+    return ENCODERS[codec or CONFIG_REDIS.event_codec](event, user_id, chat_id, ts_us, message, callback_data)
+
+
+# -------- decode ----------------------------------------------------
+
+def _unpack_str(raw: bytes, offset: int) -> tuple[Optional[str], int]:
+    (length,) = _STR_LEN.unpack_from(raw, offset)
+    offset += _STR_LEN.size
+    if length == _NONE_LEN:
+        return None, offset
+    return raw[offset:offset + length].decode(), offset + length
+
+
+def _decode_fields(raw: bytes) -> tuple:
+    """Бинарная запись → (event, user_id, chat_id, ts_us, message, callback_data)."""
+    if raw[0] == _STRUCT_MARK:
+        _, flags, code, user_id, chat_id, ts_us = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+        name = None
+        if not code:
+            name, offset = _unpack_str(raw, offset)
+        message, offset = _unpack_str(raw, offset)
+        callback_data, offset = _unpack_str(raw, offset)
+        return (
+            _event_name(code, name),
+            user_id if flags & 1 else None,
+            chat_id if flags & 2 else None,
+            ts_us,
+            message,
+            callback_data,
+        )
+    if raw[0] != _MSGPACK_MARK:
+        raise ValueError(f"unknown event format, leading byte 0x{raw[0]:02x}")
+
+    import msgpack
+
+    event, user_id, chat_id, ts_us, message, callback_data = msgpack.unpackb(raw)
+    if isinstance(event, int):
+        event = _event_name(event, None)
+    return event, user_id, chat_id, ts_us, message, callback_data
+
+
+def _json_str(value: Optional[str]) -> str:
+    return "null" if value is None else _encode_basestring(value)
+
+
+def _json_int(value: Optional[int]) -> str:
+    return "null" if value is None else str(value)
+
+
+def decode_event(raw: bytes | str) -> Dict[str, Any]:
+    """Любая запись буфера → dict в формате исходного json-события."""
+    if isinstance(raw, str) or raw[0] == _JSON_MARK:
+        return json.loads(raw)
+    event, user_id, chat_id, ts_us, message, callback_data = _decode_fields(raw)
+    return {
+        "event": event,
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "iso_ts": _ts_to_iso(ts_us),
+        "message": message,
+        "callback_data": callback_data,
+    }
+
+
+def decode_row(raw: bytes | str) -> tuple[Optional[int], str, str]:
+    """Запись буфера → (user_id, action как json-строка, iso_ts) для записи в spylog.
+
+    json-записи не пересериализуются: в action уходит исходная строка.
+    """
+    if isinstance(raw, str) or raw[0] == _JSON_MARK:
+        doc = json.loads(raw)
+        user_id = doc.get("user_id")
+        action = raw if isinstance(raw, str) else raw.decode()
+        return (int(user_id) if user_id is not None else None), action, doc["iso_ts"]
+
+    event, user_id, chat_id, ts_us, message, callback_data = _decode_fields(raw)
+    iso_ts = _ts_to_iso(ts_us)
+    # Собираем json напрямую, без промежуточного dict и json.dumps
+    action = (
+        f'{{"event": {_json_str(event)}, "user_id": {_json_int(user_id)}, '
+        f'"chat_id": {_json_int(chat_id)}, "iso_ts": "{iso_ts}", '
+        f'"message": {_json_str(message)}, "callback_data": {_json_str(callback_data)}}}'
+    )
+    return user_id, action, iso_ts
+
+
+def event_time(raw: bytes | str) -> float:
+    """Время события записи буфера, unix-секунды (без разбора строковых полей)."""
+    if isinstance(raw, str) or raw[0] == _JSON_MARK:
+        return datetime.fromisoformat(json.loads(raw)["iso_ts"]).timestamp()
+    if raw[0] == _STRUCT_MARK:
+        return _HEADER.unpack_from(raw)[5] / 1_000_000
+    return _decode_fields(raw)[3] / 1_000_000
@@ -1,3 +1,4 @@
+import asyncio
 import database as db
 import os
 from typing import Callable, Awaitable, Any, Dict
@@ -17,8 +18,11 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
-from tasks import log_event
-from configs import CONFIG_BOT
+from tasks import log_event, event_batcher
+from persistence import RedisPersistence
+from update_processor import PerChatUpdateProcessor
+from metrics import start_metrics_server
+from configs import CONFIG_BOT, CONFIG_METRICS, CONFIG_POSTGRE, CONFIG_REDIS
 from log_handle import log
 
 
@@ -65,8 +69,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return  # Игнорируем повторные /start
 
     user_data["started"] = True
-    log.info(f"CLICKED /start --- id: {update.effective_user.id}, name: {update.effective_user.username}")
-    db.new_user(id=update.effective_user.id, name=update.effective_user.username)
+    # user_data может быть пустым (истёк TTL, persistence выключен) — спрашиваем кэш, а не Postgres
+    user_id = update.effective_user.id
+    if (await db.user_cache.get(user_id)).exists:
+        return
+
+    log.info(f"CLICKED /start --- id: {user_id}, name: {update.effective_user.username}")
+    if CONFIG_POSTGRE.async_mode:
+        await db.new_user_async(id=user_id, name=update.effective_user.username)
+    else:
+        db.new_user(id=user_id, name=update.effective_user.username)
+    await db.user_cache.set(user_id, db.UserState(exists=True))
 
     await update.message.reply_html(
         "<b>Привет! Я Pinky – твоя digital-подруга 💕 Давай знакомиться?</b>",
@@ -135,7 +148,14 @@ async def agree(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if query.message:
         await query.edit_message_reply_markup(reply_markup=None)
 
-    db.user_reg(id=update.effective_user.id)
+    user_id = update.effective_user.id
+    state = await db.user_cache.get(user_id)
+    if not state.is_reg:
+        if CONFIG_POSTGRE.async_mode:
+            await db.user_reg_async(id=user_id)
+        else:
+            db.user_reg(id=user_id)
+        await db.user_cache.set(user_id, db.UserState(exists=True, is_reg=True, balance=state.balance))
 
     await query.message.reply_text(
         "Привет, выбери чем бы ты хотела заняться сегодня ?\n\nВыбери вариант внизу или просто напиши в чат.",
@@ -158,8 +178,34 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 ###############################################################################
 
 
+async def on_startup(app: Application) -> None:
+    start_metrics_server(CONFIG_METRICS.port, CONFIG_METRICS.listen)
+    if CONFIG_REDIS.batch_enabled:
+        await event_batcher.start()
+    await db.ledger_writer.start()
+
+
+async def on_shutdown(app: Application) -> None:
+    await db.ledger_writer.stop()
+    await event_batcher.stop()
+
+
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
 def build_app() -> Application:
-    app = ApplicationBuilder().token(CONFIG_BOT.token).build()
+    builder = (
+        ApplicationBuilder()
+        .token(CONFIG_BOT.token)
+        .update_queue(asyncio.Queue(maxsize=CONFIG_BOT.update_queue_size))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if CONFIG_BOT.concurrent_updates > 1:
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(CONFIG_BOT.concurrent_updates))
+    if CONFIG_REDIS.state_enabled:
+        builder = builder.persistence(RedisPersistence())
+    app = builder.build()
 
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -182,5 +228,11 @@ def build_app() -> Application:
 
 if __name__ == "__main__":
     application = build_app()
-    log.info(f"Start pooling...")
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    if CONFIG_BOT.mode == "webhook":
+        from webhook import run_webhook
+
+        log.info("Start webhook...")
+        asyncio.run(run_webhook(application, ALLOWED_UPDATES))
+    else:
+        log.info(f"Start pooling...")
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
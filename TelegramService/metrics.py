@@ -0,0 +1,192 @@
+"""Метрики Prometheus процесса бота.
+
+Процесс бота отдаёт их на CONFIG_METRICS.port (start_http_server в on_startup):
+    * время хендлеров — из обёртки tasks.log_event;
+    * ожидание соединения из пула SQLAlchemy и время запросов — instrument_engine;
+    * снимки счётчиков EventBatcher, UserStateCache и пулов — коллекторы при scrape.
+
+Длина spylog-буфера в Redis и отставание слива — в отдельном процессе
+(metrics_exporter.py): они общие для всех реплик бота и Celery-воркеров.
+"""
+import time
+from typing import Callable, Dict, Iterable
+
+from prometheus_client import Counter, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds",
+    "Время хендлера под log_event, включая постановку события в буфер",
+    ["event", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_CHECKOUT_WAIT = Histogram(
+    "bot_db_pool_checkout_seconds",
+    "Ожидание соединения из пула SQLAlchemy",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+DB_QUERY = Histogram(
+    "bot_db_query_duration_seconds",
+    "Время выполнения SQL-запроса (cursor.execute)",
+    ["engine", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+DB_ERRORS = Counter(
+    "bot_db_errors_total",
+    "Ошибки драйвера БД: SQLSTATE или класс исключения",
+    ["engine", "error"],
+)
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY"}
+
+
+def statement_kind(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    kind = head[0].upper() if head else ""
+    return kind if kind in _STATEMENTS else "other"
+
+
+def _error_label(exc: BaseException) -> str:
+    # asyncpg кладёт исходную ошибку в __cause__ адаптера (как в queries._is_retryable)
+    for err in (exc, getattr(exc, "__cause__", None)):
+        code = getattr(err, "pgcode", None) or getattr(err, "sqlstate", None)
+        if code:
+            return code
+    return type(exc).__name__
+
+
+def observe_handler(event: str, outcome: str, started: float) -> None:
+    HANDLER_LATENCY.labels(event, outcome).observe(time.perf_counter() - started)
+
+
+# -------- SQLAlchemy ---------------------------------------------------
+
+# имя engine-а → пул, для PoolCollector
+POOLS: Dict[str, object] = {}
+
+
+def _wrap_checkout(pool, name: str) -> None:
+    """Время внутри Pool._do_get — ожидание свободного соединения (или открытие нового).
+
+    У пула нет события «до checkout», поэтому оборачиваем метод экземпляра.
+    engine.dispose() заменяет пул новым — его оборачивает слушатель engine_disposed.
+    """
+    do_get = getattr(pool, "_do_get", None)
+    if do_get is None or getattr(do_get, "_metrics_wrapped", False):
+        return
+    observe = DB_CHECKOUT_WAIT.labels(name).observe
+
+    def timed_do_get():
+        t0 = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            observe(time.perf_counter() - t0)
+
+    timed_do_get._metrics_wrapped = True
+    pool._do_get = timed_do_get
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Вешает метрики на синхронный Engine (для AsyncEngine — на .sync_engine)."""
+    from sqlalchemy import event
+
+    _wrap_checkout(engine.pool, name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_t0"].pop()
+        DB_QUERY.labels(name, statement_kind(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "engine_disposed")
+    def _disposed(engine):
+        _wrap_checkout(engine.pool, name)
+        POOLS[name] = engine.pool
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("metrics_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+        DB_ERRORS.labels(name, _error_label(ctx.original_exception)).inc()
+
+    POOLS[name] = engine.pool
+
+
+# -------- снимки счётчиков при scrape -------------------------------------
+
+class PoolCollector(Collector):
+    """Занятость пулов: выданные соединения, свободные в пуле, overflow."""
+
+    def collect(self) -> Iterable:
+        checked_out = GaugeMetricFamily("bot_db_pool_checked_out", "Выданные из пула соединения", labels=["engine"])
+        idle = GaugeMetricFamily("bot_db_pool_idle", "Свободные соединения в пуле", labels=["engine"])
+        overflow = GaugeMetricFamily("bot_db_pool_overflow", "Соединения сверх pool_size", labels=["engine"])
+        for name, pool in POOLS.items():
+            if not hasattr(pool, "checkedout"):
+                continue  # NullPool / StaticPool
+            checked_out.add_metric([name], pool.checkedout())
+            idle.add_metric([name], pool.checkedin())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+        yield from (checked_out, idle, overflow)
+
+
+class StatsCollector(Collector):
+    """Превращает stats() объекта в метрики: монотонные ключи — counter с меткой result, прочие — gauge."""
+
+    def __init__(self, name: str, doc: str, stats: Callable[[], Dict[str, float]],
+                 counters: Dict[str, str], gauges: Dict[str, str]):
+        self.name = name
+        self.doc = doc
+        self.stats = stats
+        self.counters = counters
+        self.gauges = gauges
+
+    def collect(self) -> Iterable:
+        values = self.stats()
+        total = CounterMetricFamily(self.name, self.doc, labels=["result"])
+        for key, result in self.counters.items():
+            total.add_metric([result], values.get(key, 0))
+        yield total
+        for key, gauge in self.gauges.items():
+            yield GaugeMetricFamily(gauge, f"{self.doc}: {key}", value=values.get(key, 0))
+
+
+def register_app_collectors() -> None:
+    import database as db
+    from tasks import event_batcher
+
+    REGISTRY.register(PoolCollector())
+    REGISTRY.register(StatsCollector(
+        "bot_user_cache_requests", "Запросы к кэшу состояния пользователей", db.user_cache.stats,
+        counters={"local_hits": "local_hit", "redis_hits": "redis_hit", "misses": "miss"},
+        gauges={"local_size": "bot_user_cache_local_size"},
+    ))
+    REGISTRY.register(StatsCollector(
+        "bot_log_events", "События log_event в in-process батчере", event_batcher.stats,
+        counters={"enqueued": "enqueued", "flushed": "flushed", "dropped": "dropped"},
+        gauges={"queued": "bot_log_events_queued"},
+    ))
+
+
+_started = False
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> None:
+    """Инструментирует engine-ы из database и поднимает HTTP /metrics; повторный вызов — no-op."""
+    global _started
+    if _started or not port:
+        return
+    import database as db
+
+    instrument_engine(db.engine, "sync")
+    instrument_engine(db.async_engine.sync_engine, "async")
+    register_app_collectors()
+    start_http_server(port, addr)
+    _started = True
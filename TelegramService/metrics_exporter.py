@@ -0,0 +1,96 @@
+"""Экспортёр метрик spylog-буфера в Redis — отдельный процесс рядом с ботом и Celery.
+
+Буфер общий для всех реплик бота и воркеров, поэтому его читает один sidecar,
+а не каждый процесс. На каждый scrape — несколько O(1)-команд к Redis:
+    * bot_spylog_buffer_length — LLEN / XLEN;
+    * bot_spylog_buffer_oldest_age_seconds — возраст самой старой записи
+      (LINDEX 0 + event_codec.event_time; для stream — id первой записи);
+    * bot_spylog_last_flush_age_seconds — сколько прошло с последнего flush_logs;
+    * bot_spylog_buffer_pending — для stream: выданные воркерам, но не подтверждённые.
+
+    python metrics_exporter.py
+"""
+import threading
+import time
+from typing import Iterable
+
+from prometheus_client import REGISTRY, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from configs import CONFIG_METRICS, CONFIG_REDIS
+from event_codec import event_time
+from log_handle import log
+from tasks import LAST_FLUSH_KEY, redis_sync_conn
+
+
+def _stream_id_time(entry_id: bytes | str) -> float:
+    ms = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+    return int(ms.split("-", 1)[0]) / 1000
+
+
+class BufferCollector(Collector):
+    def __init__(self, conn=None, key: str | None = None, mode: str | None = None,
+                 last_flush_key: str = LAST_FLUSH_KEY):
+        self.conn = conn if conn is not None else redis_sync_conn
+        self.key = key or CONFIG_REDIS.buffer_key
+        self.mode = mode or CONFIG_REDIS.buffer_mode
+        self.last_flush_key = last_flush_key
+
+    def _read(self) -> dict:
+        pipe = self.conn.pipeline(transaction=False)
+        if self.mode == "stream":
+            pipe.xlen(self.key)
+            pipe.xrange(self.key, count=1)
+        else:
+            pipe.llen(self.key)
+            pipe.lindex(self.key, 0)
+        pipe.get(self.last_flush_key)
+        length, head, last_flush = pipe.execute()
+
+        now = time.time()
+        values = {"length": length}
+        if self.mode == "stream":
+            if head:
+                values["oldest_age"] = now - _stream_id_time(head[0][0])
+            groups = self.conn.xinfo_groups(self.key) if length else []
+            values["pending"] = sum(
+                g["pending"] for g in groups
+                if g["name"] in (CONFIG_REDIS.stream_group, CONFIG_REDIS.stream_group.encode())
+            )
+        elif head is not None:
+            values["oldest_age"] = now - event_time(head)
+        if last_flush is not None:
+            values["last_flush_age"] = now - float(last_flush)
+        return values
+
+    def collect(self) -> Iterable:
+        up = GaugeMetricFamily("bot_spylog_exporter_up", "1 — Redis ответил на последний scrape")
+        try:
+            values = self._read()
+        except Exception as exc:  # noqa: BLE001
+            log.warning(f"[WARN] metrics exporter: redis unavailable: {exc}")
+            up.add_metric([], 0)
+            yield up
+            return
+        up.add_metric([], 1)
+        yield up
+        yield GaugeMetricFamily("bot_spylog_buffer_length", "Записей в spylog-буфере",
+                                value=values["length"])
+        # Пустой буфер — отставания нет
+        yield GaugeMetricFamily("bot_spylog_buffer_oldest_age_seconds", "Возраст самой старой записи буфера",
+                                value=max(values.get("oldest_age", 0.0), 0.0))
+        if "last_flush_age" in values:
+            yield GaugeMetricFamily("bot_spylog_last_flush_age_seconds",
+                                    "Сколько секунд назад отработал flush_logs",
+                                    value=values["last_flush_age"])
+        if "pending" in values:
+            yield GaugeMetricFamily("bot_spylog_buffer_pending", "Записи stream, выданные воркерам без XACK",
+                                    value=values["pending"])
+
+
+if __name__ == "__main__":
+    REGISTRY.register(BufferCollector())
+    start_http_server(CONFIG_METRICS.exporter_port, CONFIG_METRICS.listen)
+    log.info(f"Metrics exporter on :{CONFIG_METRICS.exporter_port}")
+    threading.Event().wait()
@@ -0,0 +1,78 @@
+"""initial schema (бывший Database/init.conf.sql)
+
+Базы, созданные старым init.conf.sql, помечаются этой ревизией:
+    alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-07-01 00:00:00
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE userhub (
+            id            INT PRIMARY KEY,
+            name          TEXT,
+            tstart        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            balance       INT DEFAULT 0,
+            is_reg        BOOLEAN  DEFAULT FALSE,
+            refferer_id   INT,
+            CONSTRAINT fk_userhub_refferer
+                FOREIGN KEY (refferer_id) REFERENCES userhub(id)
+        );
+
+        CREATE TABLE transactions (
+            id      SERIAL PRIMARY KEY,
+            price   INT  NOT NULL,
+            action  TEXT,
+            ts      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE pfunc (
+            id        SERIAL PRIMARY KEY,
+            message   TEXT NOT NULL,
+            cls       TEXT,
+            answer    TEXT NOT NULL,
+            user_id   INT  NOT NULL,
+            ts        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            position  TEXT,
+            pay_id    INT  NOT NULL,
+            CONSTRAINT fk_pfunc_user
+                FOREIGN KEY (user_id) REFERENCES userhub(id),
+            CONSTRAINT fk_pfunc_payment
+                FOREIGN KEY (pay_id)  REFERENCES transactions(id)
+        );
+
+        CREATE TABLE tasks (
+            id        SERIAL PRIMARY KEY,
+            user_id   INT  NOT NULL,
+            ts        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            test      TEXT NOT NULL,
+            date      TIMESTAMP NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            CONSTRAINT fk_tasks_user
+                FOREIGN KEY (user_id) REFERENCES userhub(id)
+        );
+
+        CREATE TABLE spylog (
+            id       SERIAL PRIMARY KEY,
+            user_id  INT  NOT NULL,
+            action   TEXT NOT NULL,
+            ts       TIMESTAMP NOT NULL,
+            CONSTRAINT fk_spylog_user
+                FOREIGN KEY (user_id) REFERENCES userhub(id)
+        );
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE spylog, tasks, pfunc, transactions, userhub")
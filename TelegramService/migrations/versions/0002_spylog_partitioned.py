@@ -0,0 +1,97 @@
+"""spylog: секционирование по ts, action JSONB, event_id
+
+Переносит накопленные данные в новую секционированную таблицу.
+Секции на будущее создаёт Celery-таск spylog.ensure_partitions.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-07-20 00:00:00
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE spylog ADD COLUMN IF NOT EXISTS event_id TEXT;
+        ALTER TABLE spylog RENAME TO spylog_legacy;
+        ALTER SEQUENCE spylog_id_seq RENAME TO spylog_legacy_id_seq;
+        ALTER INDEX IF EXISTS ix_spylog_event_id RENAME TO ix_spylog_legacy_event_id;
+
+        CREATE TABLE spylog (
+            id       BIGSERIAL,
+            user_id  INT   NOT NULL,
+            action   JSONB NOT NULL,
+            ts       TIMESTAMPTZ NOT NULL,
+            event_id TEXT,
+            PRIMARY KEY (id, ts),
+            CONSTRAINT fk_spylog_user
+                FOREIGN KEY (user_id) REFERENCES userhub(id)
+        ) PARTITION BY RANGE (ts);
+
+        -- Страховка для строк вне созданных секций; в норме пустая
+        CREATE TABLE spylog_default PARTITION OF spylog DEFAULT;
+
+        CREATE INDEX ix_spylog_ts_brin  ON spylog USING brin (ts);
+        CREATE INDEX ix_spylog_user_ts  ON spylog (user_id, ts);
+        CREATE INDEX ix_spylog_event_id ON spylog (event_id) WHERE event_id IS NOT NULL;
+
+        -- Помесячные секции под уже накопленные данные и на 3 месяца вперёд
+        DO $$
+        DECLARE
+            m DATE;
+        BEGIN
+            FOR m IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT min(ts) FROM spylog_legacy), now())),
+                    date_trunc('month', now()) + INTERVAL '3 months',
+                    INTERVAL '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF spylog FOR VALUES FROM (%L) TO (%L)',
+                    'spylog_p' || to_char(m, 'YYYYMM'),
+                    m::text || ' 00:00:00+00',
+                    (m + INTERVAL '1 month')::date::text || ' 00:00:00+00'
+                );
+            END LOOP;
+        END $$;
+
+        INSERT INTO spylog (user_id, action, ts, event_id)
+        SELECT user_id, action::jsonb, ts AT TIME ZONE 'UTC', event_id
+        FROM spylog_legacy;
+
+        DROP TABLE spylog_legacy;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE spylog RENAME TO spylog_partitioned;
+        ALTER INDEX ix_spylog_event_id RENAME TO ix_spylog_partitioned_event_id;
+
+        CREATE TABLE spylog (
+            id       SERIAL PRIMARY KEY,
+            user_id  INT  NOT NULL,
+            action   TEXT NOT NULL,
+            ts       TIMESTAMP NOT NULL,
+            event_id TEXT,
+            CONSTRAINT fk_spylog_user
+                FOREIGN KEY (user_id) REFERENCES userhub(id)
+        );
+        CREATE INDEX ix_spylog_event_id ON spylog (event_id) WHERE event_id IS NOT NULL;
+
+        INSERT INTO spylog (user_id, action, ts, event_id)
+        SELECT user_id, action::text, ts AT TIME ZONE 'UTC', event_id
+        FROM spylog_partitioned;
+
+        DROP TABLE spylog_partitioned;
+        """
+    )
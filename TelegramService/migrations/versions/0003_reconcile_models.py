@@ -0,0 +1,87 @@
+"""сверка схемы с ORM-моделями, индексы по FK
+
+* transactions.user_id (FK → userhub), которого не было в SQL;
+* TIMESTAMP → TIMESTAMPTZ (модели и код пишут UTC-aware время);
+* userhub.balance / is_reg NOT NULL, refferer_id ON DELETE SET NULL;
+* индексы по всем FK и частичный индекс tasks(date) WHERE is_active.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-08-01 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+_TS_COLUMNS = (
+    ("userhub", "tstart"),
+    ("transactions", "ts"),
+    ("pfunc", "ts"),
+    ("tasks", "ts"),
+    ("tasks", "date"),
+)
+
+
+def upgrade() -> None:
+    # --- userhub ---
+    op.execute("UPDATE userhub SET balance = 0 WHERE balance IS NULL")
+    op.execute("UPDATE userhub SET is_reg = FALSE WHERE is_reg IS NULL")
+    op.alter_column("userhub", "balance", nullable=False, server_default="0")
+    op.alter_column("userhub", "is_reg", nullable=False, server_default=sa.text("false"))
+    op.drop_constraint("fk_userhub_refferer", "userhub", type_="foreignkey")
+    op.create_foreign_key(
+        "fk_userhub_refferer", "userhub", "userhub", ["refferer_id"], ["id"], ondelete="SET NULL"
+    )
+
+    # --- transactions.user_id ---
+    op.add_column("transactions", sa.Column("user_id", sa.Integer(), nullable=True))
+    op.create_foreign_key("fk_transactions_user", "transactions", "userhub", ["user_id"], ["id"])
+
+    # --- timestamps ---
+    for table, column in _TS_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.TIMESTAMP(timezone=True),
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
+    op.alter_column("userhub", "tstart", server_default=sa.func.now())
+    for table in ("transactions", "pfunc", "tasks"):
+        op.alter_column(table, "ts", server_default=sa.func.now())
+
+    # --- индексы ---
+    op.create_index("ix_userhub_refferer_id", "userhub", ["refferer_id"])
+    op.create_index("ix_transactions_user_ts", "transactions", ["user_id", "ts"])
+    op.create_index("ix_pfunc_user_id", "pfunc", ["user_id"])
+    op.create_index("ix_pfunc_pay_id", "pfunc", ["pay_id"])
+    op.create_index("ix_tasks_user_id", "tasks", ["user_id"])
+    op.create_index(
+        "ix_tasks_active_date", "tasks", ["date"], postgresql_where=sa.text("is_active")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tasks_active_date", "tasks")
+    op.drop_index("ix_tasks_user_id", "tasks")
+    op.drop_index("ix_pfunc_pay_id", "pfunc")
+    op.drop_index("ix_pfunc_user_id", "pfunc")
+    op.drop_index("ix_transactions_user_ts", "transactions")
+    op.drop_index("ix_userhub_refferer_id", "userhub")
+
+    for table, column in _TS_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.TIMESTAMP(timezone=False),
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
+
+    op.drop_constraint("fk_transactions_user", "transactions", type_="foreignkey")
+    op.drop_column("transactions", "user_id")
+
+    op.drop_constraint("fk_userhub_refferer", "userhub", type_="foreignkey")
+    op.create_foreign_key("fk_userhub_refferer", "userhub", "userhub", ["refferer_id"], ["id"])
+    op.alter_column("userhub", "is_reg", nullable=True)
+    op.alter_column("userhub", "balance", nullable=True)
@@ -0,0 +1,38 @@
+"""spylog: уникальный индекс (event_id, ts) вместо частичного по event_id
+
+Дедупликация повторно доставленных записей stream-буфера переезжает в БД
+(INSERT ... ON CONFLICT DO NOTHING). На секционированной таблице уникальный
+индекс обязан включать ключ секционирования, поэтому (event_id, ts); ts
+записи детерминирован — он берётся из самого события.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-08-15 00:00:00
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Дубли, успевшие попасть до появления индекса: оставляем строку с меньшим id
+    op.execute(
+        """
+        DELETE FROM spylog a
+        USING spylog b
+        WHERE a.event_id IS NOT NULL
+          AND a.event_id = b.event_id
+          AND a.ts = b.ts
+          AND a.id > b.id
+        """
+    )
+    op.execute("DROP INDEX IF EXISTS ix_spylog_event_id")
+    op.execute("CREATE UNIQUE INDEX ix_spylog_event_id ON spylog (event_id, ts)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_spylog_event_id")
+    op.execute("CREATE INDEX ix_spylog_event_id ON spylog (event_id) WHERE event_id IS NOT NULL")
@@ -0,0 +1,29 @@
+"""transactions.refund_of: возврат привязан к списанию и не повторяется
+
+Возврат пишется как Transaction с refund_of = id списания; уникальный индекс
+и INSERT ... ON CONFLICT DO NOTHING в database/ledger.py делают повторный
+refund() (или повтор пачки после неоднозначной ошибки commit) no-op.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-08-20 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("refund_of", sa.Integer(), nullable=True))
+    op.create_foreign_key("fk_transactions_refund_of", "transactions", "transactions", ["refund_of"], ["id"])
+    op.create_index("ux_transactions_refund_of", "transactions", ["refund_of"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ux_transactions_refund_of", table_name="transactions")
+    op.drop_constraint("fk_transactions_refund_of", "transactions", type_="foreignkey")
+    op.drop_column("transactions", "refund_of")
@@ -0,0 +1,143 @@
+"""Состояние бота (user_data / chat_data / bot_data) в Redis — общее для всех реплик.
+
+Ключи:
+  * ``{prefix}:user:{id}``, ``{prefix}:chat:{id}`` — JSON ``{"v": версия, "d": данные}`` с TTL
+    (`REDIS_STATE_TTL`), продлевается при каждой записи;
+  * ``{prefix}:bot`` — bot_data без TTL;
+  * ``{prefix}:conv:{name}`` — хэш состояний ConversationHandler.
+
+PTB при старте просит все user_data/chat_data сразу — отдаём пустые словари и
+подгружаем данные конкретного пользователя в refresh_*_data перед обработкой его
+апдейта. Запись — пачкой раз в `REDIS_STATE_UPDATE_INTERVAL` секунд (update_persistence).
+Версия нужна, чтобы refresh не затёр ещё не записанные локальные изменения:
+данные из Redis берутся, только если их записала другая реплика.
+
+В состоянии хранятся только JSON-совместимые мелкие значения: крупные данные
+(фото) в user_data не кладутся.
+"""
+import json
+from typing import Any, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from configs import CONFIG_REDIS
+from tasks import redis_conn as _default_redis
+
+Data = Dict[str, Any]
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RedisPersistence(BasePersistence[Data, Data, Data]):
+    def __init__(
+        self,
+        prefix: str = CONFIG_REDIS.state_prefix,
+        ttl: int = CONFIG_REDIS.state_ttl,
+        update_interval: float = CONFIG_REDIS.state_update_interval,
+        conn=None,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.prefix = prefix
+        self.ttl = ttl
+        self.conn = conn
+        # последняя версия, прочитанная или записанная этой репликой
+        self._versions: Dict[str, int] = {}
+
+    @property
+    def _redis(self):
+        return self.conn or _default_redis
+
+    # -------- user_data / chat_data ----------------------------------
+
+    async def _load(self, key: str, target: Data) -> None:
+        raw = await self._redis.get(key)
+        if raw is None:
+            return
+        record = json.loads(raw)
+        if record["v"] > self._versions.get(key, 0):
+            target.clear()
+            target.update(record["d"])
+            self._versions[key] = record["v"]
+
+    async def _store(self, key: str, data: Data) -> None:
+        if not data:
+            await self._drop(key)
+            return
+        version = self._versions.get(key, 0) + 1
+        await self._redis.set(key, _dumps({"v": version, "d": data}), ex=self.ttl)
+        self._versions[key] = version
+
+    async def _drop(self, key: str) -> None:
+        await self._redis.delete(key)
+        self._versions.pop(key, None)
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def _chat_key(self, chat_id: int) -> str:
+        return f"{self.prefix}:chat:{chat_id}"
+
+    async def get_user_data(self) -> Dict[int, Data]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Data]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Data) -> None:
+        await self._load(self._user_key(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Data) -> None:
+        await self._load(self._chat_key(chat_id), chat_data)
+
+    async def update_user_data(self, user_id: int, data: Data) -> None:
+        await self._store(self._user_key(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: Data) -> None:
+        await self._store(self._chat_key(chat_id), data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop(self._user_key(user_id))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop(self._chat_key(chat_id))
+
+    # -------- bot_data ------------------------------------------------
+
+    async def get_bot_data(self) -> Data:
+        raw = await self._redis.get(f"{self.prefix}:bot")
+        return json.loads(raw) if raw else {}
+
+    async def refresh_bot_data(self, bot_data: Data) -> None:
+        pass
+
+    async def update_bot_data(self, data: Data) -> None:
+        await self._redis.set(f"{self.prefix}:bot", _dumps(data))
+
+    # -------- ConversationHandler ------------------------------------
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        raw = await self._redis.hgetall(f"{self.prefix}:conv:{name}")
+        return {tuple(json.loads(k)): json.loads(v) for k, v in raw.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        conv_key, field = f"{self.prefix}:conv:{name}", _dumps(list(key))
+        if new_state is None:
+            await self._redis.hdel(conv_key, field)
+        else:
+            await self._redis.hset(conv_key, field, _dumps(new_state))
+
+    # -------- callback_data не храним (arbitrary_callback_data выключен) ----
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
@@ -1,51 +1,245 @@
+import asyncio
 from configs import CONFIG_REDIS
-import redis.asyncio as redis
+import redis
+import redis.asyncio as aioredis
 from celery import Celery
 from typing import Callable, Awaitable, Any, Dict
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
-from datetime import datetime, timezone
-import json
+import time
+from event_codec import encode_event
 from log_handle import log
+from metrics import observe_handler
 
 
 CELERY_BROKER = CONFIG_REDIS()
 CELERY_BACKEND = CONFIG_REDIS()
 
 
-redis_conn = redis.from_url(CONFIG_REDIS(), encoding="utf-8", decode_responses=True)
+# Асинхронный клиент — для хендлеров бота (log_event).
+# Без decode_responses: в буфере лежат бинарные записи (см. event_codec).
+redis_conn = aioredis.from_url(CONFIG_REDIS())
+
+# Синхронный клиент с пулом соединений — для Celery-тасков (flush_logs)
+redis_sync_pool = redis.ConnectionPool.from_url(
+    CONFIG_REDIS(),
+    max_connections=CONFIG_REDIS.max_connections,
+)
+redis_sync_conn = redis.Redis(connection_pool=redis_sync_pool)
+
+# Время (unix-секунды) последнего успешного flush_logs — по нему metrics_exporter считает отставание
+LAST_FLUSH_KEY = f"{CONFIG_REDIS.buffer_key}:last_flush"
 
 celery_app = Celery(
     "logger",
     broker=CELERY_BROKER,
     backend=CELERY_BACKEND,
+    include=["database.queries", "database.partitions"],
 )
 
+celery_app.conf.beat_schedule = {
+    "flush-spylog": {
+        "task": "spylog.flush_logs",
+        "schedule": CONFIG_REDIS.flush_interval,
+    },
+    "spylog-ensure-partitions": {
+        "task": "spylog.ensure_partitions",
+        "schedule": 6 * 60 * 60,
+    },
+    "spylog-drop-old-partitions": {
+        "task": "spylog.drop_old_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+
+async def _push_events(conn, raws: list[bytes]) -> None:
+    """Пишет пачку событий в буфер одним round trip-ом."""
+    if CONFIG_REDIS.buffer_mode == "stream":
+        pipe = conn.pipeline(transaction=False)
+        for raw in raws:
+            pipe.xadd(
+                CONFIG_REDIS.buffer_key,
+                {"data": raw},
+                maxlen=CONFIG_REDIS.stream_maxlen,
+                approximate=True,
+            )
+        await pipe.execute()
+    else:
+        await conn.rpush(CONFIG_REDIS.buffer_key, *raws)
+
+
+class EventBatcher:
+    """In-process батчер событий для log_event.
+
+    Хендлер кладёт событие в ограниченную asyncio-очередь и сразу идёт дальше;
+    фоновая задача сбрасывает очередь в Redis одним RPUSH (или pipeline XADD)
+    каждые `max_delay_ms` мс или по набору `max_events` событий.
+
+    Если Redis недоступен, пачка повторяется с экспоненциальной задержкой;
+    тем временем очередь заполняется, и новые события либо отбрасываются
+    (overflow="drop"), либо хендлер ждёт место до `block_timeout` (overflow="block").
+    """
+
+    def __init__(
+        self,
+        max_events: int = CONFIG_REDIS.batch_max_events,
+        max_delay_ms: int = CONFIG_REDIS.batch_max_delay_ms,
+        queue_size: int = CONFIG_REDIS.batch_queue_size,
+        overflow: str = CONFIG_REDIS.batch_overflow,
+        block_timeout: float = 0.05,
+        conn=None,
+    ):
+        self.max_events = max_events
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.conn = conn
+        self._queue: asyncio.Queue[bytes] | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        # счётчики
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run(), name="log_event-batcher")
+
+    async def stop(self) -> None:
+        """Дожидается слива всего, что уже лежит в очереди."""
+        if not self.running:
+            return
+        self._closing = True
+        await self._task
+        self._task = None
+        log.info(f"log_event batcher stopped --- {self.stats()}")
+
+    async def submit(self, raw: bytes) -> None:
+        try:
+            self._queue.put_nowait(raw)
+        except asyncio.QueueFull:
+            if self.overflow == "block":
+                try:
+                    await asyncio.wait_for(self._queue.put(raw), self.block_timeout)
+                except asyncio.TimeoutError:
+                    self.dropped += 1
+                    return
+            else:
+                self.dropped += 1
+                return
+        self.enqueued += 1
+
+    async def _collect(self) -> list[bytes]:
+        """Ждёт первое событие, затем добирает пачку до max_events / max_delay."""
+        batch: list[bytes] = []
+        loop = asyncio.get_running_loop()
+        try:
+            batch.append(await asyncio.wait_for(self._queue.get(), self.max_delay))
+        except asyncio.TimeoutError:
+            return batch
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_events:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: list[bytes]) -> None:
+        delay = 0.1
+        while True:
+            try:
+                await _push_events(self.conn or redis_conn, batch)
+                self.flushed += len(batch)
+                return
+            except Exception as exc:  # noqa: BLE001
+                self.flush_errors += 1
+                if self._closing:
+                    self.dropped += len(batch)
+                    log.warning(f"[WARN] dropping {len(batch)} log events on shutdown: {exc}")
+                    return
+                log.warning(f"[WARN] failed to push log batch to redis, retry in {delay:.1f}s: {exc}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+
+event_batcher = EventBatcher()
+
 
 def log_event(event_name: str) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
-    """Wraps a handler & pushes event metadata to Redis for later flush."""
+    """Wraps a handler & pushes event metadata to Redis for later flush.
+
+    Время хендлера пишется в гистограмму bot_handler_duration_seconds (metrics.py).
+
+    Если запущен `event_batcher`, событие уходит в in-process очередь без
+    ожидания Redis; иначе — пишется напрямую.
+    """
 
     def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
         @wraps(func)
         async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: Any, **kwargs: Any):
+            started = time.perf_counter()
             # Collect minimal info; enrich as needed
-            payload: Dict[str, Any] = {
-                "event": event_name,
-                "user_id": update.effective_user.id if update.effective_user else None,
-                "chat_id": update.effective_chat.id if update.effective_chat else None,
-                "iso_ts": datetime.now(timezone.utc).isoformat(),
+            raw = encode_event(
+                event_name,
+                update.effective_user.id if update.effective_user else None,
+                update.effective_chat.id if update.effective_chat else None,
+                time.time_ns() // 1000,
                 # What exactly triggered (text or callback)
-                "message": update.effective_message.text if update.effective_message else None,
-                "callback_data": update.callback_query.data if update.callback_query else None,
-            }
-            try:
-                await redis_conn.rpush(CONFIG_REDIS.buffer_key, json.dumps(payload))
-            except Exception as exc:  # noqa: BLE001
-                # In prod: log exception via sentry / stderr
-                log.warning(f"[WARN] failed to push log to redis: {exc}")
+                update.effective_message.text if update.effective_message else None,
+                update.callback_query.data if update.callback_query else None,
+            )
+            if event_batcher.running:
+                await event_batcher.submit(raw)
+            else:
+                try:
+                    await _push_events(redis_conn, [raw])
+                except Exception as exc:  # noqa: BLE001
+                    # In prod: log exception via sentry / stderr
+                    log.warning(f"[WARN] failed to push log to redis: {exc}")
             # Call real handler
-            return await func(update, context, *args, **kwargs)
+            try:
+                result = await func(update, context, *args, **kwargs)
+            except Exception:
+                observe_handler(event_name, "error", started)
+                raise
+            observe_handler(event_name, "ok", started)
+            return result
 
         return wrapper
 
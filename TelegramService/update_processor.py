@@ -0,0 +1,77 @@
+"""Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+PTB по умолчанию обрабатывает апдейты строго по одному: медленный хендлер
+(запрос в БД, в Speaker) задерживает всех остальных пользователей. Здесь:
+  * одновременно выполняется не больше `max_concurrent_updates` хендлеров;
+  * апдейты одного чата идут строго по очереди — асинхронный Lock на чат
+    (FIFO, поэтому порядок прихода сохраняется), запись удаляется, когда
+    очередь чата пуста;
+  * апдейты, ждущие свой чат, не занимают слоты выполнения — один
+    «шумный» чат не блокирует остальных. Слот (семафор базового класса PTB)
+    берётся только после Lock-а чата, поэтому process_update переопределён:
+    базовый захватывает семафор до do_process_update, и очередь одного чата
+    выбирала бы все слоты.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def chat_key(update: object) -> Optional[int]:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "waiters")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiters = 0
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chats: Dict[int, _ChatQueue] = {}
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chats)
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        # без семафора базового класса — его берёт do_process_update после Lock-а чата
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = chat_key(update)
+        if key is None:
+            async with self._semaphore:
+                await coroutine
+            return
+
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = _ChatQueue()
+        chat.waiters += 1
+        try:
+            async with chat.lock:
+                async with self._semaphore:
+                    await coroutine
+        finally:
+            chat.waiters -= 1
+            if chat.waiters == 0:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
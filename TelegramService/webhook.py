@@ -0,0 +1,95 @@
+"""Приём апдейтов Telegram через webhook (ASGI, uvicorn).
+
+    BOT_MODE=webhook BOT_WEBHOOK_URL=https://bot.example.com BOT_WEBHOOK_SECRET=... python main.py
+
+Telegram шлёт POST на {BOT_WEBHOOK_URL}{BOT_WEBHOOK_PATH} с заголовком
+X-Telegram-Bot-Api-Secret-Token; без верного секрета — 403, без секрета в
+конфиге сервер не стартует (эндпоинт публичный). Тело, из которого не
+собирается Update, — 400. Апдейт кладётся в
+update_queue приложения; очередь ограничена, поэтому при перегрузке запрос
+Telegram ждёт места, а не растит память (Telegram держит не больше
+max_connections одновременных запросов).
+"""
+import hmac
+import json
+import logging
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+from configs import CONFIG_WEBHOOK
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_asgi(application: Application) -> Starlette:
+    secret = CONFIG_WEBHOOK.secret
+    if not secret:
+        raise RuntimeError("BOT_WEBHOOK_SECRET is required in webhook mode")
+
+    async def telegram_update(request: Request) -> Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return Response(status_code=403)
+        try:
+            data = json.loads(await request.body())
+            if not isinstance(data, dict):
+                raise ValueError("update must be a JSON object")
+            update = Update.de_json(data, application.bot)
+        except Exception as exc:  # noqa: BLE001
+            log.warning(f"malformed update rejected: {exc}")
+            return Response(status_code=400)
+        await application.update_queue.put(update)
+        return Response()
+
+    async def health(request: Request) -> JSONResponse:
+        return JSONResponse({"running": application.running, "queued": application.update_queue.qsize()})
+
+    return Starlette(routes=[
+        Route(CONFIG_WEBHOOK.path, telegram_update, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+
+
+async def run_webhook(application: Application, allowed_updates: list[str]) -> None:
+    """Аналог Application.run_webhook, но на своём ASGI-сервере."""
+    import uvicorn
+
+    # build_asgi первым: без секрета отказываемся стартовать до setWebhook
+    asgi = build_asgi(application)
+    server = uvicorn.Server(uvicorn.Config(
+        asgi,
+        host=CONFIG_WEBHOOK.listen,
+        port=CONFIG_WEBHOOK.port,
+        timeout_keep_alive=CONFIG_WEBHOOK.keep_alive,
+        log_level="info",
+    ))
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    if CONFIG_WEBHOOK.url:
+        await application.bot.set_webhook(
+            url=f"{CONFIG_WEBHOOK.url}{CONFIG_WEBHOOK.path}",
+            secret_token=CONFIG_WEBHOOK.secret,
+            max_connections=CONFIG_WEBHOOK.max_connections,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=CONFIG_WEBHOOK.drop_pending_updates,
+        )
+    else:
+        log.warning("BOT_WEBHOOK_URL is not set, setWebhook skipped")
+    await application.start()
+    try:
+        await server.serve()
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
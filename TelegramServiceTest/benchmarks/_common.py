@@ -0,0 +1,29 @@
+"""Общие утилиты для бенчмарков TelegramServiceTest.
+
+Скрипты запускаются из каталога TelegramServiceTest:
+    python -m benchmarks.<name> [--опции]
+"""
+import statistics
+from typing import Iterable, Optional
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """q-й перцентиль (0..100) по методу nearest-rank."""
+    data = sorted(samples)
+    if not data:
+        return 0.0
+    k = max(0, min(len(data) - 1, int(round(q / 100 * len(data))) - 1))
+    return data[k]
+
+
+def report(title: str, latencies_s: list[float], total_s: Optional[float] = None) -> None:
+    """Печатает p50/p99/mean в миллисекундах (и rps, если известна общая длительность)."""
+    ms = [x * 1000 for x in latencies_s]
+    line = (
+        f"{title:<28} n={len(ms):<6} "
+        f"p50={percentile(ms, 50):8.2f}ms  p99={percentile(ms, 99):8.2f}ms  "
+        f"mean={statistics.fmean(ms) if ms else 0:8.2f}ms"
+    )
+    if total_s:
+        line += f"  rps={len(ms) / total_s:10.1f}"
+    print(line)
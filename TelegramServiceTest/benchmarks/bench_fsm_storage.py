@@ -0,0 +1,138 @@
+"""FSM-состояние диалога «вопрос → подтверждение»: задержка get/set и память на диалог.
+
+Состояние — ровно то, что пишут хендлеры main.py: тема, вопрос, ссылки на фото
+(image_id на Speaker и file_id в Telegram, у --photo-ratio диалогов), итог
+валидации и request_id спекуляции. Байты фото в состояние не попадают.
+
+Варианты:
+  * memory — MemoryStorage (одна реплика, режим разработки);
+  * redis  — RedisStorage с TTL из STATE_TTL, как storage.build_storage.
+
+Каждый из --conversations диалогов проходит цикл бота: выбор темы (update_data +
+set_state), вопрос (get_data, update_data, set_state), подтверждение (get_state +
+get_data). Память для Redis — MEMORY USAGE по ключам состояния; для MemoryStorage —
+tracemalloc.
+
+    python -m benchmarks.bench_fsm_storage --redis redis://localhost:6379/15 --conversations 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+import tracemalloc
+
+from aiogram.fsm.storage.base import DefaultKeyBuilder, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks._common import report
+from configs import STATE_CONFIGS
+
+PREFIX = "bench_fsm"
+
+
+def conversation_key(i: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=10_000 + i, user_id=10_000 + i)
+
+
+def question_data(i: int, with_photo: bool) -> dict:
+    """Поля, которые got_q кладёт в состояние перед подтверждением."""
+    image_id = hashlib.sha256(os.urandom(32)).hexdigest() if with_photo else None
+    # file_id Telegram — непрозрачная строка около 80 символов
+    file_id = "AgACAgIAAxkBAAI" + os.urandom(48).hex()[:64] if with_photo else None
+    return {
+        "query": f"Вопрос {i}: что надеть на свидание?",
+        "image_id": image_id,
+        "photo_file_id": file_id,
+        "true_topic": "Стиль",
+        "cost": 2,
+        "request_id": os.urandom(16).hex(),
+    }
+
+
+async def run_variant(title: str, storage, n: int, photo_ratio: float, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    set_lat: list[float] = []
+    get_lat: list[float] = []
+    rnd = random.Random(0)
+    photos = [rnd.random() < photo_ratio for _ in range(n)]
+
+    async def conversation(i: int) -> None:
+        key = conversation_key(i)
+        async with sem:
+            t0 = time.perf_counter()
+            await storage.update_data(key, {"topic": "Стиль"})
+            await storage.set_state(key, "St:wait_q")
+            await storage.get_data(key)
+            await storage.update_data(key, question_data(i, photos[i]))
+            await storage.set_state(key, "St:wait_ok")
+            set_lat.append(time.perf_counter() - t0)
+
+        async with sem:
+            t0 = time.perf_counter()
+            await storage.get_state(key)
+            await storage.get_data(key)
+            get_lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(n)))
+    total = time.perf_counter() - t0
+    report(f"{title} set", set_lat, total)
+    report(f"{title} get", get_lat)
+
+
+async def redis_memory(redis, pattern: str) -> tuple[int, int]:
+    keys, used = 0, 0
+    async for key in redis.scan_iter(match=pattern, count=1000):
+        keys += 1
+        used += await redis.memory_usage(key, samples=0) or 0
+    return keys, used
+
+
+async def cleanup(redis) -> None:
+    async for key in redis.scan_iter(match=f"{PREFIX}*", count=1000):
+        await redis.delete(key)
+
+
+async def run(args) -> None:
+    n = args.conversations
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    storage = MemoryStorage()
+    await run_variant("memory", storage, n, args.photo_ratio, args.concurrency)
+    after = tracemalloc.take_snapshot()
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    tracemalloc.stop()
+    print(f"{'':<28} memory per conversation={used / n / 1024:.2f} KiB")
+    del storage
+
+    if not args.redis:
+        print("--redis не задан: вариант с Redis пропущен")
+        return
+
+    from aiogram.fsm.storage.redis import RedisStorage
+    from redis.asyncio import BlockingConnectionPool, Redis
+
+    redis = Redis(connection_pool=BlockingConnectionPool.from_url(args.redis, max_connections=args.pool))
+    try:
+        await cleanup(redis)
+        storage = RedisStorage(redis, key_builder=DefaultKeyBuilder(prefix=PREFIX),
+                               state_ttl=STATE_CONFIGS.state_ttl, data_ttl=STATE_CONFIGS.state_ttl)
+        await run_variant("redis", storage, n, args.photo_ratio, args.concurrency)
+        state_keys, state_bytes = await redis_memory(redis, f"{PREFIX}:*")
+        print(f"{'':<28} state per conversation={state_bytes / n:.0f} B ({state_keys} keys)")
+    finally:
+        await cleanup(redis)
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis", default=os.getenv("STATE_REDIS_URL"))
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--photo-ratio", type=float, default=0.5, help="доля вопросов с фото")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--pool", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,150 @@
+"""Передача фото Telegram → Speaker: BytesIO + base64 в JSON (как было) vs поток в multipart.
+
+Родительский процесс поднимает заглушки Telegram Bot API (getFile и отдача файла)
+и Speaker (/chat_ai/images, /chat_ai/validation). Каждый режим запускается в
+отдельном процессе, чтобы пиковый RSS (ru_maxrss) не смешивался:
+  * base64 — get_file → download_file в BytesIO → getvalue → base64 → JSON;
+  * stream — get_file → stream_content → multipart в /chat_ai/images → image_id в JSON.
+Печатаются задержка «фото → ответ валидации» и прирост пикового RSS.
+
+    python -m benchmarks.bench_photo_handoff --photo-mb 8 -n 20 -c 4
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from io import BytesIO
+
+from aiohttp import web
+
+from benchmarks._common import report
+
+TOKEN = "123456:bench"
+FILE_PATH = "photos/file_0.jpg"
+RESULT = {"is_valid": True, "true_topic": "Стиль", "cost": 2}
+
+
+# ---------- заглушки (родительский процесс) --------------------------------
+
+def stub_servers(photo: bytes) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+
+    async def get_file(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "result": {
+            "file_id": "bench", "file_unique_id": "bench", "file_size": len(photo), "file_path": FILE_PATH,
+        }})
+
+    async def file(request: web.Request) -> web.Response:
+        return web.Response(body=photo, content_type="image/jpeg")
+
+    async def images(request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        part = await reader.next()
+        digest, size = hashlib.sha256(), 0
+        while chunk := await part.read_chunk():
+            digest.update(chunk)
+            size += len(chunk)
+        return web.json_response({"image_id": digest.hexdigest(), "original_bytes": size})
+
+    async def validation(request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response(RESULT)
+
+    app.router.add_route("*", f"/bot{TOKEN}/getFile", get_file)
+    app.router.add_get(f"/file/bot{TOKEN}/{FILE_PATH}", file)
+    app.router.add_post("/chat_ai/images", images)
+    app.router.add_post("/chat_ai/validation", validation)
+    return app
+
+
+# ---------- клиент (дочерний процесс) ---------------------------------------
+
+def max_rss_kib() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def client(args) -> None:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from speaker_client import SpeakerClient
+
+    base = f"http://127.0.0.1:{args.port}"
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+    speaker = SpeakerClient(base)
+    await speaker.start()
+
+    async def via_base64(i: int) -> None:
+        file = await bot.get_file("bench")
+        buf = BytesIO()
+        await bot.download_file(file.file_path, buf)
+        b64 = base64.b64encode(buf.getvalue()).decode()
+        await speaker.post_json("/chat_ai/validation", {"chosen_topic": "Стиль", "query": f"q{i}",
+                                                        "base64_image": b64}, kind="validation")
+
+    async def via_stream(i: int) -> None:
+        file = await bot.get_file("bench")
+        url = bot.session.api.file_url(bot.token, file.file_path)
+        info = await speaker.upload_image(bot.session.stream_content(url, timeout=60))
+        await speaker.post_json("/chat_ai/validation", {"chosen_topic": "Стиль", "query": f"q{i}",
+                                                        "image_id": info["image_id"]}, kind="validation")
+
+    call = via_base64 if args.child == "base64" else via_stream
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - t0)
+
+    baseline = max_rss_kib()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.n)))
+    total = time.perf_counter() - t0
+    peak = max_rss_kib()
+    await speaker.close()
+    await bot.session.close()
+    print(json.dumps({"latencies": latencies, "total": total, "rss_delta_kib": peak - baseline}))
+
+
+# ---------- запуск ------------------------------------------------------------
+
+async def run(args) -> None:
+    photo = os.urandom(int(args.photo_mb * 1024 * 1024))
+    runner = web.AppRunner(stub_servers(photo), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    try:
+        for mode in ("base64", "stream"):
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "benchmarks.bench_photo_handoff", "--child", mode,
+                "--port", str(args.port), "-n", str(args.n), "-c", str(args.concurrency),
+                stdout=asyncio.subprocess.PIPE,
+            )
+            out, _ = await proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(f"{mode} client failed")
+            result = json.loads(out.decode().strip().splitlines()[-1])
+            report(f"{mode} ({args.photo_mb:g} MB)", result["latencies"], result["total"])
+            print(f"{'':<28} peak RSS +{result['rss_delta_kib'] / 1024:.1f} MiB")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--photo-mb", type=float, default=8)
+    parser.add_argument("-n", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--child", choices=["base64", "stream"], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    asyncio.run(client(args) if args.child else run(args))
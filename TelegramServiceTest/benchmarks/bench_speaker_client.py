@@ -0,0 +1,109 @@
+"""Вызовы Speaker из бота: новая ClientSession на запрос (как было) vs SpeakerClient.
+
+Поднимает локальную заглушку Speaker на aiohttp.web: /chat_ai/validation отвечает
+JSON через --latency мс, доля --fail-rate ответов — 503 (проверка повторов).
+Печатает rps, p50/p99 и сколько TCP-соединений увидел сервер.
+
+    python -m benchmarks.bench_speaker_client -n 5000 -c 64 --latency 5
+    python -m benchmarks.bench_speaker_client -n 5000 -c 64 --fail-rate 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks._common import report
+from speaker_client import IDEMPOTENCY_HEADER, SpeakerClient
+
+RESULT = {"is_valid": True, "true_topic": "Стиль", "cost": 2, "request_id": "", "speculative": False}
+
+
+def stub_speaker(latency: float, fail_rate: float) -> web.Application:
+    app = web.Application()
+    app["connections"] = set()
+    app["keys"] = {}
+
+    async def validation(request: web.Request) -> web.Response:
+        app["connections"].add(id(request.transport))
+        payload = await request.json()
+        key = request.headers.get(IDEMPOTENCY_HEADER, "")
+        app["keys"][key] = app["keys"].get(key, 0) + 1
+        await asyncio.sleep(latency)
+        if random.random() < fail_rate:
+            return web.json_response({"detail": "upstream busy"}, status=503)
+        return web.json_response({**RESULT, "true_topic": payload["chosen_topic"]})
+
+    app.router.add_post("/chat_ai/validation", validation)
+    return app
+
+
+def payload(i: int) -> dict:
+    return {"chosen_topic": "Стиль", "query": f"Вопрос {i}: что надеть на свидание?", "base64_image": None}
+
+
+async def session_per_request(base: str, i: int) -> dict:
+    async with aiohttp.ClientSession() as s:
+        async with s.post(f"{base}/chat_ai/validation", json=payload(i), timeout=60) as r:
+            r.raise_for_status()
+            return await r.json()
+
+
+async def measure(title: str, call, n: int, concurrency: int, app: web.Application) -> None:
+    app["connections"].clear()
+    app["keys"].clear()
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await call(i)
+            except aiohttp.ClientError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    report(title, latencies, time.perf_counter() - t0)
+    attempts = sum(app["keys"].values())
+    print(f"{'':<28} errors={errors} connections={len(app['connections'])} server requests={attempts}")
+
+
+async def run(args) -> None:
+    app = stub_speaker(args.latency / 1000, args.fail_rate)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        await measure("session per request", lambda i: session_per_request(base, i), args.n, args.concurrency, app)
+
+        client = SpeakerClient(base, retries=args.retries, backoff_base=0.01)
+        await client.start()
+        try:
+            await measure("SpeakerClient (pooled)",
+                          lambda i: client.post_json("/chat_ai/validation", payload(i), kind="validation"),
+                          args.n, args.concurrency, app)
+            print(f"{'':<28} client={client.stats()}")
+        finally:
+            await client.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=5, help="задержка заглушки, мс")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))
@@ -1,8 +1,40 @@
 import os
 
 
+def _parse_timeouts(raw: str) -> dict:
+    """"validation=30,inference=120" -> {"validation": 30.0, "inference": 120.0}"""
+    out = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            out[name.strip()] = float(value)
+    return out
+
+
 class SpeakerConfigs:
     url: str = os.getenv("API_SPEAKER_URL")
+    # Пул соединений к Speaker (speaker_client.py): всего и на один хост, keep-alive и кэш DNS
+    pool_limit: int = int(os.getenv("API_SPEAKER_POOL_LIMIT", "100"))
+    pool_limit_per_host: int = int(os.getenv("API_SPEAKER_POOL_LIMIT_PER_HOST", "0"))
+    keepalive: float = float(os.getenv("API_SPEAKER_KEEPALIVE", "30"))
+    dns_ttl: int = int(os.getenv("API_SPEAKER_DNS_TTL", "300"))
+    connect_timeout: float = float(os.getenv("API_SPEAKER_CONNECT_TIMEOUT", "5"))
+    # Таймаут чтения по типу вызова; для stream — пауза между строками, а не весь ответ
+    read_timeouts: dict = _parse_timeouts(
+        os.getenv("API_SPEAKER_READ_TIMEOUTS", "validation=30,inference=120,stream=60,upload=60,control=10")
+    )
+    # Повторы при обрыве соединения и 502/503/504, с одним Idempotency-Key на все попытки
+    retries: int = int(os.getenv("API_SPEAKER_RETRIES", "2"))
+    backoff_base: float = float(os.getenv("API_SPEAKER_BACKOFF_BASE", "0.2"))
+    # потоковый ответ /chat_ai/general_inference/stream с правкой одного сообщения
+    stream: bool = os.getenv("API_SPEAKER_STREAM", "1") == "1"
+    # не чаще одной правки сообщения за интервал (лимиты Telegram на editMessageText)
+    edit_interval: float = float(os.getenv("API_SPEAKER_EDIT_INTERVAL", "1.0"))
+    # ответ считается на Speaker сразу после валидации, «Да» только забирает его
+    speculative: bool = os.getenv("API_SPEAKER_SPECULATIVE", "1") == "1"
+    # Из PhotoSize берётся наименьший с короткой стороной не меньше этой
+    # (Speaker всё равно ужмёт до IMAGE_MAX_SHORT_SIDE)
+    photo_min_side: int = int(os.getenv("API_SPEAKER_PHOTO_MIN_SIDE", "768"))
 
 
 SPEAKER_CONFIGS = SpeakerConfigs()
@@ -13,3 +45,14 @@ class BotConfigs:
 
 
 BOT_CONFIGS = BotConfigs()
+
+
+class StateConfigs:
+    # Redis для FSM; пусто — MemoryStorage (одна реплика, теряется при рестарте)
+    redis_url: str = os.getenv("STATE_REDIS_URL")
+    max_connections: int = int(os.getenv("STATE_REDIS_MAX_CONNECTIONS", "20"))
+    # состояние брошенного диалога живёт сутки
+    state_ttl: int = int(os.getenv("STATE_TTL", "86400"))
+
+
+STATE_CONFIGS = StateConfigs()
@@ -1,20 +1,22 @@
-import base64
+import asyncio
 import logging
 import os
-from io import BytesIO
+import time
 from typing import Dict, Any, Optional
 
 import aiohttp
 from aiogram import Bot, Dispatcher, F, Router
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import (
     InlineKeyboardButton, InlineKeyboardMarkup,
-    CallbackQuery, Message,
+    CallbackQuery, Message, PhotoSize,
 )
 from configs import BOT_CONFIGS, SPEAKER_CONFIGS
+from speaker_client import new_idempotency_key, speaker
+from storage import build_storage
 from aiogram import Bot
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
@@ -37,18 +39,79 @@ bot = Bot(
     BOT_CONFIGS.token,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)  # ← новинка 3.7
 )
-storage = MemoryStorage()
+storage = build_storage()
 dp = Dispatcher(storage=storage)
 router = Router()
 dp.include_router(router)
 
 
 # ---------- helpers ---------------------------------------------------------
-async def post_json(path: str, payload: Dict[str, Any]):
-    async with aiohttp.ClientSession() as s:
-        async with s.post(f"{SPEAKER_CONFIGS.url}{path}", json=payload, timeout=60) as r:
-            r.raise_for_status()
-            return await r.json()
+# пул соединений к Speaker живёт всё время работы диспетчера
+dp.startup.register(speaker.start)
+dp.shutdown.register(speaker.close)
+
+
+TG_TEXT_LIMIT = 4096
+
+
+class ProgressiveMessage:
+    """
+    Одно сообщение, которое дописывается по мере генерации.
+
+    Правки идут не чаще `interval` секунд; промежуточный текст без parse_mode,
+    чтобы незакрытые теги не ломали editMessageText. Текст длиннее лимита
+    Telegram переносится в следующее сообщение.
+    """
+
+    def __init__(self, anchor: Message, interval: float):
+        self.anchor = anchor
+        self.interval = interval
+        self.text = ""
+        self._offset = 0          # начало текста текущего сообщения
+        self._msg: Optional[Message] = None
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def start(self, placeholder: str = "Думаю…") -> None:
+        self._msg = await self.anchor.answer(placeholder, parse_mode=None)
+        self._last_edit = time.monotonic()
+
+    async def append(self, delta: str) -> None:
+        self.text += delta
+        if time.monotonic() - self._last_edit >= self.interval:
+            await self._flush(final=False)
+
+    async def finish(self, text: Optional[str] = None) -> None:
+        if text is not None:
+            self.text = text
+        await self._flush(final=True)
+
+    async def _flush(self, final: bool) -> None:
+        while len(self.text) - self._offset > TG_TEXT_LIMIT:
+            chunk = self.text[self._offset:self._offset + TG_TEXT_LIMIT]
+            await self._edit(chunk, final=True)
+            self._offset += TG_TEXT_LIMIT
+            self._msg = await self.anchor.answer("…", parse_mode=None)
+            self._shown = "…"
+        await self._edit(self.text[self._offset:], final=final)
+
+    async def _edit(self, text: str, final: bool) -> None:
+        self._last_edit = time.monotonic()
+        if not text or text == self._shown:
+            return
+        try:
+            if final:
+                try:
+                    await self._msg.edit_text(text)
+                except TelegramBadRequest:
+                    # ответ модели не всегда валидный HTML
+                    await self._msg.edit_text(text, parse_mode=None)
+            else:
+                await self._msg.edit_text(text, parse_mode=None)
+            self._shown = text
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
 
 
 def kb_topics() -> InlineKeyboardMarkup:
@@ -69,13 +132,37 @@ def kb_confirm() -> InlineKeyboardMarkup:
     )
 
 
-async def photo_to_b64(message: Message) -> Optional[str]:
-    if not message.photo:
+def pick_photo(sizes: list[PhotoSize], min_side: int) -> PhotoSize:
+    """Наименьший PhotoSize с короткой стороной >= min_side; если такого нет — самый большой."""
+    by_area = sorted(sizes, key=lambda s: s.width * s.height)
+    for size in by_area:
+        if min(size.width, size.height) >= min_side:
+            return size
+    return by_area[-1]
+
+
+async def upload_photo(file_id: str) -> str:
+    """
+    Фото из Telegram потоком в Speaker (POST /chat_ai/images) — без BytesIO и base64.
+    Возвращает image_id, который дальше ходит вместо байт.
+    """
+    file = await bot.get_file(file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    info = await speaker.upload_image(bot.session.stream_content(url, timeout=60))
+    return info["image_id"]
+
+
+async def live_image_id(d: Dict[str, Any]) -> Optional[str]:
+    """image_id из FSM; если на Speaker он истёк — загружаем фото заново по file_id."""
+    if not d.get("image_id"):
         return None
-    file = await bot.get_file(message.photo[-1].file_id)
-    buf = BytesIO()
-    await bot.download_file(file.file_path, buf)
-    return base64.b64encode(buf.getvalue()).decode()
+    try:
+        await speaker.get_json(f"/chat_ai/images/{d['image_id']}")
+        return d["image_id"]
+    except aiohttp.ClientResponseError as e:
+        if e.status != 404:
+            raise
+    return await upload_photo(d["photo_file_id"])
 
 
 # ---------- FSM -------------------------------------------------------------
@@ -111,11 +198,17 @@ async def got_q(msg: Message, state):
         return
 
     data = await state.get_data()
-    b64 = await photo_to_b64(msg)
+    photo = pick_photo(msg.photo, SPEAKER_CONFIGS.photo_min_side) if msg.photo else None
 
-    payload = dict(chosen_topic=data["topic"], query=text, base64_image=b64)
+    path = "/chat_ai/validation"
+    request_id = new_idempotency_key()
     try:
-        v = await post_json("/chat_ai/validation", payload)
+        image_id = await upload_photo(photo.file_id) if photo else None
+        payload = dict(chosen_topic=data["topic"], query=text, image_id=image_id)
+        if SPEAKER_CONFIGS.speculative:
+            # тот же ключ, что и Idempotency-Key: повтор запроса не запустит второй ответ
+            path, payload["request_id"] = "/chat_ai/validation/speculative", request_id
+        v = await speaker.post_json(path, payload, kind="validation", idempotency_key=request_id)
     except Exception as e:
         logging.exception("validation")
         await msg.answer("Ошибка сервиса, попробуйте позже.")
@@ -126,9 +219,11 @@ async def got_q(msg: Message, state):
         await state.clear()
         return
 
+    # в FSM только ссылки на фото: image_id на Speaker и file_id в Telegram
     await state.update_data(
-        query=text, base64=b64,
-        true_topic=v["true_topic"], cost=v["cost"]
+        query=text, image_id=image_id, photo_file_id=photo.file_id if photo else None,
+        true_topic=v["true_topic"], cost=v["cost"],
+        request_id=v.get("request_id") if v.get("speculative") else None,
     )
     await state.set_state(St.wait_ok)
 
@@ -141,6 +236,13 @@ async def got_q(msg: Message, state):
 
 @router.callback_query(St.wait_ok, F.data == "no")
 async def cancel(cb: CallbackQuery, state):
+    d = await state.get_data()
+    if d.get("request_id"):
+        try:
+            await speaker.post_json(f"/chat_ai/speculative/{d['request_id']}/cancel", {})
+        except Exception:
+            # не критично: на Speaker результат истечёт сам
+            logging.warning("speculative cancel failed", exc_info=True)
     await cb.message.answer("🚫 Отменено.")
     await state.clear()
     await cb.answer()
@@ -151,11 +253,44 @@ async def proceed(cb: CallbackQuery, state):
     d = await state.get_data()
     await cb.answer("Думаю…")
 
+    if d.get("request_id"):
+        t0 = time.perf_counter()
+        try:
+            # confirm ждёт фоновый ответ и забирает его — повтор после отправки вернул бы 404
+            r = await speaker.post_json(f"/chat_ai/speculative/{d['request_id']}/confirm", {},
+                                        kind="inference", idempotent=False)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 404:
+                logging.exception("speculative confirm")
+            r = None  # результата нет — считаем обычным путём
+        except Exception:
+            logging.exception("speculative confirm")
+            r = None
+        if r is not None:
+            logging.info("inference speculative confirm->answer=%.0fms", (time.perf_counter() - t0) * 1000)
+            await cb.message.answer(r["response_text"])
+            await state.clear()
+            return
+
+    # фото нужно только здесь: спекулятивный ответ уже посчитан на Speaker
+    try:
+        image_id = await live_image_id(d)
+    except Exception:
+        logging.exception("photo reupload")
+        await cb.message.answer("Ошибка ИИ. Попробуйте позже.")
+        await state.clear()
+        return
     payload = dict(
-        topic=d["true_topic"], query=d["query"], base64_image=d["base64"]
+        topic=d["true_topic"], query=d["query"], image_id=image_id
     )
+
+    if SPEAKER_CONFIGS.stream:
+        await answer_stream(cb.message, payload)
+        await state.clear()
+        return
+
     try:
-        r = await post_json("/chat_ai/general_inference", payload)
+        r = await speaker.post_json("/chat_ai/general_inference", payload, kind="inference")
     except Exception as e:
         logging.exception("inference")
         await cb.message.answer("Ошибка ИИ. Попробуйте позже.")
@@ -166,9 +301,38 @@ async def proceed(cb: CallbackQuery, state):
     await state.clear()
 
 
+async def answer_stream(anchor: Message, payload: Dict[str, Any]) -> None:
+    out = ProgressiveMessage(anchor, SPEAKER_CONFIGS.edit_interval)
+    t0 = time.perf_counter()
+    ttft = None
+    try:
+        await out.start()
+        async for ev in speaker.post_stream("/chat_ai/general_inference/stream", payload):
+            if ev["type"] == "delta":
+                if ttft is None:
+                    ttft = (time.perf_counter() - t0) * 1000
+                    logging.info("inference ttft=%.0fms", ttft)
+                await out.append(ev["text"])
+            elif ev["type"] == "done":
+                await out.finish(ev["response_text"])
+                logging.info("inference total=%.0fms speaker_ttft=%.0fms cached=%s",
+                             (time.perf_counter() - t0) * 1000, ev.get("ttft_ms") or 0, ev.get("cached"))
+                return
+            elif ev["type"] == "error":
+                raise RuntimeError(ev.get("message"))
+        raise RuntimeError("stream closed without done")
+    except Exception:
+        logging.exception("inference stream")
+        if out.text:
+            await out.finish()
+        await anchor.answer("Ошибка ИИ. Попробуйте позже.")
+
+
 async def main():
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await storage.close()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,177 @@
+"""Клиент Speaker: одна ClientSession с пулом keep-alive соединений на весь процесс бота.
+
+Создаётся при старте диспетчера (`start`) и закрывается при остановке (`close`).
+Таймауты — по типу вызова (API_SPEAKER_READ_TIMEOUTS): validation, inference,
+stream (пауза между строками NDJSON), upload (фото), control (cancel и прочие короткие вызовы).
+
+Повторы:
+  * соединение не установлено — повтор безопасен для любого вызова;
+  * обрыв/таймаут после отправки и 502/503/504 — только для идемпотентных вызовов.
+Все попытки одного вызова идут с одним Idempotency-Key; для спекулятивной
+валидации он же передаётся как request_id, и повтор не запускает второй ответ.
+"""
+import asyncio
+import random
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+
+import aiohttp
+import orjson
+
+from configs import SPEAKER_CONFIGS
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+RETRY_STATUSES = frozenset({502, 503, 504})
+MAX_RETRY_AFTER = 5.0
+
+
+def new_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+class SpeakerClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = SPEAKER_CONFIGS.url,
+        limit: int = SPEAKER_CONFIGS.pool_limit,
+        limit_per_host: int = SPEAKER_CONFIGS.pool_limit_per_host,
+        keepalive: float = SPEAKER_CONFIGS.keepalive,
+        dns_ttl: int = SPEAKER_CONFIGS.dns_ttl,
+        connect_timeout: float = SPEAKER_CONFIGS.connect_timeout,
+        read_timeouts: Optional[Dict[str, float]] = None,
+        retries: int = SPEAKER_CONFIGS.retries,
+        backoff_base: float = SPEAKER_CONFIGS.backoff_base,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeouts = read_timeouts if read_timeouts is not None else SPEAKER_CONFIGS.read_timeouts
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.counters = {"requests": 0, "retries": 0, "errors": 0}
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            # меньше keep-alive сервера (SPEAKER_KEEP_ALIVE), чтобы не писать в закрытое им соединение
+            keepalive_timeout=self.keepalive,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+    def _timeout(self, kind: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeouts.get(kind, 60),
+        )
+
+    def _delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return self.backoff_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+    async def _send(self, path: str, payload: Optional[Dict[str, Any]], kind: str,
+                    key: str, idempotent: bool) -> aiohttp.ClientResponse:
+        """POST с JSON-телом; без payload — GET."""
+        if self._session is None:
+            raise RuntimeError("SpeakerClient is not started")
+        method, body = ("GET", None) if payload is None else ("POST", orjson.dumps(payload))
+        headers = {"Content-Type": "application/json", IDEMPOTENCY_HEADER: key}
+        timeout = self._timeout(kind)
+        self.counters["requests"] += 1
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                r = await self._session.request(method, f"{self.base_url}{path}", data=body,
+                                                headers=headers, timeout=timeout)
+            except aiohttp.ClientConnectorError:
+                # до сервера запрос не дошёл
+                if attempt >= self.retries:
+                    self.counters["errors"] += 1
+                    raise
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, asyncio.TimeoutError):
+                if not idempotent or attempt >= self.retries:
+                    self.counters["errors"] += 1
+                    raise
+            else:
+                if r.status not in RETRY_STATUSES or not idempotent or attempt >= self.retries:
+                    if r.status >= 400:
+                        self.counters["errors"] += 1
+                        r.release()
+                        r.raise_for_status()
+                    return r
+                retry_after = r.headers.get("Retry-After")
+                r.release()
+            attempt += 1
+            self.counters["retries"] += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+
+    async def post_json(self, path: str, payload: Dict[str, Any], kind: str = "control",
+                        idempotency_key: Optional[str] = None, idempotent: bool = True) -> Any:
+        r = await self._send(path, payload, kind, idempotency_key or new_idempotency_key(), idempotent)
+        try:
+            return orjson.loads(await r.read())
+        finally:
+            r.release()
+
+    async def get_json(self, path: str, kind: str = "control") -> Any:
+        r = await self._send(path, None, kind, new_idempotency_key(), True)
+        try:
+            return orjson.loads(await r.read())
+        finally:
+            r.release()
+
+    async def upload_image(self, chunks: AsyncIterable[bytes], filename: str = "photo.jpg") -> Dict[str, Any]:
+        """
+        POST /chat_ai/images (multipart): байты уходят в сокет по мере чтения `chunks`,
+        целиком в памяти бота фото не собирается. Тело одноразовое — без повторов,
+        при ошибке вызывающий заново открывает источник.
+        """
+        if self._session is None:
+            raise RuntimeError("SpeakerClient is not started")
+        form = aiohttp.FormData()
+        form.add_field("image", chunks, filename=filename, content_type="image/jpeg")
+        self.counters["requests"] += 1
+        try:
+            async with self._session.post(f"{self.base_url}/chat_ai/images", data=form,
+                                          timeout=self._timeout("upload")) as r:
+                r.raise_for_status()
+                return orjson.loads(await r.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.counters["errors"] += 1
+            raise
+
+    async def post_stream(self, path: str, payload: Dict[str, Any],
+                          idempotency_key: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """NDJSON-поток: по одному событию на строку. Повтор — только до начала потока."""
+        r = await self._send(path, payload, "stream", idempotency_key or new_idempotency_key(), True)
+        try:
+            async for line in r.content:
+                if line.strip():
+                    yield orjson.loads(line)
+        finally:
+            r.release()
+
+
+speaker = SpeakerClient()
@@ -0,0 +1,30 @@
+"""Состояние бота вне процесса: FSM aiogram в Redis.
+
+FSM-данные читаются и пишутся целиком на каждый апдейт, поэтому в них только
+короткие поля. Фото в состоянии — ссылки (image_id на Speaker и file_id в Telegram),
+сами байты в состояние не попадают.
+
+Без STATE_REDIS_URL — MemoryStorage: одна реплика, всё теряется при рестарте
+(режим для разработки).
+"""
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from configs import STATE_CONFIGS
+
+
+def build_redis():
+    from redis.asyncio import BlockingConnectionPool, Redis
+
+    # при исчерпании пула ждём свободное соединение, а не падаем с ConnectionError
+    pool = BlockingConnectionPool.from_url(STATE_CONFIGS.redis_url, max_connections=STATE_CONFIGS.max_connections)
+    return Redis(connection_pool=pool)
+
+
+def build_storage() -> BaseStorage:
+    if not STATE_CONFIGS.redis_url:
+        return MemoryStorage()
+
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    return RedisStorage(build_redis(), state_ttl=STATE_CONFIGS.state_ttl, data_ttl=STATE_CONFIGS.state_ttl)